@@ -4,242 +4,270 @@
 """
 
 import json
-import requests
 import re
 import os
-from typing import Dict, Any
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime
+import shutil
+import sys
 from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
 
-# API 配置
-API_KEY = os.environ.get('TIKHUB_API_KEY', "yY08aG9D6Gt45xNfyVW/s2oZ0kAkzYzcqMxwkGb27TJErnoTdfwowAWLEA==")
-BASE_URL = "https://api.tikhub.io"
+# 项目根目录加入路径，以便导入共享模块
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, base_dir)
 
+from services import memory, profiling, timing
+from services.analytics import attach_analytics
+from services.exporters import export_file, is_stream
+from services.scheduler import QueueFull, client_id, crawl_batch
+from services.search import QueryError, SearchIndex, parse_search_args
+from services.stats import parse_stats_args, videos_stats
+from services.result_store import ResultStore, parse_page_args, first_page, parse_page_size
 
-def extract_video_id(url: str) -> str:
-    """从 TikTok URL 中提取视频 ID"""
-    patterns = [
-        r'/video/(\d+)',
-        r'/v/(\d+)',
-        r'tiktok\.com/.*?/video/(\d+)',
-        r'vm\.tiktok\.com/(\w+)',
-        r'vt\.tiktok\.com/(\w+)'
-    ]
+# 单个视频的评论数上限，防止 serverless 超时
+MAX_COMMENTS = 1500
 
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(1)
+# 路由，模块加载时编译一次
+PAGE_PATH = re.compile(r'^/api/videos/([^/]+)/comments/?$')
+EXPORT_PATH = re.compile(r'^/api/(jobs|videos)/([^/]+)/export/([^/]+)/?$')
+STATS_PATH = re.compile(r'^/api/(jobs|videos)/([^/]+)/stats/?$')
+SEARCH_PATH = re.compile(r'^/api/(?:jobs/([^/]+)/)?search/?$')
 
-    return None
+# 结果缓存：同一容器内的分页、按引用导出与检索请求直接读取，抓取结果在后台写入检索索引
+# （/api/videos/*、/api/jobs/* 与 /api/search 重写到本函数）
+result_store = ResultStore(directory=os.environ.get('RESULT_STORE_DIR'), index=SearchIndex())
 
 
-def fetch_comments_app_v3(aweme_id: str, cursor: int = 0, count: int = 30) -> Dict[Any, Any]:
-    """使用 APP V3 接口获取评论"""
-    endpoint = f"{BASE_URL}/api/v1/tiktok/app/v3/fetch_video_comments"
+def process_request(data, client=None):
+    """处理批量评论请求；共享执行器繁忙时抛出 QueueFull"""
+    urls = data.get('urls', [])
 
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json"
-    }
+    if not urls:
+        return {
+            "success": False,
+            "error": "请输入至少一个 TikTok 视频 URL"
+        }, 400
 
-    params = {
-        "aweme_id": aweme_id,
-        "cursor": cursor,
-        "count": count
-    }
+    # 去重和清理
+    clean_urls = list(set(url.strip() for url in urls if url.strip()))
 
-    try:
-        response = requests.get(endpoint, params=params, headers=headers, timeout=30)
+    if len(clean_urls) == 0:
+        return {
+            "success": False,
+            "error": "没有有效的 TikTok 视频 URL"
+        }, 400
 
-        if response.status_code == 200:
-            return response.json()
-        else:
-            return {
-                "error": f"HTTP {response.status_code}",
-                "message": response.text[:200]
-            }
-    except requests.exceptions.Timeout:
-        return {"error": "请求超时，请重试"}
-    except requests.exceptions.ConnectionError:
-        return {"error": "网络连接失败，请检查网络"}
-    except Exception as e:
-        return {"error": f"请求失败: {str(e)}"}
+    if len(clean_urls) > 10:
+        return {
+            "success": False,
+            "error": "最多支持同时处理 10 个视频链接"
+        }, 400
 
+    page_size = parse_page_size(data.get('page_size'))
+    if page_size is None:
+        return {
+            "success": False,
+            "error": "page_size 必须是整数"
+        }, 400
 
-def fetch_all_comments(aweme_id: str) -> Dict[str, Any]:
-    """获取视频的所有评论（自动翻页）"""
-    all_comments = []
-    cursor = 0
-    count = 30
-    has_more = True
+    # 在进程共享的执行器上按页调度抓取，结果与输入顺序一致
+    ordered_results = crawl_batch(clean_urls, max_comments=MAX_COMMENTS, client=client)
+
+    # 文本分析（关键词、emoji、语言、@提及），请求体传 analytics: false 时跳过
+    if data.get('analytics', True):
+        with timing.phase("analytics"):
+            attach_analytics(ordered_results)
+    successful_videos = sum(1 for r in ordered_results if r["success"])
+    total_comments = sum(r["total_comments"] for r in ordered_results)
+
+    # 完整结果保存在服务端，响应中只返回每个视频的第一页；
+    # 未设置 RESULT_STORE_DIR 时结果只在当前容器内存中，后续分页请求可能落到其他容器而取不到，
+    # 因此返回完整评论，由前端在本地分页
+    paged_size = page_size if result_store.directory else None
+    for r in ordered_results:
+        if r["success"]:
+            result_store.save_video(r)
+    job_id = result_store.save_job([r["video_id"] for r in ordered_results if r["success"]])
+
+    result = {
+        "success": True,
+        "job_id": job_id,
+        "total_videos": len(clean_urls),
+        "successful_videos": successful_videos,
+        "total_comments": total_comments,
+        "page_size": page_size,
+        "videos": [first_page(r, paged_size) for r in ordered_results]
+    }
+    # 开启内存追踪时附带已完成阶段的峰值分配
+    trace = memory.current()
+    if trace is not None:
+        result["memory"] = trace.summary()
 
-    while has_more and len(all_comments) < 1500:
-        result = fetch_comments_app_v3(aweme_id, cursor=cursor, count=count)
+    return result, 200
 
-        if "error" in result:
-            return {
-                "success": False,
-                "error": result.get("error", "未知错误"),
-                "message": result.get("message", ""),
-                "total_comments": 0,
-                "comments": []
-            }
 
-        data = result.get("data", {})
-        comments = data.get("comments", [])
+def process_page_request(path: str):
+    """处理 /api/videos/<aweme_id>/comments 分页请求"""
+    parsed = urlparse(path)
+    match = PAGE_PATH.match(parsed.path)
+    if not match:
+        return {"success": False, "error": "Not found"}, 404
 
-        if not comments:
-            break
+    args = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+    page = result_store.get_page(match.group(1), **parse_page_args(args))
 
-        all_comments.extend(comments)
+    if page is None:
+        return {
+            "success": False,
+            "error": "结果不存在或已过期，请重新获取"
+        }, 404
 
-        has_more = data.get("has_more", False)
-        cursor = data.get("cursor", 0)
+    return page, 200
 
-        if not has_more or cursor == 0:
-            break
 
-    return {
-        "success": True,
-        "aweme_id": aweme_id,
-        "total_comments": len(all_comments),
-        "comments": all_comments
-    }
+def process_stats_request(path: str):
+    """
+    处理评论统计请求：
+    /api/videos/<aweme_id>/stats（逗号分隔多个视频 ID 时附带合并统计）或 /api/jobs/<job_id>/stats
+    """
+    parsed = urlparse(path)
+    kind, ref_id = STATS_PATH.match(parsed.path).groups()
+    if kind == "jobs":
+        videos = result_store.resolve_videos(job_id=ref_id)
+    else:
+        videos = result_store.resolve_videos(aweme_ids=[i for i in ref_id.split(',') if i])
+
+    if videos is None:
+        return {
+            "success": False,
+            "error": "结果不存在或已过期，请重新获取"
+        }, 404
 
+    args = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+    try:
+        with timing.phase("stats"):
+            items = [{"video_id": v["video_id"], "columns": result_store.video_columns(v)} for v in videos]
+            return videos_stats(items, **parse_stats_args(args)), 200
+    except Exception as e:
+        return {"success": False, "error": f"统计失败: {str(e)}"}, 500
 
-def format_comment(comment: Dict) -> Dict:
-    """格式化评论数据"""
-    user = comment.get("user", {})
-    avatar_data = user.get("avatar_thumb", {})
-    avatar_urls = avatar_data.get("url_list", [])
-
-    return {
-        "id": comment.get("cid", ""),
-        "text": comment.get("text", ""),
-        "author": {
-            "uid": user.get("uid", ""),
-            "nickname": user.get("nickname", "Unknown"),
-            "username": user.get("unique_id", ""),
-            "avatar": avatar_urls[0] if avatar_urls else "",
-            "signature": user.get("signature", "")
-        },
-        "likes": comment.get("digg_count", 0),
-        "create_time": comment.get("create_time", 0),
-        "create_time_formatted": datetime.fromtimestamp(
-            comment.get("create_time", 0)
-        ).strftime("%Y-%m-%d %H:%M:%S"),
-        "reply_count": comment.get("reply_comment_total", 0),
-        "status": comment.get("status", 0)
-    }
 
+def process_search_request(path: str):
+    """处理检索请求：/api/search?q=...，或 /api/jobs/<job_id>/search 只在该批次的视频中检索"""
+    parsed = urlparse(path)
+    job_id = SEARCH_PATH.match(parsed.path).group(1)
+    args = parse_search_args({k: v[0] for k, v in parse_qs(parsed.query).items()})
 
-def process_single_video(url):
-    """处理单个视频"""
-    try:
-        video_id = extract_video_id(url)
-        if not video_id:
-            return {
-                "url": url,
-                "success": False,
-                "error": "无法从 URL 中提取视频 ID",
-                "video_id": None,
-                "total_comments": 0,
-                "comments": []
-            }
-
-        result = fetch_all_comments(video_id)
-        if not result["success"]:
+    if job_id:
+        job = result_store.get_job(job_id)
+        if job is None:
             return {
-                "url": url,
                 "success": False,
-                "error": result.get("error", "获取评论失败"),
-                "video_id": video_id,
-                "total_comments": 0,
-                "comments": []
-            }
+                "error": "结果不存在或已过期，请重新获取"
+            }, 404
+        args["aweme_ids"] = job["video_ids"]
 
-        formatted_comments = [format_comment(c) for c in result["comments"]]
-        return {
-            "url": url,
-            "success": True,
-            "error": None,
-            "video_id": video_id,
-            "total_comments": len(formatted_comments),
-            "comments": formatted_comments
-        }
-    except Exception as e:
-        return {
-            "url": url,
-            "success": False,
-            "error": f"处理失败: {str(e)}",
-            "video_id": None,
-            "total_comments": 0,
-            "comments": []
-        }
+    if not args["query"]:
+        return {"success": False, "error": "请输入检索词"}, 400
 
+    try:
+        with timing.phase("search"):
+            return result_store.index.search(**args), 200
+    except QueryError as e:
+        return {"success": False, "error": f"查询语法错误: {str(e)}"}, 400
+    except Exception as e:
+        return {"success": False, "error": f"检索失败: {str(e)}"}, 500
 
-def process_request(data):
-    """处理批量评论请求"""
-    urls = data.get('urls', [])
 
-    if not urls:
+def process_export_request(path: str):
+    """
+    处理按引用导出请求：
+    /api/jobs/<job_id>/export/<format> 或 /api/videos/<aweme_id>/export/<format>
+    成功返回 (文件对象, MIME 类型, 文件名)，失败返回 (错误信息, 状态码)
+    """
+    parsed = urlparse(path)
+    match = EXPORT_PATH.match(parsed.path)
+    if not match:
+        return {"success": False, "error": "Not found"}, 404
+
+    kind, ref_id, format = match.groups()
+    if kind == "jobs":
+        videos = result_store.resolve_videos(job_id=ref_id)
+    else:
+        videos = result_store.resolve_videos(aweme_ids=[ref_id])
+
+    if videos is None:
         return {
             "success": False,
-            "error": "请输入至少一个 TikTok 视频 URL"
-        }, 400
+            "error": "结果不存在或已过期，请重新获取"
+        }, 404
 
-    # 去重和清理
-    clean_urls = list(set(url.strip() for url in urls if url.strip()))
+    exported = export_file(format, videos)
+    if exported is None:
+        return {"success": False, "error": "不支持的导出格式"}, 400
 
-    if len(clean_urls) == 0:
-        return {
-            "success": False,
-            "error": "没有有效的 TikTok 视频 URL"
-        }, 400
+    return exported
 
-    if len(clean_urls) > 10:
-        return {
-            "success": False,
-            "error": "最多支持同时处理 10 个视频链接"
-        }, 400
 
-    # 处理每个视频
-    results = []
-    total_comments = 0
-    successful_videos = 0
+# Vercel Serverless Handler
+class handler(memory.MemoryTracedHandlerMixin, profiling.ProfiledHandlerMixin, timing.TimedHandlerMixin,
+              BaseHTTPRequestHandler):
+    """
+    Vercel serverless function handler (BaseHTTPRequestHandler format)
+    """
+    def do_GET(self):
+        if self.path.startswith('/admin/profiles'):
+            self.handle_admin()
+            return
 
-    # 使用线程池并发处理（最多5个线程）
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        future_to_url = {executor.submit(process_single_video, url): url for url in clean_urls}
+        try:
+            if '/export/' in self.path:
+                exported = process_export_request(self.path)
+                if len(exported) == 3:
+                    self.send_file(*exported)
+                    return
+                result, status_code = exported
+            elif STATS_PATH.match(urlparse(self.path).path):
+                result, status_code = process_stats_request(self.path)
+            elif SEARCH_PATH.match(urlparse(self.path).path):
+                result, status_code = process_search_request(self.path)
+            else:
+                result, status_code = process_page_request(self.path)
 
-        for future in as_completed(future_to_url):
-            result = future.result()
-            results.append(result)
+            self.send_response(status_code)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps(result).encode('utf-8'))
 
-            if result["success"]:
-                successful_videos += 1
-                total_comments += result["total_comments"]
+        except Exception as e:
+            self.send_response(500)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            error_response = json.dumps({
+                "success": False,
+                "error": f"Server error: {str(e)}"
+            })
+            self.wfile.write(error_response.encode('utf-8'))
 
-    # 保持原始URL顺序
-    url_to_result = {r["url"]: r for r in results}
-    ordered_results = [url_to_result[url] for url in clean_urls if url in url_to_result]
+    def send_file(self, body, mimetype, download_name):
+        """分块发送导出文件；文本格式边生成边写出"""
+        self.send_response(200)
+        # 与 Flask 一致：文本类型补上字符集
+        self.send_header('Content-Type', f'{mimetype}; charset=utf-8' if mimetype.startswith('text/') else mimetype)
+        self.send_header('Content-Disposition', f'attachment; filename="{download_name}"')
 
-    return {
-        "success": True,
-        "total_videos": len(clean_urls),
-        "successful_videos": successful_videos,
-        "total_comments": total_comments,
-        "videos": ordered_results
-    }, 200
+        if is_stream(body):
+            self.end_headers()
+            for chunk in body:
+                self.wfile.write(chunk)
+            return
 
+        size = body.seek(0, 2)
+        body.seek(0)
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        with body:
+            shutil.copyfileobj(body, self.wfile, 64 * 1024)
 
-# Vercel Serverless Handler
-class handler(BaseHTTPRequestHandler):
-    """
-    Vercel serverless function handler (BaseHTTPRequestHandler format)
-    """
     def do_POST(self):
         try:
             # 读取请求体
@@ -248,13 +276,27 @@ class handler(BaseHTTPRequestHandler):
             data = json.loads(post_data.decode('utf-8'))
 
             # 处理请求
-            result, status_code = process_request(data)
+            result, status_code = process_request(data, client_id(self.headers, self.client_address[0]))
+            with timing.phase("serialize"):
+                body = json.dumps(result).encode('utf-8')
 
             # 发送响应
             self.send_response(status_code)
             self.send_header('Content-Type', 'application/json')
             self.end_headers()
-            self.wfile.write(json.dumps(result).encode('utf-8'))
+            self.wfile.write(body)
+
+        except QueueFull as e:
+            self.send_response(429)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Retry-After', str(e.retry_after))
+            self.end_headers()
+            error_response = json.dumps({
+                "success": False,
+                "error": str(e),
+                "retry_after": e.retry_after
+            })
+            self.wfile.write(error_response.encode('utf-8'))
 
         except json.JSONDecodeError:
             self.send_response(400)
@@ -0,0 +1,4 @@
+"""
+性能基准脚本
+在项目根目录运行，例如: python -m benchmarks.bench_excel
+"""
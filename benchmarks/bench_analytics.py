@@ -0,0 +1,95 @@
+"""
+文本分析基准：当前进程内计算与不同进程数的进程池对比
+报告吞吐（条/秒）、分析期间同进程另一个 CPU 密集线程还能获得的算力（GIL 占用），
+以及分片传输格式与 pickle 格式化评论字典的大小
+
+用法: python -m benchmarks.bench_analytics [--videos 10] [--comments 20000] [--workers 1,2,4]
+"""
+
+import argparse
+import os
+import pickle
+import threading
+import time
+
+from benchmarks import data
+from benchmarks.bench_search import make_videos
+from benchmarks.util import print_table
+from services.analytics import SHARD_SIZE, TextAnalyzer, _pack
+
+
+def spin(stop: threading.Event, counts: list) -> None:
+    """模拟同进程中其他请求的纯 Python 计算"""
+    n = 0
+    while not stop.is_set():
+        for _ in range(1000):
+            n += 1
+    counts.append(n)
+
+
+def thread_share(run) -> float:
+    """run 执行期间，另一个 CPU 密集线程的速度相对单独运行时的比例"""
+    def rate(duration=None, call=None):
+        stop, counts = threading.Event(), []
+        thread = threading.Thread(target=spin, args=(stop, counts))
+        start = time.perf_counter()
+        thread.start()
+        if call is None:
+            time.sleep(duration)
+        else:
+            call()
+        stop.set()
+        thread.join()
+        return counts[0] / (time.perf_counter() - start)
+
+    return rate(call=run) / rate(duration=0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文本分析基准")
+    parser.add_argument("--videos", type=int, default=10)
+    parser.add_argument("--comments", type=int, default=20000, help="每个视频的评论数")
+    parser.add_argument("--workers", default=f"1,2,{os.cpu_count() or 1}")
+    args = parser.parse_args()
+
+    videos = make_videos(args.videos, args.comments)
+    for video in videos:
+        video["success"] = True
+    total = args.videos * args.comments
+
+    analyzers = [("inline", TextAnalyzer("inline"))]
+    analyzers += [(f"process x{w}", TextAnalyzer("process", w))
+                  for w in sorted({int(w) for w in args.workers.split(",")})]
+
+    rows = []
+    expected = None
+    for name, analyzer in analyzers:
+        # 预热：启动工作进程
+        analyzer.analyze(videos[:1])
+        start = time.perf_counter()
+        analyzer.analyze(videos)
+        elapsed = time.perf_counter() - start
+        share = thread_share(lambda: analyzer.analyze(videos))
+
+        result = analyzer.analyze(videos[:2])
+        assert expected is None or result == expected, f"{name} 的结果与 inline 不一致"
+        expected = result
+        rows.append({
+            "mode": name,
+            "comments": total,
+            "seconds": elapsed,
+            "comments_per_s": round(total / elapsed),
+            "other_thread": round(share, 2),
+        })
+    print_table(f"文本分析（{args.videos} 个视频 × {args.comments} 条，{os.cpu_count()} 核）", rows,
+                ["mode", "comments", "seconds", "comments_per_s", "other_thread"])
+
+    shard = data.make_videos(1, SHARD_SIZE)[0]["comments"]
+    print_table(f"单个分片的传输大小（{len(shard)} 条格式化评论）", [
+        {"format": "pickle 评论字典", "kb": len(pickle.dumps(shard)) / 1024},
+        {"format": "NUL 分隔 UTF-8", "kb": len(_pack(shard)) / 1024},
+    ], ["format", "kb"])
+
+
+if __name__ == '__main__':
+    main()
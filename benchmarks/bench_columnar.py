@@ -0,0 +1,78 @@
+"""
+列式导出基准：对比 CSV 与 Parquet / Arrow 的导出耗时、文件大小和下游加载耗时
+下游加载使用 pandas（未安装时使用 pyarrow 读取）
+
+用法: python -m benchmarks.bench_columnar [--videos 10] [--comments 10000]
+"""
+
+import argparse
+import io
+import time
+
+from benchmarks.data import make_videos
+from services.exporters import export_file, is_stream
+
+
+def export_bytes(format: str, videos) -> bytes:
+    body, _, _ = export_file(format, videos)
+    if is_stream(body):
+        return b"".join(body)
+    with body:
+        return body.read()
+
+
+def loaders():
+    """下游加载方式：格式 -> 加载函数"""
+    try:
+        import pandas as pd
+        return "pandas", {
+            "csv": lambda data: pd.read_csv(io.BytesIO(data), encoding="utf-8-sig"),
+            "parquet": lambda data: pd.read_parquet(io.BytesIO(data)),
+            "arrow": lambda data: _read_arrow(data).to_pandas(),
+        }
+    except ImportError:
+        import pyarrow.csv as pa_csv
+        import pyarrow.parquet as pq
+        return "pyarrow", {
+            "csv": lambda data: pa_csv.read_csv(io.BytesIO(data)),
+            "parquet": lambda data: pq.read_table(io.BytesIO(data)),
+            "arrow": _read_arrow,
+        }
+
+
+def _read_arrow(data: bytes):
+    import pyarrow as pa
+    return pa.ipc.open_stream(io.BytesIO(data)).read_all()
+
+
+def timed(func, *args, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="列式导出基准")
+    parser.add_argument("--videos", type=int, default=10)
+    parser.add_argument("--comments", type=int, default=10000)
+    args = parser.parse_args()
+
+    videos = make_videos(args.videos, args.comments)
+    rows = args.videos * args.comments
+    engine, load = loaders()
+
+    print(f"列式导出: {rows} 条评论，下游加载: {engine}")
+    print(f"{'format':<10}{'export s':>10}{'rows/sec':>12}{'size KB':>10}{'load s':>10}")
+    for format in ("csv", "parquet", "arrow"):
+        export_seconds = timed(export_bytes, format, videos, repeat=1)
+        data = export_bytes(format, videos)
+        load_seconds = timed(load[format], data)
+        print(f"{format:<10}{export_seconds:>10.2f}{rows / export_seconds:>12.0f}"
+              f"{len(data) / 1024:>10.0f}{load_seconds:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
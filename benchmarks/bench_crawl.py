@@ -0,0 +1,262 @@
+"""
+抓取吞吐基准（基于本地模拟 TikHub 服务，无需网络与 API 配额）
+报告:
+  - fetch_all_comments 的页数/秒、评论数/秒，以及自适应每页条数相对固定 count=30 节省的请求数
+  - 批量接口（Flask 与 serverless 版本）的端到端延迟百分位
+  - 各导出格式的行数/秒
+  - 可选（--key-scaling 1,2,4）：上游按 Key 限速时，吞吐随 Key 池大小的变化
+  - 可选（--dedup 1000000）：各去重结构每条占用的内存与加入速度；--overlap 让模拟上游跨页重复返回评论
+
+用法:
+  python -m benchmarks.bench_crawl [--latency-ms 20] [--json out.json]
+  python -m benchmarks.bench_crawl --compare baseline.json --tolerance 0.2
+与基线比较出现退化时以非零状态码退出，可用于 CI
+"""
+
+import argparse
+import math
+import sys
+import time
+from typing import Dict, Any, List
+
+from benchmarks.mock_tikhub import MockConfig, start_mock_server, video_ids
+from benchmarks.util import latency_summary, print_table, compare_with_baseline, write_json
+from services import tikhub
+from services.credentials import KeyPool
+from services.exporters import export_file, is_stream
+
+
+def video_urls(ids: List[str]) -> List[str]:
+    return [f"https://www.tiktok.com/@bench/video/{aweme_id}" for aweme_id in ids]
+
+
+def bench_fetch(stats, ids: List[str], max_count: int) -> Dict[str, Any]:
+    """逐个视频调用 fetch_all_comments（每页条数从未探测的状态开始）"""
+    tikhub.PAGE_SIZER = tikhub.PageSizer()
+    stats.reset()
+    start = time.perf_counter()
+    comments = 0
+    duplicates = 0
+    fixed_pages = 0
+    # 固定 count=30 时每页实际得到的条数
+    fixed_count = min(tikhub.DEFAULT_PAGE_COUNT, max_count)
+    for aweme_id in ids:
+        result = tikhub.fetch_all_comments(aweme_id)
+        comments += result["total_comments"]
+        duplicates += result["duplicates"]
+        fixed_pages += math.ceil(result["total_comments"] / fixed_count)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "stage": "fetch_all_comments",
+        "videos": len(ids),
+        "pages": stats.requests,
+        "fixed_pages": fixed_pages,
+        "calls_saved": fixed_pages - stats.requests,
+        "page_count": tikhub.PAGE_SIZER.count,
+        "comments": comments,
+        "duplicates": duplicates,
+        "seconds": elapsed,
+        "pages_per_sec": stats.requests / elapsed,
+        "comments_per_sec": comments / elapsed,
+    }
+
+
+def bench_dedup(count: int) -> List[Dict[str, Any]]:
+    """各去重结构加入 count 个 cid 的耗时与每条占用的内存（含整数对象）"""
+    import tracemalloc
+    from services.dedup import BloomFilter, CidSet, cid_key
+
+    cids = [f"73{i * 7919 % 10 ** 17:017d}" for i in range(count)]
+    rows = []
+    for name, factory in (("set", set), ("CidSet", CidSet), ("BloomFilter", BloomFilter)):
+        tracemalloc.start()
+        seen = factory()
+        start = time.perf_counter()
+        for cid in cids:
+            seen.add(cid_key(cid))
+        elapsed = time.perf_counter() - start
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        rows.append({"structure": name, "entries": len(seen), "bytes_per_entry": size / count,
+                     "adds_per_sec": count / elapsed})
+    return rows
+
+
+def bench_batch(name: str, call, urls: List[str], iterations: int) -> Dict[str, Any]:
+    """重复调用批量接口，统计端到端延迟"""
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        call(urls)
+        latencies.append(time.perf_counter() - start)
+    return dict({"route": name}, **latency_summary(latencies))
+
+
+def flask_batch(urls: List[str]):
+    import app
+    client = app.app.test_client()
+    response = client.post('/api/fetch-comments-batch', json={"urls": urls})
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+
+def serverless_batch(urls: List[str]):
+    sys.path.insert(0, "api")
+    import fetch_comments_batch
+    result, status = fetch_comments_batch.process_request({"urls": urls})
+    assert status == 200, result
+
+
+def bench_key_scaling(stats, key_counts: List[int], key_rate: float, seconds: float,
+                      concurrency: int) -> List[Dict[str, Any]]:
+    """上游按 Key 限速（每个 Key 每秒 key_rate 次）时，用不同大小的 Key 池并发抓取固定时长"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    original = tikhub.KEY_POOL
+    results = []
+    try:
+        for count in key_counts:
+            # Key 池按上游限速放行，避免触发 429 隔离
+            tikhub.KEY_POOL = KeyPool([f"bench-key-{i}" for i in range(count)], rate=key_rate)
+            stats.reset()
+            deadline = time.perf_counter() + seconds
+            ids = video_ids(concurrency, start=7300000000000000000)
+
+            def crawl(aweme_id):
+                while time.perf_counter() < deadline:
+                    tikhub.fetch_comments_app_v3(aweme_id)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(crawl, ids))
+            elapsed = time.perf_counter() - start
+
+            results.append({
+                "keys": count,
+                "pages": stats.requests,
+                "rate_limited": stats.rate_limited,
+                "seconds": elapsed,
+                "pages_per_sec": stats.requests / elapsed,
+            })
+    finally:
+        tikhub.KEY_POOL = original
+    return results
+
+
+def bench_exports(videos: List[Dict[str, Any]], formats: List[str]) -> List[Dict[str, Any]]:
+    rows = sum(len(video["comments"]) for video in videos)
+    results = []
+    for format in formats:
+        start = time.perf_counter()
+        try:
+            body, _, _ = export_file(format, videos)
+        except RuntimeError as e:
+            print(f"跳过 {format}: {e}")
+            continue
+        if is_stream(body):
+            size = sum(len(chunk) for chunk in body)
+        else:
+            size = body.seek(0, 2)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "format": format,
+            "rows": rows,
+            "seconds": elapsed,
+            "rows_per_sec": rows / elapsed,
+            "size_kb": size / 1024,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抓取吞吐基准")
+    parser.add_argument("--videos", type=int, default=10)
+    parser.add_argument("--comments", type=int, default=600, help="每个视频的评论数")
+    parser.add_argument("--max-count", type=int, default=50, help="模拟上游单页上限")
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--text-length", type=int, default=60)
+    parser.add_argument("--iterations", type=int, default=10, help="批量接口重复次数")
+    parser.add_argument("--formats", default="csv,ndjson,json,excel,parquet")
+    parser.add_argument("--key-scaling", help="逗号分隔的 Key 池大小，如 1,2,4")
+    parser.add_argument("--key-rate", type=float, default=20.0, help="--key-scaling 时上游每个 Key 每秒请求上限")
+    parser.add_argument("--overlap", type=int, default=0, help="模拟上游下一页游标回退的条数（跨页重复）")
+    parser.add_argument("--dedup", type=int, default=0, help="去重结构基准的 cid 数（0 跳过）")
+    parser.add_argument("--json", help="将指标写入 JSON 文件（可作为基线）")
+    parser.add_argument("--compare", help="与基线 JSON 比较")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的退化比例")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        comments=args.comments,
+        max_count=args.max_count,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        text_length=args.text_length,
+        overlap=args.overlap
+    )
+    server, stats, base_url = start_mock_server(config)
+    tikhub.BASE_URL = base_url
+
+    ids = video_ids(args.videos)
+    urls = video_urls(ids)
+
+    try:
+        fetch = bench_fetch(stats, ids, args.max_count)
+        batches = [
+            bench_batch("flask", flask_batch, urls, args.iterations),
+            bench_batch("serverless", serverless_batch, urls, args.iterations),
+        ]
+        videos = [tikhub.fetch_single_video(url) for url in urls]
+        exports = bench_exports(videos, args.formats.split(","))
+
+        key_scaling = []
+        if args.key_scaling:
+            config.key_rate = args.key_rate
+            key_scaling = bench_key_scaling(stats, [int(n) for n in args.key_scaling.split(",")],
+                                            args.key_rate, seconds=3.0, concurrency=8)
+    finally:
+        server.shutdown()
+
+    print(f"模拟上游: {base_url}  延迟 {args.latency_ms}ms + 抖动 {args.jitter_ms}ms, "
+          f"{args.videos} 个视频 × {args.comments} 条评论")
+    print_table("抓取", [fetch], ["stage", "videos", "pages", "fixed_pages", "calls_saved", "page_count",
+                                  "comments", "duplicates", "seconds", "pages_per_sec", "comments_per_sec"])
+    print_table("批量接口端到端延迟", batches, ["route", "count", "p50_ms", "p95_ms", "p99_ms", "max_ms"])
+    print_table("导出", exports, ["format", "rows", "seconds", "rows_per_sec", "size_kb"])
+    dedup = bench_dedup(args.dedup) if args.dedup else []
+    if dedup:
+        print_table(f"去重结构（{args.dedup} 个 cid）", dedup,
+                    ["structure", "entries", "bytes_per_entry", "adds_per_sec"])
+    if key_scaling:
+        print_table(f"Key 池扩展（上游每个 Key {args.key_rate:g} 次/秒）", key_scaling,
+                    ["keys", "pages", "rate_limited", "seconds", "pages_per_sec"])
+
+    metrics = {
+        "fetch_pages_per_sec": fetch["pages_per_sec"],
+        "fetch_comments_per_sec": fetch["comments_per_sec"],
+        "fetch_calls_saved": fetch["calls_saved"],
+    }
+    for batch in batches:
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            metrics[f"batch_{batch['route']}_{key}"] = batch[key]
+    for export in exports:
+        metrics[f"export_{export['format']}_rows_per_sec"] = export["rows_per_sec"]
+    for row in key_scaling:
+        metrics[f"keys_{row['keys']}_pages_per_sec"] = row["pages_per_sec"]
+
+    if args.json:
+        write_json(args.json, metrics)
+
+    if args.compare:
+        regressions = compare_with_baseline(metrics, args.compare, args.tolerance)
+        if regressions:
+            print("\n性能退化:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n与基线相比无退化")
+
+
+if __name__ == '__main__':
+    main()
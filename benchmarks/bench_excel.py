@@ -0,0 +1,131 @@
+"""
+Excel 导出基准：对比旧的逐单元格样式实现与 services.excel_export 流式引擎
+报告每秒写出的评论行数与峰值内存
+
+用法: python -m benchmarks.bench_excel [--videos 10] [--comments 1500]
+"""
+
+import argparse
+import time
+import tracemalloc
+from io import BytesIO
+from typing import Dict, Any, List
+
+from openpyxl import Workbook
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.utils import get_column_letter
+
+from benchmarks.data import make_videos
+from services.excel_export import export_videos_workbook
+
+
+def legacy_export(videos: List[Dict[str, Any]]) -> BytesIO:
+    """旧实现：普通模式工作簿，每个单元格单独创建 Alignment 并赋值 Border"""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "TikTok评论汇总"
+
+    header_font = Font(size=12, bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    info_fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
+    border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                    top=Side(style='thin'), bottom=Side(style='thin'))
+    alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+
+    ws.column_dimensions['A'].width = 20
+    for i, video in enumerate(videos, 1):
+        start_col = 2 + (i - 1) * 4
+        ws.merge_cells(start_row=1, start_column=start_col, end_row=1, end_column=start_col + 3)
+        cell = ws.cell(row=1, column=start_col, value=f"视频 {i}")
+        cell.font, cell.fill, cell.border, cell.alignment = header_font, header_fill, border, alignment
+        ws.merge_cells(start_row=2, start_column=start_col, end_row=2, end_column=start_col + 3)
+        cell = ws.cell(row=2, column=start_col, value=f"视频 {i}\n{video.get('url')}")
+        cell.fill, cell.border = info_fill, border
+        cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+        for offset, width in enumerate([20, 40, 10, 10]):
+            ws.column_dimensions[get_column_letter(start_col + offset)].width = width
+
+    current_row = 4
+    max_comments = max(len(video.get('comments', [])) for video in videos)
+    for comment_index in range(max_comments):
+        label_cell = ws.cell(row=current_row, column=1, value=f"评论 {comment_index + 1}")
+        label_cell.border = border
+        label_cell.alignment = alignment
+
+        col_index = 2
+        for video in videos:
+            comments = video.get('comments', [])
+            if comment_index < len(comments):
+                comment = comments[comment_index]
+                values = [comment.get('author', {}).get('nickname', '未知用户'), comment.get('text', ''),
+                          comment.get('likes', 0), comment.get('reply_count', 0)]
+                for offset, value in enumerate(values):
+                    cell = ws.cell(row=current_row, column=col_index + offset, value=value)
+                    cell.border = border
+                    if offset < 2:
+                        cell.alignment = Alignment(vertical='top', wrap_text=True)
+                    else:
+                        cell.alignment = Alignment(horizontal='center', vertical='top')
+            else:
+                for offset in range(4):
+                    cell = ws.cell(row=current_row, column=col_index + offset, value="")
+                    cell.border = border
+                    cell.alignment = Alignment(vertical='top')
+            col_index += 4
+        current_row += 1
+
+    ws.freeze_panes = "A3"
+    output = BytesIO()
+    wb.save(output)
+    output.seek(0)
+    return output
+
+
+def measure(name: str, func, videos: List[Dict[str, Any]], rows: int) -> Dict[str, Any]:
+    """分别测量耗时与峰值内存（tracemalloc 会拖慢执行，因此单独运行一次）"""
+    start = time.perf_counter()
+    output = func(videos)
+    elapsed = time.perf_counter() - start
+    size = output.seek(0, 2)
+
+    tracemalloc.start()
+    func(videos)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "name": name,
+        "seconds": elapsed,
+        "rows_per_sec": rows / elapsed,
+        "peak_mb": peak / 1024 / 1024,
+        "file_kb": size / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Excel 导出基准")
+    parser.add_argument("--videos", type=int, default=10)
+    parser.add_argument("--comments", type=int, default=1500)
+    args = parser.parse_args()
+
+    videos = make_videos(args.videos, args.comments)
+    rows = args.videos * args.comments
+
+    results = [
+        measure("legacy", legacy_export, videos, rows),
+        measure("streaming", export_videos_workbook, videos, rows),
+    ]
+
+    print(f"Excel 导出: {args.videos} 个视频 × {args.comments} 条评论")
+    print(f"{'engine':<12}{'seconds':>10}{'rows/sec':>12}{'peak MB':>10}{'file KB':>10}")
+    for r in results:
+        print(f"{r['name']:<12}{r['seconds']:>10.2f}{r['rows_per_sec']:>12.0f}"
+              f"{r['peak_mb']:>10.1f}{r['file_kb']:>10.0f}")
+
+    legacy, streaming = results
+    print(f"speedup: {legacy['seconds'] / streaming['seconds']:.2f}x, "
+          f"memory: {legacy['peak_mb'] / streaming['peak_mb']:.1f}x less")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+批量调度基准：大小悬殊的一批视频，比较按视频分配线程与按页调度（round_robin / srf）
+报告整批完成时间（makespan）、各视频平均完成时间，以及小视频（评论数不超过 --small）的平均与最长完成时间
+
+用法:
+  python -m benchmarks.bench_scheduler [--latency-ms 20] [--workers 5]
+  python -m benchmarks.bench_scheduler --json sched.json
+  python -m benchmarks.bench_scheduler --compare sched.json --tolerance 0.2
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+from benchmarks.mock_tikhub import MockConfig, start_mock_server, video_ids
+from benchmarks.util import print_table, compare_with_baseline, write_json
+from services import tikhub
+from services.scheduler import BatchScheduler, CrawlExecutor, POLICIES
+
+# 默认批次：大视频多于线程数且排在前面，按视频分配线程时第六个大视频与小视频都要等线程空出
+DEFAULT_SIZES = "600,600,600,600,600,600,90,60,30,90"
+
+
+def run_per_video(urls: List[str], workers: int) -> List[float]:
+    """原先的做法：每个视频占用一个线程直到抓完"""
+    started = time.perf_counter()
+    completed_at = [0.0] * len(urls)
+
+    def crawl(index: int) -> None:
+        tikhub.fetch_single_video(urls[index])
+        completed_at[index] = time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(crawl, range(len(urls))))
+    return completed_at
+
+
+def run_scheduler(urls: List[str], workers: int, policy: str) -> List[float]:
+    batch = BatchScheduler(urls, policy=policy)
+    CrawlExecutor(workers=workers).run(batch)
+    return batch.completed_at
+
+
+def summarize(name: str, completed_at: List[float], sizes: List[int], small: int, pages: int) -> Dict[str, Any]:
+    small_times = [t for t, size in zip(completed_at, sizes) if size <= small] or [0.0]
+    return {
+        "mode": name,
+        "pages": pages,
+        "makespan_ms": max(completed_at) * 1000,
+        "mean_ms": statistics.mean(completed_at) * 1000,
+        "small_mean_ms": statistics.mean(small_times) * 1000,
+        "small_max_ms": max(small_times) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量调度基准")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="各视频的评论数（逗号分隔）")
+    parser.add_argument("--small", type=int, default=100, help="评论数不超过该值的视频计为小视频")
+    parser.add_argument("--workers", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--max-count", type=int, default=50, help="模拟上游单页最多返回的条数")
+    parser.add_argument("--json", help="将指标写入 JSON 文件（可作为基线）")
+    parser.add_argument("--compare", help="与基线 JSON 比较")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的退化比例")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    ids = video_ids(len(sizes))
+    config = MockConfig(sizes=dict(zip(ids, sizes)), max_count=args.max_count, latency_ms=args.latency_ms)
+    server, stats, base_url = start_mock_server(config)
+    tikhub.BASE_URL = base_url
+    urls = [f"https://www.tiktok.com/@bench/video/{aweme_id}" for aweme_id in ids]
+
+    modes = [("per_video", lambda: run_per_video(urls, args.workers))]
+    modes += [(policy, lambda policy=policy: run_scheduler(urls, args.workers, policy)) for policy in POLICIES]
+
+    rows = []
+    try:
+        for name, run in modes:
+            # 每种方式都从未探测的每页条数开始
+            tikhub.PAGE_SIZER = tikhub.PageSizer()
+            stats.reset()
+            completed_at = run()
+            rows.append(summarize(name, completed_at, sizes, args.small, stats.requests))
+    finally:
+        server.shutdown()
+
+    print_table(f"批量调度（{len(sizes)} 个视频，{args.workers} 个线程，上游延迟 {args.latency_ms:g}ms）", rows,
+                ["mode", "pages", "makespan_ms", "mean_ms", "small_mean_ms", "small_max_ms"])
+
+    metrics = {}
+    for row in rows:
+        for key in ("makespan_ms", "mean_ms", "small_max_ms"):
+            metrics[f"sched_{row['mode']}_{key}"] = row[key]
+
+    if args.json:
+        write_json(args.json, metrics)
+
+    if args.compare:
+        regressions = compare_with_baseline(metrics, args.compare, args.tolerance)
+        if regressions:
+            print("\n性能退化:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n与基线相比无退化")
+
+
+if __name__ == '__main__':
+    main()
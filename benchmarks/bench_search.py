@@ -0,0 +1,104 @@
+"""
+评论检索基准：倒排索引的构建速度、内存与查询延迟
+评论文本由中文词、英文词与 emoji 随机组合（词频按 Zipf 分布），查询覆盖单词、多词、短语、OR 与 NOT，
+并与逐条扫描评论文本的子串匹配对比
+
+用法: python -m benchmarks.bench_search [--videos 100] [--comments 10000] [--iterations 5]
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks.util import print_table, rss_mb
+from services.search import SearchIndex
+
+CHINESE = ["好看", "喜欢", "手机", "苹果", "华为", "音乐", "舞蹈", "视频", "哈哈", "太棒了", "评论", "关注",
+           "点赞", "新品", "发布会", "价格", "质量", "推荐", "博主", "可口可乐", "广告", "真的", "不错", "一般"]
+LATIN = ["love", "this", "song", "new", "phone", "iphone", "great", "video", "lol", "omg", "fyp", "dance",
+         "price", "quality", "review", "first", "best", "ever", "cool", "nice"]
+EMOJI = ["😂", "🔥", "❤", "👍", "🎵", "😍", "🙏", "🎉"]
+
+QUERIES = ["手机", "苹果 手机", "\"new phone\"", "可口可乐", "华为 OR 苹果", "手机 -广告", "🔥 love", "发布会 价格 质量"]
+
+
+def make_text(rng: random.Random, words, weights) -> str:
+    return " ".join(rng.choices(words, weights, k=rng.randint(3, 12)))
+
+
+def make_videos(video_count: int, comment_count: int, seed: int = 1):
+    rng = random.Random(seed)
+    words = CHINESE + LATIN + EMOJI
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    rng.shuffle(weights)
+    return [{
+        "video_id": str(7000000000000000000 + v),
+        "comments": [{"id": f"{v}-{i}", "text": make_text(rng, words, weights)} for i in range(comment_count)],
+    } for v in range(video_count)]
+
+
+def scan(videos, needles):
+    """对照组：逐条扫描评论文本，全部子串都出现即命中"""
+    return [c for video in videos for c in video["comments"] if all(n in c["text"] for n in needles)]
+
+
+def timed(call, iterations: int) -> float:
+    """多次调用的中位耗时（毫秒）"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="评论检索基准")
+    parser.add_argument("--videos", type=int, default=100)
+    parser.add_argument("--comments", type=int, default=10000, help="每个视频的评论数")
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    videos = make_videos(args.videos, args.comments)
+    total = args.videos * args.comments
+
+    index = SearchIndex()
+    before = rss_mb()
+    start = time.perf_counter()
+    for video in videos:
+        index.add_video(video["video_id"], video["comments"])
+    build_s = time.perf_counter() - start
+    index_mb = rss_mb() - before
+
+    print_table(f"索引构建（{args.videos} 个视频 × {args.comments} 条）", [{
+        "comments": total,
+        "build_s": build_s,
+        "comments_per_s": round(total / build_s),
+        "terms": index.stats()["terms"],
+        "index_mb": index_mb,
+    }], ["comments", "build_s", "comments_per_s", "terms", "index_mb"])
+
+    rows = []
+    for query in QUERIES:
+        result = index.search(query)
+        rows.append({
+            "query": query,
+            "hits": result["total"],
+            "index_ms": timed(lambda: index.search(query), args.iterations),
+        })
+    rows.append({
+        "query": "扫描对照: 手机",
+        "hits": len(scan(videos, ["手机"])),
+        "index_ms": timed(lambda: scan(videos, ["手机"]), args.iterations),
+    })
+    rows.append({
+        "query": "扫描对照: 苹果 手机",
+        "hits": len(scan(videos, ["苹果", "手机"])),
+        "index_ms": timed(lambda: scan(videos, ["苹果", "手机"]), args.iterations),
+    })
+    print_table("查询延迟（前 20 条，中位数）", rows, ["query", "hits", "index_ms"])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+冷启动基准：每个函数在全新的子进程中测量模块导入耗时和首个请求的延迟
+
+  app           app.py（Flask）
+  index         api/index.py（Vercel 上的 Flask 函数）
+  batch         api/fetch_comments_batch.py
+  excel         api/export/excel.py
+
+首个请求通过模拟 TikHub 服务完成，Flask 函数额外测量首次 Excel 导出（包含 openpyxl 的延迟加载）
+
+用法:
+  python -m benchmarks.bench_startup --runs 5
+  python -m benchmarks.bench_startup --json startup.json
+  python -m benchmarks.bench_startup --compare startup.json --tolerance 0.3
+"""
+
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 函数名 -> (模块文件, 类型)
+TARGETS = {
+    "app": ("app.py", "flask"),
+    "index": ("api/index.py", "flask"),
+    "batch": ("api/fetch_comments_batch.py", "handler"),
+    "excel": ("api/export/excel.py", "handler"),
+}
+
+BATCH_BODY = {"urls": ["https://www.tiktok.com/@startup/video/1001"]}
+
+
+def excel_body():
+    from benchmarks.data import make_videos
+    return {"videos": make_videos(1, 50)}
+
+
+def post(base_url: str, path: str, body) -> float:
+    """发送 POST 请求，返回耗时（秒）"""
+    host = base_url.split("//", 1)[1]
+    data = json.dumps(body).encode("utf-8")
+    start = time.perf_counter()
+    connection = http.client.HTTPConnection(host, timeout=60)
+    connection.request("POST", path, body=data, headers={"Content-Type": "application/json"})
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    elapsed = time.perf_counter() - start
+    if response.status != 200:
+        raise RuntimeError(f"{path} 返回 HTTP {response.status}")
+    return elapsed
+
+
+def child(name: str) -> None:
+    """子进程：导入目标模块，启动服务并发送首个请求，输出 JSON 结果"""
+    import importlib.util
+    path, kind = TARGETS[name]
+    # 导入前先准备请求体，避免测试数据生成计入首个请求
+    excel_payload = excel_body()
+
+    start = time.perf_counter()
+    spec = importlib.util.spec_from_file_location(f"startup_{name}", os.path.join(BASE_DIR, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    import_ms = (time.perf_counter() - start) * 1000
+
+    from benchmarks.load_test import start_wsgi, start_handler
+    base_url = start_wsgi(module.app) if kind == "flask" else start_handler(module.handler)
+
+    result = {"function": name, "import_ms": import_ms}
+    if name == "excel":
+        result["first_request_ms"] = post(base_url, "/api/export/excel", excel_payload) * 1000
+    else:
+        result["first_request_ms"] = post(base_url, "/api/fetch-comments-batch", BATCH_BODY) * 1000
+        if kind == "flask":
+            result["first_excel_ms"] = post(base_url, "/api/export/excel", excel_payload) * 1000
+
+    print(json.dumps(result))
+
+
+def run_child(name: str, mock_url: str) -> dict:
+    env = dict(os.environ, TIKHUB_BASE_URL=mock_url, REQUEST_LOG="0")
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_startup", "--child", name],
+        cwd=BASE_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动基准")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--functions", default=",".join(TARGETS))
+    parser.add_argument("--runs", type=int, default=5, help="每个函数启动的次数（取中位数）")
+    parser.add_argument("--json", help="将指标写入 JSON 文件（可作为基线）")
+    parser.add_argument("--compare", help="与基线 JSON 比较")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="允许的退化比例")
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    from benchmarks.mock_tikhub import MockConfig, start_mock_server
+    from benchmarks.util import print_table, compare_with_baseline, write_json
+
+    server, _, mock_url = start_mock_server(MockConfig(comments=90, latency_ms=0))
+    rows = []
+    try:
+        for name in args.functions.split(","):
+            runs = [run_child(name, mock_url) for _ in range(args.runs)]
+            row = {"function": name, "runs": len(runs)}
+            for key in ("import_ms", "first_request_ms", "first_excel_ms", "process_ms"):
+                if key in runs[0]:
+                    row[key] = statistics.median(run[key] for run in runs)
+            rows.append(row)
+    finally:
+        server.shutdown()
+
+    print_table(f"冷启动（{args.runs} 次中位数）", rows,
+                ["function", "runs", "import_ms", "first_request_ms", "first_excel_ms", "process_ms"])
+
+    metrics = {}
+    for row in rows:
+        for key in ("import_ms", "first_request_ms", "first_excel_ms"):
+            if key in row:
+                metrics[f"startup_{row['function']}_{key}"] = row[key]
+
+    if args.json:
+        write_json(args.json, metrics)
+
+    if args.compare:
+        regressions = compare_with_baseline(metrics, args.compare, args.tolerance)
+        if regressions:
+            print("\n性能退化:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n与基线相比无退化")
+
+
+if __name__ == '__main__':
+    main()
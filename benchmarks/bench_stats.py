@@ -0,0 +1,71 @@
+"""
+评论统计基准：批量统计接口在大量评论上的耗时
+分别报告首次请求（从评论构建列式数据）与再次请求（列式数据已缓存）的延迟，
+并与逐条遍历评论字典的纯 Python 实现对比
+
+用法: python -m benchmarks.bench_stats [--videos 10] [--comments 10000] [--iterations 5]
+"""
+
+import argparse
+import statistics
+import time
+from collections import Counter
+
+from benchmarks.data import make_videos
+from benchmarks.util import print_table
+
+
+def python_stats(videos):
+    """对照组：逐条遍历评论字典计算相同的统计（排序求分位数、字典计数）"""
+    comments = [c for video in videos for c in video["comments"]]
+    likes = sorted(c["likes"] for c in comments)
+    replies = sorted(c["reply_count"] for c in comments)
+    percentiles = {p: likes[min(len(likes) - 1, len(likes) * p // 100)] for p in (50, 75, 90, 95, 99)}
+    hours = Counter(c["create_time"] // 3600 for c in comments)
+    authors = Counter(c["author"]["uid"] for c in comments)
+    return percentiles, sum(1 for r in replies if r > 0), hours, authors.most_common(10)
+
+
+def timed(call, iterations: int) -> float:
+    """多次调用的中位耗时（毫秒）"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="评论统计基准")
+    parser.add_argument("--videos", type=int, default=10)
+    parser.add_argument("--comments", type=int, default=10000, help="每个视频的评论数")
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    import app
+    videos = make_videos(args.videos, args.comments)
+    for video in videos:
+        app.result_store.save_video(video)
+    job_id = app.result_store.save_job([video["video_id"] for video in videos])
+    client = app.app.test_client()
+
+    def request():
+        response = client.get(f"/api/jobs/{job_id}/stats?bucket=hour")
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    start = time.perf_counter()
+    request()
+    first_ms = (time.perf_counter() - start) * 1000
+
+    total = args.videos * args.comments
+    rows = [
+        {"mode": "stats 首次（构建列）", "comments": total, "ms": first_ms},
+        {"mode": "stats 缓存", "comments": total, "ms": timed(request, args.iterations)},
+        {"mode": "纯 Python 对照", "comments": total, "ms": timed(lambda: python_stats(videos), args.iterations)},
+    ]
+    print_table(f"评论统计（{args.videos} 个视频 × {args.comments} 条）", rows, ["mode", "comments", "ms"])
+
+
+if __name__ == '__main__':
+    main()
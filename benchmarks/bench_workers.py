@@ -0,0 +1,104 @@
+"""
+抓取队列基准：不同工作进程数下的吞吐，以及工作进程崩溃后租约到期、任务被重新领取
+
+每轮使用新的队列文件与结果目录，提交 --videos 个视频后启动 N 个 worker.py 进程（--drain，队列清空后退出），
+上游为带延迟的模拟 TikHub 服务。--crash 时在抓取中途 SIGKILL 一个工作进程，检查其任务是否由其他进程完成
+
+用法:
+  python -m benchmarks.bench_workers [--videos 40] [--comments 2000] [--latency-ms 50] [--workers 1,2,4]
+  python -m benchmarks.bench_workers --crash --lease-seconds 3
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.mock_tikhub import MockConfig, start_mock_server, video_ids
+from benchmarks.util import print_table
+from services.work_queue import CrawlQueue
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_workers(count: int, queue_path: str, results: str, threads: int, env) -> list:
+    command = [sys.executable, os.path.join(BASE_DIR, "worker.py"), "--queue", queue_path,
+               "run", "--results", results, "--threads", str(threads), "--drain"]
+    return [subprocess.Popen(command, cwd=BASE_DIR, env=env, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            for _ in range(count)]
+
+
+def run_round(workers: int, args, base_url: str, crash: bool = False):
+    with tempfile.TemporaryDirectory() as directory:
+        queue_path = os.path.join(directory, "queue.db")
+        results = os.path.join(directory, "results")
+        queue = CrawlQueue(queue_path, lease_seconds=args.lease_seconds)
+        queue.submit(video_ids(args.videos))
+
+        env = dict(os.environ, TIKHUB_BASE_URL=base_url, CRAWL_LEASE_SECONDS=str(args.lease_seconds))
+        start = time.perf_counter()
+        processes = start_workers(workers, queue_path, results, args.threads, env)
+        if crash:
+            # 等第一个进程领到任务并抓取一段时间后强制结束，不给它交还任务的机会
+            time.sleep(args.crash_after)
+            processes[0].send_signal(signal.SIGKILL)
+        for process in processes:
+            process.wait()
+        elapsed = time.perf_counter() - start
+
+        counts = queue.counts()
+        conn = queue._conn()
+        retried = conn.execute("SELECT COUNT(*) FROM tasks WHERE attempts > 1").fetchone()[0]
+        files = len([name for name in os.listdir(results) if name.endswith(".json")]) \
+            if os.path.isdir(results) else 0
+        return {
+            "workers": workers,
+            "seconds": elapsed,
+            "videos_per_s": args.videos / elapsed,
+            "done": counts["done"],
+            "failed": counts["failed"],
+            "retried": retried,
+            "result_files": files,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抓取队列基准")
+    parser.add_argument("--videos", type=int, default=40)
+    parser.add_argument("--comments", type=int, default=2000, help="每个视频的评论数")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--threads", type=int, default=1, help="每个工作进程的抓取线程数")
+    parser.add_argument("--lease-seconds", type=float, default=60.0)
+    parser.add_argument("--crash", action="store_true", help="抓取中途杀掉一个工作进程")
+    parser.add_argument("--crash-after", type=float, default=1.0, help="启动后多少秒杀掉工作进程")
+    args = parser.parse_args()
+
+    server, stats, base_url = start_mock_server(MockConfig(comments=args.comments, latency_ms=args.latency_ms))
+    try:
+        if args.crash:
+            row = run_round(max(int(w) for w in args.workers.split(",")), args, base_url, crash=True)
+            print_table(f"崩溃恢复（租约 {args.lease_seconds}s，{args.crash_after}s 后 SIGKILL 一个进程）", [row],
+                        ["workers", "seconds", "done", "failed", "retried", "result_files"])
+            return
+
+        rows = []
+        for workers in sorted({int(w) for w in args.workers.split(",")}):
+            stats.reset()
+            row = run_round(workers, args, base_url)
+            row["upstream_requests"] = stats.requests
+            rows.append(row)
+        for row in rows:
+            row["speedup"] = row["videos_per_s"] / rows[0]["videos_per_s"]
+        print_table(f"工作进程扩展（{args.videos} 个视频 × {args.comments} 条，上游延迟 {args.latency_ms}ms，"
+                    f"每进程 {args.threads} 线程，{os.cpu_count()} 核）", rows,
+                    ["workers", "seconds", "videos_per_s", "speedup", "done", "upstream_requests"])
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
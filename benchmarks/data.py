@@ -0,0 +1,42 @@
+"""
+基准测试用的模拟评论数据
+"""
+
+from typing import Dict, Any, List
+
+BASE_VIDEO_ID = 7000000000000000000
+BASE_CREATE_TIME = 1700000000
+
+
+def make_comment(video_index: int, i: int) -> Dict[str, Any]:
+    """生成一条格式化后的评论（字段与 format_comment 输出一致）"""
+    create_time = BASE_CREATE_TIME + i * 60
+    return {
+        "id": f"{BASE_VIDEO_ID + video_index}{i:06d}",
+        "text": f"评论 {i} - this is a benchmark comment with some text 🎵",
+        "author": {
+            "uid": str(6800000000000000000 + i % 500),
+            "nickname": f"user_{i % 500}",
+            "username": f"user{i % 500}",
+            "avatar": "",
+            "signature": ""
+        },
+        "likes": (i * 37) % 10000,
+        "create_time": create_time,
+        "create_time_formatted": f"2023-11-14 {(i // 60) % 24:02d}:{i % 60:02d}:00",
+        "reply_count": i % 13,
+        "status": 1
+    }
+
+
+def make_videos(video_count: int, comment_count: int) -> List[Dict[str, Any]]:
+    """生成 video_count 个视频，每个 comment_count 条评论"""
+    return [
+        {
+            "url": f"https://www.tiktok.com/@bench/video/{BASE_VIDEO_ID + v}",
+            "video_id": str(BASE_VIDEO_ID + v),
+            "total_comments": comment_count,
+            "comments": [make_comment(v, i) for i in range(comment_count)],
+        }
+        for v in range(video_count)
+    ]
@@ -0,0 +1,188 @@
+"""
+HTTP 压测：批量抓取与导出接口在不同并发下的吞吐、延迟百分位与峰值 RSS
+
+两种模式:
+  进程内（默认）: 在本进程中启动模拟 TikHub 服务，以及 Flask 应用（--app flask）或
+                 serverless 函数（--app serverless，api/fetch_comments_batch.py 与 api/export/excel.py），
+                 RSS 即被测服务的内存
+  外部服务: --base-url 指向已运行的服务（应以 TIKHUB_BASE_URL 指向模拟服务启动），
+           --pid 指定服务进程以采样其 RSS
+
+用法:
+  python -m benchmarks.load_test --concurrency 1,5,10,20 --duration 10
+  python -m benchmarks.load_test --app serverless --scenarios batch,excel
+  python -m benchmarks.mock_tikhub --port 8900 &
+  TIKHUB_BASE_URL=http://127.0.0.1:8900 python app.py &
+  python -m benchmarks.load_test --base-url http://127.0.0.1:5001 --pid $!
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from typing import Dict, Any, Callable
+
+import requests
+
+from benchmarks.data import make_videos
+from benchmarks.mock_tikhub import MockConfig, start_mock_server, video_ids
+from benchmarks.util import latency_summary, print_table, RssSampler
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_scenarios(args) -> Dict[str, Callable[[], Dict[str, Any]]]:
+    """场景名 -> 生成请求 (path, json body) 的函数"""
+    urls = [f"https://www.tiktok.com/@load/video/{i}" for i in video_ids(args.videos)]
+    videos = make_videos(args.videos, args.export_comments)
+    comments = videos[0]["comments"]
+
+    scenarios = {
+        "batch": lambda: ("/api/fetch-comments-batch", {"urls": urls}),
+        "excel": lambda: ("/api/export/excel", {"videos": videos}),
+    }
+    for format in ("csv", "json", "ndjson"):
+        scenarios[format] = (lambda f: lambda: (f"/api/export/{f}", {"video_id": "load", "comments": comments}))(format)
+    return scenarios
+
+
+def start_wsgi(app) -> str:
+    """在后台线程中以多线程 WSGI 服务运行 Flask 应用"""
+    import logging
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def start_handler(handler_class) -> str:
+    """在后台线程中运行 BaseHTTPRequestHandler 格式的 serverless 函数"""
+    quiet = type(handler_class.__name__, (handler_class,), {"log_message": lambda self, *args: None})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), quiet)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def load_module(name: str, path: str):
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def in_process_routes(app_kind: str) -> Dict[str, str]:
+    """启动被测服务，返回 场景名 -> 服务地址"""
+    if app_kind == "flask":
+        import app
+        base = start_wsgi(app.app)
+        return {"default": base}
+
+    # serverless：与 vercel.json 的路由一致
+    batch = load_module("fetch_comments_batch", os.path.join(BASE_DIR, "api", "fetch_comments_batch.py"))
+    excel = load_module("export_excel", os.path.join(BASE_DIR, "api", "export", "excel.py"))
+    index = load_module("index", os.path.join(BASE_DIR, "api", "index.py"))
+    return {
+        "batch": start_handler(batch.handler),
+        "excel": start_handler(excel.handler),
+        "default": start_wsgi(index.app),
+    }
+
+
+def run_level(base_url: str, make_request, concurrency: int, duration: float,
+              pid: int = None) -> Dict[str, Any]:
+    """closed-loop 压测：concurrency 个客户端在 duration 秒内不断发送请求"""
+    latencies = []
+    errors = [0]
+    # 服务繁忙返回的 429（准入控制），不计入 errors
+    rejected = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            path, body = make_request()
+            data = json.dumps(body)
+            start = time.perf_counter()
+            try:
+                response = session.post(base_url + path, data=data,
+                                        headers={"Content-Type": "application/json"}, timeout=120)
+                status = response.status_code
+                response.content
+            except requests.RequestException:
+                status = None
+            elapsed = time.perf_counter() - start
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                elif status == 429:
+                    rejected[0] += 1
+                else:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    with RssSampler(pid) as rss:
+        threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    wall = time.perf_counter() - started
+
+    return dict(
+        {"concurrency": concurrency, "ok": len(latencies), "errors": errors[0], "rejected": rejected[0],
+         "rps": len(latencies) / wall, "peak_rss_mb": rss.peak_mb},
+        **latency_summary(latencies)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP 压测")
+    parser.add_argument("--app", choices=("flask", "serverless"), default="flask")
+    parser.add_argument("--base-url", help="压测已运行的服务（不启动进程内服务）")
+    parser.add_argument("--pid", type=int, help="外部服务进程 ID，用于采样 RSS")
+    parser.add_argument("--scenarios", default="batch,excel,csv")
+    parser.add_argument("--concurrency", default="1,5,10,20")
+    parser.add_argument("--duration", type=float, default=10.0, help="每个并发级别的秒数")
+    parser.add_argument("--videos", type=int, default=5, help="每次批量请求 / Excel 导出的视频数")
+    parser.add_argument("--comments", type=int, default=300, help="模拟上游每个视频的评论数")
+    parser.add_argument("--export-comments", type=int, default=1500, help="导出请求中每个视频的评论数")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="模拟上游延迟")
+    args = parser.parse_args()
+
+    if args.base_url:
+        routes = {"default": args.base_url.rstrip("/")}
+        mock = None
+    else:
+        from services import tikhub
+        mock, _, mock_url = start_mock_server(MockConfig(comments=args.comments, latency_ms=args.latency_ms))
+        tikhub.BASE_URL = mock_url
+        routes = in_process_routes(args.app)
+
+    scenarios = build_scenarios(args)
+    levels = [int(c) for c in args.concurrency.split(",")]
+    target = args.base_url or f"进程内 {args.app}"
+    print(f"压测目标: {target}  每级 {args.duration}s  并发: {levels}")
+
+    try:
+        for name in args.scenarios.split(","):
+            if name not in scenarios:
+                print(f"未知场景: {name}", file=sys.stderr)
+                continue
+            base_url = routes.get(name, routes["default"])
+            rows = [run_level(base_url, scenarios[name], level, args.duration, args.pid) for level in levels]
+            print_table(f"场景 {name}", rows, ["concurrency", "ok", "errors", "rejected", "rps", "p50_ms", "p95_ms",
+                                                "p99_ms", "peak_rss_mb"])
+    finally:
+        if mock:
+            mock.shutdown()
+
+
+if __name__ == '__main__':
+    main()
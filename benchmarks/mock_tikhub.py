@@ -0,0 +1,250 @@
+"""
+本地模拟 TikHub 评论接口
+实现 /api/v1/tiktok/app/v3/fetch_video_comments，按 aweme_id 生成确定性的分页评论
+可配置延迟、每个视频的评论数、单页上限和评论文本长度，用于无网络、不消耗配额的基准测试
+
+独立运行: python -m benchmarks.mock_tikhub --port 8900 --latency-ms 50
+然后设置 TIKHUB_BASE_URL=http://127.0.0.1:8900 启动应用
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from services.tikhub import COMMENTS_PATH
+
+BASE_CREATE_TIME = 1700000000
+
+
+@dataclass
+class MockConfig:
+    """模拟服务配置"""
+    # 每个视频默认评论数
+    comments: int = 300
+    # 指定视频的评论数（aweme_id -> 条数）
+    sizes: Dict[str, int] = field(default_factory=dict)
+    # 单页最多返回的条数（模拟上游对 count 的限制）
+    max_count: int = 50
+    # 每次请求的基础延迟与抖动（毫秒），抖动由请求参数决定，结果可复现
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    # 评论文本长度（字符）
+    text_length: int = 60
+    # 每个 API Key 每秒允许的请求数，超出返回 429（0 表示不限）
+    key_rate: float = 0.0
+    # 下一页游标回退的条数，模拟抓取期间有新评论插入导致的跨页重复
+    overlap: int = 0
+
+    def comments_for(self, aweme_id: str) -> int:
+        return self.sizes.get(aweme_id, self.comments)
+
+
+@dataclass
+class MockStats:
+    """请求计数"""
+    requests: int = 0
+    comments: int = 0
+    rate_limited: int = 0
+    # API Key -> [当前秒, 该秒内请求数]
+    key_windows: Dict[str, List[int]] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def record(self, comments: int) -> None:
+        with self.lock:
+            self.requests += 1
+            self.comments += comments
+
+    def allow(self, api_key: str, rate: float) -> bool:
+        """按 Key 的固定一秒窗口限流"""
+        second = int(time.monotonic())
+        with self.lock:
+            window = self.key_windows.setdefault(api_key, [second, 0])
+            if window[0] != second:
+                window[:] = [second, 0]
+            window[1] += 1
+            if window[1] > rate:
+                self.rate_limited += 1
+                return False
+            return True
+
+    def reset(self) -> None:
+        with self.lock:
+            self.requests = 0
+            self.comments = 0
+            self.rate_limited = 0
+            self.key_windows.clear()
+
+
+def make_raw_comment(aweme_id: str, index: int, text_length: int) -> Dict[str, Any]:
+    """生成一条 TikHub 原始格式的评论"""
+    uid = 6800000000000000000 + index % 997
+    text = f"#{index} 评论 comment 🎵 "
+    text = (text * (text_length // len(text) + 1))[:text_length]
+    return {
+        "cid": f"{aweme_id[-6:]}{index:08d}",
+        "text": text,
+        "user": {
+            "uid": str(uid),
+            "nickname": f"user_{index % 997}",
+            "unique_id": f"user{index % 997}",
+            "avatar_thumb": {"url_list": [f"https://p16.example.com/avatar/{uid}.jpeg"]},
+            "signature": ""
+        },
+        "digg_count": (index * 7919) % 5000,
+        "create_time": BASE_CREATE_TIME + index * 37,
+        "reply_comment_total": index % 11,
+        "status": 1
+    }
+
+
+def build_page(config: MockConfig, aweme_id: str, cursor: int, count: int) -> Dict[str, Any]:
+    """按游标与条数生成一页响应"""
+    total = config.comments_for(aweme_id)
+    count = max(1, min(count, config.max_count))
+    end = min(cursor + count, total)
+    comments = [make_raw_comment(aweme_id, i, config.text_length) for i in range(cursor, end)]
+    has_more = end < total
+    # 回退不超过本页条数减一，保证游标前进
+    next_cursor = end - min(config.overlap, end - cursor - 1)
+
+    return {
+        "code": 200,
+        "data": {
+            "comments": comments,
+            "cursor": next_cursor if has_more else 0,
+            "has_more": 1 if has_more else 0,
+            "total": total
+        }
+    }
+
+
+def request_delay(config: MockConfig, aweme_id: str, cursor: int) -> float:
+    """请求延迟（秒），同一请求参数总是得到相同的抖动"""
+    if not config.latency_ms and not config.jitter_ms:
+        return 0.0
+    jitter = random.Random(f"{aweme_id}:{cursor}").uniform(0, config.jitter_ms)
+    return (config.latency_ms + jitter) / 1000
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """模拟接口的请求处理器，config 与 stats 由 make_server 注入"""
+    config: MockConfig = MockConfig()
+    stats: MockStats = MockStats()
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path != COMMENTS_PATH:
+            self.send_json(404, {"detail": "Not Found"})
+            return
+
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        aweme_id = query.get("aweme_id", "")
+        try:
+            cursor = int(query.get("cursor", 0))
+            count = int(query.get("count", 20))
+        except ValueError:
+            self.send_json(422, {"detail": "Invalid cursor or count"})
+            return
+
+        if self.config.key_rate:
+            api_key = self.headers.get("Authorization", "")
+            if not self.stats.allow(api_key, self.config.key_rate):
+                self.send_json(429, {"detail": "Too Many Requests"}, {"Retry-After": "1"})
+                return
+
+        self.respond(aweme_id, cursor, count)
+
+    def respond(self, aweme_id: str, cursor: int, count: int) -> None:
+        """返回正常的一页评论（故障注入等扩展在子类中覆盖）"""
+        delay = request_delay(self.config, aweme_id, cursor)
+        if delay:
+            time.sleep(delay)
+
+        page = build_page(self.config, aweme_id, cursor, count)
+        self.stats.record(len(page["data"]["comments"]))
+        self.send_json(200, page)
+
+    def send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端已超时断开
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(config: Optional[MockConfig] = None, host: str = "127.0.0.1",
+                port: int = 0, handler_class=MockHandler) -> Tuple[ThreadingHTTPServer, MockStats]:
+    """创建模拟服务（port=0 时自动分配端口）"""
+    stats = MockStats()
+    handler = type("BoundMockHandler", (handler_class,), {
+        "config": config or MockConfig(),
+        "stats": stats
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server, stats
+
+
+def start_mock_server(config: Optional[MockConfig] = None,
+                      handler_class=MockHandler) -> Tuple[ThreadingHTTPServer, MockStats, str]:
+    """在后台线程中启动模拟服务，返回 (server, stats, base_url)"""
+    server, stats = make_server(config, handler_class=handler_class)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return server, stats, f"http://{host}:{port}"
+
+
+def video_ids(count: int, start: int = 7100000000000000000) -> List[str]:
+    """生成模拟视频 ID"""
+    return [str(start + i) for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 TikHub 评论接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--comments", type=int, default=300, help="每个视频的评论数")
+    parser.add_argument("--max-count", type=int, default=50, help="单页最多返回条数")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--text-length", type=int, default=60)
+    parser.add_argument("--key-rate", type=float, default=0.0, help="每个 API Key 每秒请求上限（0 不限）")
+    parser.add_argument("--overlap", type=int, default=0, help="下一页游标回退的条数（模拟跨页重复）")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        comments=args.comments,
+        max_count=args.max_count,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        text_length=args.text_length,
+        key_rate=args.key_rate,
+        overlap=args.overlap
+    )
+    server, _ = make_server(config, args.host, args.port)
+    print(f"模拟 TikHub 服务: http://{args.host}:{args.port}{COMMENTS_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+"""
+抓取链路故障注入压测
+在模拟 TikHub 服务上按脚本注入上游故障，持续驱动 fetch_comments_app_v3 / fetch_all_comments /
+process_request，按故障类型报告有效吞吐、浪费的上游调用和恢复时间，用于比较不同的容错策略
+
+故障类型:
+  429          返回 HTTP 429（限流）
+  5xx          返回 HTTP 502/503
+  truncated    返回被截断的 JSON
+  zero_cursor  返回 has_more=true 但 cursor=0
+  stall        响应前挂起 param 秒（默认 30）
+
+故障计划格式: 类型:开始秒:持续秒:比例[:参数]，可多次指定，例如
+  python -m benchmarks.soak_faults --duration 60 --target fetch_all \\
+      --fault 429:5:10:0.8 --fault 5xx:25:5:0.5 --fault stall:40:5:0.2:8
+也可用 --schedule-file 指定 JSON 列表: [{"fault": "429", "start": 5, "duration": 10, "rate": 0.8}]
+"""
+
+import argparse
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+
+from benchmarks.mock_tikhub import MockConfig, MockHandler, start_mock_server, build_page
+from benchmarks.util import latency_summary, print_table
+from services import tikhub
+
+FAULT_TYPES = ("429", "5xx", "truncated", "zero_cursor", "stall")
+
+
+@dataclass
+class FaultWindow:
+    """一段故障注入窗口（相对压测开始的秒数）"""
+    fault: str
+    start: float
+    duration: float
+    rate: float = 1.0
+    param: Optional[float] = None
+
+    @property
+    def end(self) -> float:
+        return self.start + self.duration
+
+    @classmethod
+    def parse(cls, spec: str) -> "FaultWindow":
+        parts = spec.split(":")
+        if len(parts) < 4 or parts[0] not in FAULT_TYPES:
+            raise ValueError(f"无效的故障计划: {spec}")
+        return cls(
+            fault=parts[0],
+            start=float(parts[1]),
+            duration=float(parts[2]),
+            rate=float(parts[3]),
+            param=float(parts[4]) if len(parts) > 4 else None
+        )
+
+
+@dataclass
+class UpstreamLog:
+    """模拟服务端记录的每次上游调用"""
+    calls: Dict[str, List[Optional[str]]] = field(default_factory=lambda: defaultdict(list))
+    injected: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def record(self, aweme_id: str, fault: Optional[str]) -> None:
+        with self.lock:
+            self.calls[aweme_id].append(fault)
+            if fault:
+                self.injected[fault] += 1
+
+
+class FaultSchedule:
+    """按时间与比例决定每次请求注入的故障，随机数种子固定以便复现"""
+
+    def __init__(self, windows: List[FaultWindow], seed: int = 42):
+        self.windows = windows
+        self.started = time.monotonic()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def pick(self) -> Optional[FaultWindow]:
+        now = self.elapsed()
+        with self._lock:
+            roll = self._random.random()
+        for window in self.windows:
+            if window.start <= now < window.end and roll < window.rate:
+                return window
+        return None
+
+
+class FaultHandler(MockHandler):
+    """按故障计划返回异常响应的模拟接口"""
+    schedule: FaultSchedule = None
+    log: UpstreamLog = None
+
+    def respond(self, aweme_id: str, cursor: int, count: int) -> None:
+        window = self.schedule.pick()
+        self.log.record(aweme_id, window.fault if window else None)
+
+        if window is None:
+            super().respond(aweme_id, cursor, count)
+        elif window.fault == "429":
+            self.send_json(429, {"detail": "Too Many Requests"})
+        elif window.fault == "5xx":
+            self.send_json(503 if cursor % 2 else 502, {"detail": "Bad Gateway"})
+        elif window.fault == "truncated":
+            body = json.dumps(build_page(self.config, aweme_id, cursor, count)).encode("utf-8")
+            body = body[:len(body) // 2]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        elif window.fault == "zero_cursor":
+            page = build_page(self.config, aweme_id, cursor, count)
+            page["data"]["has_more"] = 1
+            page["data"]["cursor"] = 0
+            self.send_json(200, page)
+        elif window.fault == "stall":
+            time.sleep(window.param if window.param is not None else 30)
+            super().respond(aweme_id, cursor, count)
+
+
+@dataclass
+class Outcome:
+    """一次被测调用的结果"""
+    started: float
+    finished: float
+    aweme_ids: List[str]
+    status: str  # complete / incomplete / failed
+    comments: int
+
+
+class Workload:
+    """被测目标：每次调用使用新的视频 ID，以便把上游调用归属到具体的调用"""
+
+    def __init__(self, target: str, config: MockConfig, videos_per_request: int):
+        self.target = target
+        self.config = config
+        self.videos_per_request = videos_per_request
+        self._ids = itertools.count(7200000000000000000)
+        self._lock = threading.Lock()
+
+    def next_ids(self, n: int) -> List[str]:
+        with self._lock:
+            return [str(next(self._ids)) for _ in range(n)]
+
+    def run_once(self, schedule: FaultSchedule) -> Outcome:
+        started = schedule.elapsed()
+        if self.target == "app_v3":
+            aweme_ids = self.next_ids(1)
+            result = tikhub.fetch_comments_app_v3(aweme_ids[0])
+            ok = "error" not in result
+            comments = len(result.get("data", {}).get("comments", [])) if ok else 0
+            status = "complete" if ok else "failed"
+        elif self.target == "fetch_all":
+            aweme_ids = self.next_ids(1)
+            result = tikhub.fetch_all_comments(aweme_ids[0])
+            comments = result["total_comments"]
+            status = self._status(result["success"], comments, aweme_ids[0])
+        else:
+            sys.path.insert(0, "api")
+            import fetch_comments_batch
+            aweme_ids = self.next_ids(self.videos_per_request)
+            urls = [f"https://www.tiktok.com/@soak/video/{i}" for i in aweme_ids]
+            response, _ = fetch_comments_batch.process_request({"urls": urls})
+            videos = response.get("videos", [])
+            comments = sum(v["total_comments"] for v in videos if v["success"])
+            statuses = [self._status(v["success"], v["total_comments"], v["video_id"]) for v in videos]
+            status = ("complete" if all(s == "complete" for s in statuses)
+                      else "failed" if all(s == "failed" for s in statuses) else "incomplete")
+        return Outcome(started, schedule.elapsed(), aweme_ids, status, comments)
+
+    def _status(self, success: bool, comments: int, aweme_id: str) -> str:
+        if not success:
+            return "failed"
+        expected = self.config.comments_for(aweme_id)
+        if self.target == "process_request":
+            expected = min(expected, 1500)
+        return "complete" if comments >= expected else "incomplete"
+
+
+def run_soak(workload: Workload, schedule: FaultSchedule, workers: int, duration: float) -> List[Outcome]:
+    """workers 个线程持续调用被测目标，直到 duration 秒"""
+    outcomes = []
+    lock = threading.Lock()
+
+    def worker():
+        while schedule.elapsed() < duration:
+            outcome = workload.run_once(schedule)
+            with lock:
+                outcomes.append(outcome)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def summarize(outcomes: List[Outcome], log: UpstreamLog, windows: List[FaultWindow],
+              duration: float) -> Dict[str, Any]:
+    """汇总有效吞吐、浪费的上游调用与每个故障窗口的恢复时间"""
+    complete = [o for o in outcomes if o.status == "complete"]
+    complete_ids = {i for o in complete for i in o.aweme_ids}
+
+    total_calls = sum(len(calls) for calls in log.calls.values())
+    useful_calls = sum(
+        sum(1 for fault in calls if fault is None)
+        for aweme_id, calls in log.calls.items() if aweme_id in complete_ids
+    )
+
+    # 每个窗口内的调用与恢复时间：窗口结束后第一个完整成功调用的完成时间
+    window_rows = []
+    for window in windows:
+        in_window = [o for o in outcomes if o.started < window.end and o.finished > window.start]
+        affected = [o for o in in_window if o.status != "complete"]
+        recovered = [o.finished for o in complete if o.started >= window.end]
+        window_rows.append({
+            "fault": window.fault,
+            "start_s": window.start,
+            "duration_s": window.duration,
+            "rate": window.rate,
+            "calls": len(in_window),
+            "affected": len(affected),
+            "recovery_s": (min(recovered) - window.end) if recovered else None,
+        })
+
+    return {
+        "duration_s": duration,
+        "calls": len(outcomes),
+        "complete": len(complete),
+        "incomplete": sum(1 for o in outcomes if o.status == "incomplete"),
+        "failed": sum(1 for o in outcomes if o.status == "failed"),
+        "goodput_comments_per_sec": sum(o.comments for o in complete) / duration,
+        "goodput_calls_per_sec": len(complete) / duration,
+        "upstream_calls": total_calls,
+        "wasted_upstream_calls": total_calls - useful_calls,
+        "wasted_ratio": (total_calls - useful_calls) / total_calls if total_calls else 0.0,
+        "injected": dict(log.injected),
+        "latency": latency_summary([o.finished - o.started for o in outcomes]),
+        "windows": window_rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抓取链路故障注入压测")
+    parser.add_argument("--target", choices=("app_v3", "fetch_all", "process_request"), default="fetch_all")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--videos-per-request", type=int, default=5, help="process_request 每次的视频数")
+    parser.add_argument("--comments", type=int, default=300, help="每个视频的评论数")
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--timeout", type=float, default=tikhub.REQUEST_TIMEOUT, help="上游请求超时（秒）")
+    parser.add_argument("--fault", action="append", default=[], help="故障计划，见模块说明")
+    parser.add_argument("--schedule-file", help="JSON 格式的故障计划")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="将报告写入 JSON 文件")
+    args = parser.parse_args()
+
+    windows = [FaultWindow.parse(spec) for spec in args.fault]
+    if args.schedule_file:
+        with open(args.schedule_file, "r", encoding="utf-8") as f:
+            windows.extend(FaultWindow(**item) for item in json.load(f))
+
+    config = MockConfig(comments=args.comments, latency_ms=args.latency_ms)
+    schedule = FaultSchedule(windows, seed=args.seed)
+    log = UpstreamLog()
+    handler = type("SoakHandler", (FaultHandler,), {"schedule": schedule, "log": log})
+    server, _, base_url = start_mock_server(config, handler_class=handler)
+    tikhub.BASE_URL = base_url
+    tikhub.REQUEST_TIMEOUT = args.timeout
+
+    workload = Workload(args.target, config, args.videos_per_request)
+    schedule.started = time.monotonic()
+    try:
+        outcomes = run_soak(workload, schedule, args.workers, args.duration)
+    finally:
+        server.shutdown()
+
+    report = summarize(outcomes, log, windows, schedule.elapsed())
+
+    print(f"目标: {args.target}  并发: {args.workers}  时长: {report['duration_s']:.1f}s")
+    print(f"调用: {report['calls']}  完整: {report['complete']}  不完整: {report['incomplete']}  "
+          f"失败: {report['failed']}")
+    print(f"有效吞吐: {report['goodput_calls_per_sec']:.2f} 次/秒, "
+          f"{report['goodput_comments_per_sec']:.0f} 条评论/秒")
+    print(f"上游调用: {report['upstream_calls']}  浪费: {report['wasted_upstream_calls']} "
+          f"({report['wasted_ratio']:.1%})  注入: {report['injected']}")
+    latency = report["latency"]
+    print(f"调用延迟: p50 {latency['p50_ms']:.0f}ms  p95 {latency['p95_ms']:.0f}ms  "
+          f"p99 {latency['p99_ms']:.0f}ms")
+    if report["windows"]:
+        print_table("故障窗口", report["windows"],
+                    ["fault", "start_s", "duration_s", "rate", "calls", "affected", "recovery_s"])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
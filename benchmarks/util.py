@@ -0,0 +1,112 @@
+"""
+基准脚本共用的统计与报告工具
+"""
+
+import json
+import math
+from typing import Dict, Any, List, Sequence
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """最近秩法百分位数，values 为空时返回 0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(latencies: Sequence[float]) -> Dict[str, float]:
+    """延迟统计（毫秒）"""
+    return {
+        "count": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+def print_table(title: str, rows: List[Dict[str, Any]], columns: List[str]) -> None:
+    """打印对齐的结果表"""
+    print(f"\n{title}")
+    widths = [max(len(col), *(len(_fmt(row.get(col))) for row in rows)) + 2 for col in columns]
+    print("".join(col.rjust(w) if i else col.ljust(w) for i, (col, w) in enumerate(zip(columns, widths))))
+    for row in rows:
+        cells = [_fmt(row.get(col)) for col in columns]
+        print("".join(c.rjust(w) if i else c.ljust(w) for i, (c, w) in enumerate(zip(cells, widths))))
+
+
+def _fmt(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.1f}" if abs(value) >= 10 else f"{value:.3f}"
+    return "" if value is None else str(value)
+
+
+def compare_with_baseline(metrics: Dict[str, float], baseline_path: str, tolerance: float) -> List[str]:
+    """
+    与基线结果比较，返回退化的指标说明
+    以 _ms / _s / _mb 结尾的指标越小越好，其余越大越好
+    """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for name, value in metrics.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        lower_is_better = name.endswith(("_ms", "_s", "_mb"))
+        change = (value - base) / base
+        if (lower_is_better and change > tolerance) or (not lower_is_better and -change > tolerance):
+            regressions.append(f"{name}: {base:.3f} -> {value:.3f} ({change:+.0%})")
+    return regressions
+
+
+def write_json(path: str, metrics: Dict[str, float]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2, sort_keys=True)
+
+
+def rss_mb(pid: int = None) -> float:
+    """进程当前常驻内存（MB），读取 /proc；不可用时退回到本进程的峰值 RSS"""
+    path = f"/proc/{pid or 'self'}/status"
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RssSampler:
+    """后台线程按固定间隔采样 RSS，记录峰值"""
+
+    def __init__(self, pid: int = None, interval: float = 0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = None
+        self._thread = None
+
+    def __enter__(self) -> "RssSampler":
+        import threading
+        self._stop = threading.Event()
+        self.peak_mb = rss_mb(self.pid)
+
+        def sample():
+            while not self._stop.wait(self.interval):
+                self.peak_mb = max(self.peak_mb, rss_mb(self.pid))
+
+        self._thread = threading.Thread(target=sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, rss_mb(self.pid))
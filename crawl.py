@@ -0,0 +1,330 @@
+"""
+TikTok 评论批量抓取命令行工具
+不经过 Web 服务，直接抓取 URL 列表中的全部视频，评论逐个视频写入磁盘（NDJSON / CSV / Parquet）
+
+用法:
+  python crawl.py urls.txt -o out/ --format ndjson --concurrency 8
+  cat urls.txt | python crawl.py - -o out/ --format parquet
+
+URL 列表每行一个 URL 或视频 ID，空行与 # 开头的行忽略。输出目录中:
+  comments.jsonl / comments.csv    NDJSON / CSV 数据（追加写入）
+  parts/part-00001.parquet …       Parquet 分片（每片写完后原子改名）
+  progress.jsonl                   进度日志：每完成一个视频追加一行
+
+中断后用相同参数重新运行即从断点继续：已完成的视频跳过，失败的视频重试，
+数据文件截断到最后一个完成视频的末尾（丢弃写了一半的视频）。--restart 清空输出重新开始
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, List, Optional, TextIO, Tuple
+
+from services.exporters import CHUNK_ROWS, CSV_HEADER, csv_row
+from services.tikhub import fetch_all_comments, format_comment, read_urls
+
+FORMATS = ("ndjson", "csv", "parquet")
+DATA_FILES = {"ndjson": "comments.jsonl", "csv": "comments.csv"}
+PROGRESS_FILE = "progress.jsonl"
+PARTS_DIR = "parts"
+
+# Parquet 分片累计的行数
+PART_ROWS = 100000
+
+# 分片文件名中的序号；不匹配的文件不是本工具写的，清理时不动
+PART_NAME = re.compile(r'^part-(\d{5})\.parquet$')
+
+
+def crawl_video(url: str, video_id: str, max_comments: Optional[int]) -> Dict[str, Any]:
+    """抓取并格式化一个视频的评论（在工作线程中运行）"""
+    start = time.perf_counter()
+    try:
+        result = fetch_all_comments(video_id, max_comments=max_comments)
+    except Exception as e:
+        result = {"success": False, "error": f"处理失败: {str(e)}"}
+
+    if not result["success"]:
+        return {"url": url, "video_id": video_id, "success": False,
+                "error": result.get("error", "未知错误"), "seconds": time.perf_counter() - start}
+
+    return {
+        "url": url,
+        "video_id": video_id,
+        "success": True,
+        "comments": [format_comment(c) for c in result["comments"]],
+        "duplicates": result.get("duplicates", 0),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+class Progress:
+    """进度日志（追加写入的 JSON Lines），记录每个视频的结果与写完该视频后数据文件的长度"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[str, Dict[str, Any]] = {}
+        self.format: Optional[str] = None
+        self.offset = 0
+        self.parts = 0
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 最后一行可能在写入时被中断
+                        continue
+                    if record.get("status") == "done":
+                        self.done[record["video_id"]] = record
+                    self.format = record.get("format", self.format)
+                    self.offset = record.get("offset", self.offset)
+                    self.parts = record.get("parts", self.parts)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def append(self, record: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        if record.get("status") == "done":
+            self.done[record["video_id"]] = record
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class TextWriter:
+    """NDJSON / CSV：每个视频写完后刷盘，返回当前文件长度作为断点"""
+
+    def __init__(self, path: str, format: str, offset: int):
+        self.format = format
+        exists = os.path.exists(path)
+        self._file = open(path, "r+b" if exists else "wb")
+        # 丢弃上次中断时写了一半的视频
+        self._file.truncate(offset if exists else 0)
+        self._file.seek(0, os.SEEK_END)
+        self._buffer = io.StringIO()
+        self._csv = csv.writer(self._buffer)
+        if format == "csv" and self._file.tell() == 0:
+            # 带 UTF-8 BOM，Excel 可直接打开
+            self._buffer.write("\ufeff")
+            self._csv.writerow(["Video ID"] + CSV_HEADER)
+            self._drain()
+
+    def _drain(self) -> None:
+        self._file.write(self._buffer.getvalue().encode("utf-8"))
+        self._buffer.seek(0)
+        self._buffer.truncate(0)
+
+    def write(self, video: Dict[str, Any]) -> None:
+        """追加一个视频的评论并刷盘"""
+        video_id = video["video_id"]
+        for i, comment in enumerate(video["comments"], 1):
+            if self.format == "ndjson":
+                self._buffer.write(json.dumps(dict(comment, video_id=video_id), ensure_ascii=False) + "\n")
+            else:
+                self._csv.writerow([video_id] + csv_row(comment))
+            if i % CHUNK_ROWS == 0:
+                self._drain()
+        self._drain()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def flush(self) -> int:
+        """已写入的长度（断点）"""
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetWriter:
+    """
+    Parquet：评论累计到 PART_ROWS 行写成一个分片（先写临时文件再改名），
+    分片写完后其中的视频才算完成，中断时丢失的只是尚未成片的视频
+    """
+
+    def __init__(self, directory: str, parts: int):
+        from services.columnar_export import comment_schema
+        self.schema = comment_schema()
+        self.directory = directory
+        self.parts = parts
+        self.pending: List[Dict[str, Any]] = []
+        self.rows = 0
+        os.makedirs(directory, exist_ok=True)
+        # 清理上次中断时未改名的临时文件及其后的分片
+        for name in os.listdir(directory):
+            match = PART_NAME.match(name)
+            if name.endswith(".tmp") or (match and int(match.group(1)) > parts):
+                os.remove(os.path.join(directory, name))
+
+    def write(self, video: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """缓存一个视频；写出分片时返回该分片包含的视频"""
+        self.pending.append(video)
+        self.rows += len(video["comments"])
+        return self.flush() if self.rows >= PART_ROWS else None
+
+    def flush(self) -> Optional[List[Dict[str, Any]]]:
+        if not self.pending:
+            return None
+        import pyarrow.parquet as pq
+        from services.columnar_export import iter_record_batches
+
+        self.parts += 1
+        path = os.path.join(self.directory, f"part-{self.parts:05d}.parquet")
+        with pq.ParquetWriter(path + ".tmp", self.schema, compression="zstd") as writer:
+            for batch in iter_record_batches(self.pending):
+                writer.write_batch(batch)
+        os.replace(path + ".tmp", path)
+
+        written, self.pending, self.rows = self.pending, [], 0
+        return written
+
+    def close(self) -> None:
+        pass
+
+
+def run(entries: List[Tuple[str, Optional[str]]], output: str, format: str,
+        concurrency: int, max_comments: Optional[int] = None, log: TextIO = sys.stderr) -> Dict[str, Any]:
+    """抓取全部视频并写入输出目录，返回汇总；可重复调用以断点续抓"""
+    os.makedirs(output, exist_ok=True)
+    progress = Progress(os.path.join(output, PROGRESS_FILE))
+    if progress.format not in (None, format):
+        progress.close()
+        raise RuntimeError(f"输出目录已按 {progress.format} 格式抓取，请使用相同格式继续，或加 --restart 重新开始")
+    try:
+        if format == "parquet":
+            writer = ParquetWriter(os.path.join(output, PARTS_DIR), progress.parts)
+        else:
+            writer = TextWriter(os.path.join(output, DATA_FILES[format]), format, progress.offset)
+    except Exception:
+        progress.close()
+        raise
+
+    summary = {"videos": len(entries), "skipped": 0, "done": 0, "failed": 0, "comments": 0}
+    todo = []
+    for url, video_id in entries:
+        if video_id is None:
+            summary["failed"] += 1
+            print(f"跳过: 无法从 URL 中提取视频 ID: {url}", file=log)
+        elif video_id in progress.done:
+            summary["skipped"] += 1
+        else:
+            todo.append((url, video_id))
+    if summary["skipped"]:
+        print(f"断点续抓：跳过已完成的 {summary['skipped']} 个视频", file=log)
+
+    def record(video: Dict[str, Any], **fields) -> Dict[str, Any]:
+        """进度记录；offset 为文本格式写完该视频后的文件长度，parts 为 Parquet 已完成的分片数"""
+        entry = {"video_id": video["video_id"], "url": video["url"], "format": format, **fields}
+        if format == "parquet":
+            entry["parts"] = writer.parts
+        else:
+            entry["offset"] = writer.flush()
+        return entry
+
+    def commit(videos: List[Dict[str, Any]]) -> None:
+        for video in videos:
+            summary["done"] += 1
+            summary["comments"] += len(video["comments"])
+            progress.append(record(video, status="done", comments=len(video["comments"]),
+                                   duplicates=video["duplicates"]))
+            video["comments"] = []
+
+    start = time.perf_counter()
+    finished = 0
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        # 在途任务不超过并发数的两倍：已抓完的视频及时写盘释放内存，中断时也不会留下大量排队任务
+        queue = iter(todo)
+        in_flight = set()
+        while True:
+            for url, video_id in queue:
+                in_flight.add(executor.submit(crawl_video, url, video_id, max_comments))
+                if len(in_flight) >= concurrency * 2:
+                    break
+            if not in_flight:
+                break
+
+            completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in completed:
+                video = future.result()
+                finished += 1
+                if not video["success"]:
+                    summary["failed"] += 1
+                    progress.append(record(video, status="failed", error=video["error"]))
+                    print(f"[{finished}/{len(todo)}] {video['video_id']} 失败: {video['error']}", file=log)
+                    continue
+
+                print(f"[{finished}/{len(todo)}] {video['video_id']} {len(video['comments'])} 条 "
+                      f"({video['seconds']:.1f}s)", file=log)
+                if format == "parquet":
+                    written = writer.write(video)
+                    if written:
+                        commit(written)
+                else:
+                    writer.write(video)
+                    commit([video])
+
+        if format == "parquet":
+            written = writer.flush()
+            if written:
+                commit(written)
+    finally:
+        # 中断时取消排队的任务，不等待正在抓取的视频
+        executor.shutdown(wait=False, cancel_futures=True)
+        writer.close()
+        progress.close()
+
+    summary["seconds"] = round(time.perf_counter() - start, 2)
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="批量抓取 TikTok 评论并写入磁盘（支持断点续抓）")
+    parser.add_argument("urls", nargs="?", default="-", help="URL 列表文件，- 或省略时从标准输入读取")
+    parser.add_argument("-o", "--output", required=True, help="输出目录")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="同时抓取的视频数")
+    parser.add_argument("--max-comments", type=int, default=None, help="单个视频的评论数上限")
+    parser.add_argument("--restart", action="store_true", help="清空输出目录中的进度与数据，重新开始")
+    args = parser.parse_args(argv)
+
+    if args.urls == "-":
+        entries = read_urls(sys.stdin)
+    else:
+        with open(args.urls, "r", encoding="utf-8") as f:
+            entries = read_urls(f)
+
+    if args.restart:
+        for name in (PROGRESS_FILE, *DATA_FILES.values()):
+            path = os.path.join(args.output, name)
+            if os.path.exists(path):
+                os.remove(path)
+        parts = os.path.join(args.output, PARTS_DIR)
+        if os.path.isdir(parts):
+            for name in os.listdir(parts):
+                os.remove(os.path.join(parts, name))
+
+    try:
+        summary = run(entries, args.output, args.format, max(args.concurrency, 1), args.max_comments)
+    except RuntimeError as e:
+        # 如 Parquet 需要安装 pyarrow
+        print(str(e), file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        print("已中断，重新运行相同命令即可从断点继续", file=sys.stderr)
+        return 130
+
+    print(json.dumps(summary, ensure_ascii=False))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,4 @@
+"""
+TikTok 评论获取器 - 共享服务模块
+供 app.py 与 api/ 下的 Vercel 函数共同使用
+"""
@@ -0,0 +1,221 @@
+"""
+评论文本分析
+关键词词频、emoji 计数、语言识别、@提及与话题标签，结果作为每个视频的 analytics 块
+
+分析是纯 CPU 计算，在请求线程中执行会因 GIL 阻塞其他请求。评论文本按分片发送到进程池：
+每个分片的文本以 NUL 分隔拼成一段 UTF-8 字节（不序列化评论字典），工作进程只回传计数，
+请求线程等待结果时释放 GIL
+
+COMMENT_ANALYTICS=process（默认）/ inline / off 选择执行方式，ANALYTICS_WORKERS 为进程数（默认 CPU 核数）；
+进程池不可用（如 serverless 环境没有 /dev/shm）时自动退回到当前进程内计算
+"""
+
+import multiprocessing
+import os
+import re
+import threading
+from collections import Counter
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+from services.search import EMOJI_CHAR, tokenize
+
+MODES = ("process", "inline", "off")
+DEFAULT_MODE = os.environ.get('COMMENT_ANALYTICS', 'process')
+WORKERS = int(os.environ.get('ANALYTICS_WORKERS', 0)) or os.cpu_count() or 1
+
+# 每个分片的评论数；总评论数少于 MIN_PARALLEL 时不值得跨进程，直接在当前进程计算
+SHARD_SIZE = 2000
+MIN_PARALLEL = 4000
+
+# 各排行保留的条数
+TOP_N = 20
+
+_SEPARATOR = "\x00"
+
+MENTION = re.compile(r"@([\w.]+)")
+# 话题标签不以数字开头（"#1" 多为序号）
+HASHTAG = re.compile(r"#([^\W\d]\w*)")
+
+# 按书写系统判断的语言
+_SCRIPTS = (
+    ("ja", re.compile(r"[぀-ヿ]")),
+    ("ko", re.compile(r"[가-힯]")),
+    ("zh", re.compile(r"[㐀-䶿一-鿿]")),
+    ("ru", re.compile(r"[Ѐ-ӿ]")),
+    ("ar", re.compile(r"[؀-ۿ]")),
+    ("th", re.compile(r"[฀-๿]")),
+    ("hi", re.compile(r"[ऀ-ॿ]")),
+)
+_LATIN = re.compile(r"[a-zA-ZÀ-ɏ]")
+
+# 拉丁字母语言按常用虚词识别
+STOPWORDS = {
+    "en": {"the", "and", "is", "are", "you", "this", "that", "it", "to", "of", "in", "for", "my", "so", "i",
+           "what", "with", "was", "not", "me", "be", "on", "have", "just", "your", "like", "can"},
+    "es": {"el", "la", "que", "de", "y", "es", "en", "los", "las", "por", "con", "una", "muy", "pero", "yo",
+           "mi", "lo", "del", "se", "como", "para", "esta", "más"},
+    "pt": {"o", "que", "de", "e", "é", "não", "um", "uma", "com", "pra", "muito", "eu", "você", "isso",
+           "mas", "do", "da", "os", "no", "na", "tá"},
+    "fr": {"le", "la", "les", "et", "est", "de", "je", "pas", "un", "une", "que", "c'est", "des", "en",
+           "du", "tu", "mais", "trop", "très", "moi", "qui"},
+    "de": {"der", "die", "das", "und", "ist", "nicht", "ich", "du", "ein", "eine", "mit", "zu", "auf",
+           "so", "es", "sehr", "aber", "wie", "auch", "den"},
+    "id": {"yang", "dan", "ini", "itu", "aku", "di", "ke", "ga", "gak", "banget", "kak", "dari", "ada",
+           "juga", "sama", "bisa", "apa", "udah", "mau"},
+}
+# 关键词排除各语言虚词
+_KEYWORD_STOPWORDS = set().union(*STOPWORDS.values())
+
+
+def detect_language(text: str) -> str:
+    """
+    按书写系统与常用虚词识别语言（ISO 639-1）
+    没有文字（如只有 emoji）时返回 und，拉丁字母但无法区分语言时返回 latin
+    """
+    for language, pattern in _SCRIPTS:
+        if pattern.search(text):
+            return language
+    if not _LATIN.search(text):
+        return "und"
+
+    words = re.findall(r"[^\W\d_]+", text.lower())
+    best, hits = "und", 0
+    for language, stopwords in STOPWORDS.items():
+        count = sum(1 for word in words if word in stopwords)
+        if count > hits:
+            best, hits = language, count
+    return best if hits else "latin"
+
+
+def analyze_texts(texts: List[str]) -> Dict[str, Any]:
+    """一组评论文本的计数（未截取排行，便于合并）"""
+    keywords, emoji, languages, mentions, hashtags = Counter(), Counter(), Counter(), Counter(), Counter()
+    emoji_comments = 0
+
+    for text in texts:
+        has_emoji = False
+        for token in tokenize(text):
+            if EMOJI_CHAR.fullmatch(token):
+                emoji[token] += 1
+                has_emoji = True
+            elif len(token) > 1 and not token.isdigit() and token not in _KEYWORD_STOPWORDS:
+                keywords[token] += 1
+        emoji_comments += has_emoji
+        languages[detect_language(text)] += 1
+        mentions.update(m.lower() for m in MENTION.findall(text))
+        hashtags.update(h.lower() for h in HASHTAG.findall(text))
+
+    return {
+        "comments": len(texts),
+        "emoji_comments": emoji_comments,
+        "keywords": keywords,
+        "emoji": emoji,
+        "languages": languages,
+        "mentions": mentions,
+        "hashtags": hashtags,
+    }
+
+
+def _pack(comments: List[Dict[str, Any]]) -> bytes:
+    """分片的传输格式：评论文本以 NUL 分隔的一段 UTF-8 字节"""
+    return _SEPARATOR.join((c.get("text") or "").replace(_SEPARATOR, " ") for c in comments).encode("utf-8")
+
+
+def _analyze_packed(blob: bytes) -> Dict[str, Any]:
+    """工作进程入口：解包分片并计数，只回传计数字典"""
+    result = analyze_texts(blob.decode("utf-8").split(_SEPARATOR))
+    # Counter 回传时按普通字典序列化
+    return {k: dict(v) if isinstance(v, Counter) else v for k, v in result.items()}
+
+
+def _merge(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    merged = {"comments": 0, "emoji_comments": 0}
+    counters = {name: Counter() for name in ("keywords", "emoji", "languages", "mentions", "hashtags")}
+    for part in parts:
+        merged["comments"] += part["comments"]
+        merged["emoji_comments"] += part["emoji_comments"]
+        for name, counter in counters.items():
+            counter.update(part[name])
+    merged.update(counters)
+    return merged
+
+
+def _block(counts: Dict[str, Any], top: int = TOP_N) -> Dict[str, Any]:
+    """计数整理为 analytics 块"""
+    total = counts["comments"]
+    return {
+        "comments": total,
+        "languages": dict(counts["languages"].most_common()),
+        "keywords": [{"term": t, "count": c} for t, c in counts["keywords"].most_common(top)],
+        "emoji": [{"emoji": e, "count": c} for e, c in counts["emoji"].most_common(top)],
+        "emoji_comments": counts["emoji_comments"],
+        "emoji_ratio": round(counts["emoji_comments"] / total, 4) if total else 0.0,
+        "mentions": [{"user": u, "count": c} for u, c in counts["mentions"].most_common(top)],
+        "hashtags": [{"tag": h, "count": c} for h, c in counts["hashtags"].most_common(top)],
+    }
+
+
+class TextAnalyzer:
+    """
+    进程内共享的文本分析器
+    进程池在首次需要时以 spawn 方式创建（应用已有常驻线程，fork 不安全），创建失败后改为当前进程内计算
+    """
+
+    def __init__(self, mode: str = DEFAULT_MODE, workers: int = WORKERS):
+        if mode not in MODES:
+            raise ValueError(f"不支持的分析方式: {mode}")
+        self.mode = mode
+        self.workers = max(workers, 1)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        with self._lock:
+            if self._pool is None and self.mode == "process":
+                try:
+                    self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+                except (OSError, ImportError, NotImplementedError):
+                    self.mode = "inline"
+            return self._pool
+
+    def analyze(self, videos: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """按输入顺序返回每个视频的 analytics 块（关闭分析时为 None）"""
+        if self.mode == "off":
+            return [None] * len(videos)
+
+        shards: List[Tuple[int, List[Dict[str, Any]]]] = []
+        for index, video in enumerate(videos):
+            comments = video.get("comments", [])
+            shards.extend((index, comments[i:i + SHARD_SIZE]) for i in range(0, len(comments), SHARD_SIZE))
+
+        parts: List[List[Dict[str, Any]]] = [[] for _ in videos]
+        pool = self._executor() if sum(len(s) for _, s in shards) >= MIN_PARALLEL else None
+        if pool is not None:
+            try:
+                futures = [(index, pool.submit(_analyze_packed, _pack(shard))) for index, shard in shards]
+                for index, future in futures:
+                    parts[index].append(future.result())
+                return [_block(_merge(p)) for p in parts]
+            except (BrokenExecutor, OSError):
+                # 工作进程异常退出：丢弃进程池（下次重建），本次在当前进程内计算
+                with self._lock:
+                    if self._pool is pool:
+                        self._pool = None
+                pool.shutdown(wait=False)
+                parts = [[] for _ in videos]
+
+        for index, shard in shards:
+            parts[index].append(analyze_texts([c.get("text") or "" for c in shard]))
+        return [_block(_merge(p)) for p in parts]
+
+
+ANALYZER = TextAnalyzer()
+
+
+def attach_analytics(videos: List[Dict[str, Any]]) -> None:
+    """为抓取成功的视频结果添加 analytics 块"""
+    succeeded = [v for v in videos if v.get("success")]
+    for video, block in zip(succeeded, ANALYZER.analyze(succeeded)):
+        if block is not None:
+            video["analytics"] = block
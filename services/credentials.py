@@ -0,0 +1,199 @@
+"""
+TikHub API Key 池
+从配置读取多个 Key，按最少占用或轮询选择，跟踪每个 Key 的速率与配额；
+收到 429 / 401 的 Key 暂时隔离，其余 Key 继续服务
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+from services import metrics
+
+# 收到 429 / 401 后的隔离时长（秒）；429 带 Retry-After 时以响应为准
+QUARANTINE_429 = 10.0
+QUARANTINE_401 = 600.0
+
+# 所有 Key 都被限速或隔离时，acquire 最多等待的秒数
+MAX_RATE_WAIT = 5.0
+
+STRATEGIES = ("least_loaded", "round_robin")
+
+
+class ApiKey:
+    """单个 Key 的使用状态"""
+
+    def __init__(self, index: int, secret: str, rate: Optional[float], quota: Optional[int]):
+        self.index = index
+        self.secret = secret
+        # 指标标签不暴露 Key 本身
+        self.label = f"key{index}"
+        self.rate = rate
+        self.quota = quota
+        self.in_flight = 0
+        self.requests = 0
+        self.quota_used = 0
+        self.quarantined_until = 0.0
+        self.last_status = None
+        # 令牌桶：每秒补充 rate 个，容量为 rate（至少 1）
+        self.tokens = max(rate or 1.0, 1.0)
+        self.refilled_at = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        if self.rate:
+            capacity = max(self.rate, 1.0)
+            self.tokens = min(capacity, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def rate_wait(self) -> float:
+        """距离下一个令牌的秒数，0 表示现在可用"""
+        if not self.rate or self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def ready_in(self, now: float) -> Optional[float]:
+        """距离可用的秒数（隔离到期与下一个令牌取较晚者），配额用尽时为 None"""
+        if self.quota is not None and self.quota_used >= self.quota:
+            return None
+        self.refill(now)
+        return max(self.quarantined_until - now, self.rate_wait(), 0.0)
+
+    def usable(self, now: float) -> bool:
+        if now < self.quarantined_until:
+            return False
+        return self.quota is None or self.quota_used < self.quota
+
+
+class KeyPool:
+    """
+    线程安全的 Key 池
+    acquire() 返回选中的 Key（所有 Key 配额用尽、或 MAX_RATE_WAIT 秒内都不会解除隔离时返回 None），
+    请求结束后调用 release()
+    """
+
+    def __init__(self, secrets: List[str], strategy: str = "least_loaded",
+                 rate: Optional[float] = None, quota: Optional[int] = None,
+                 quota_window: float = 86400.0):
+        if not secrets:
+            raise ValueError("至少需要一个 API Key")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"不支持的选择策略: {strategy}")
+
+        self.keys = [ApiKey(i, secret, rate, quota) for i, secret in enumerate(secrets)]
+        self.strategy = strategy
+        self.quota_window = quota_window
+        self._window_started = time.monotonic()
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return len(self.keys)
+
+    def _pick(self, now: float) -> Optional[ApiKey]:
+        if now - self._window_started >= self.quota_window:
+            self._window_started = now
+            for key in self.keys:
+                key.quota_used = 0
+
+        candidates = [key for key in self.keys if key.usable(now)]
+        for key in candidates:
+            key.refill(now)
+        ready = [key for key in candidates if key.rate_wait() == 0]
+        if not ready:
+            return None
+
+        if self.strategy == "round_robin":
+            order = self.keys[self._next:] + self.keys[:self._next]
+            key = next(k for k in order if k in ready)
+            self._next = (key.index + 1) % len(self.keys)
+            return key
+
+        return min(ready, key=lambda k: (k.in_flight, k.requests))
+
+    def acquire(self) -> Optional[ApiKey]:
+        """选择一个可用 Key；全部被限速或隔离时等待最早可用的 Key（最多 MAX_RATE_WAIT 秒）"""
+        deadline = time.monotonic() + MAX_RATE_WAIT
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                key = self._pick(now)
+                if key is not None:
+                    if key.rate:
+                        key.tokens -= 1
+                    key.in_flight += 1
+                    key.requests += 1
+                    key.quota_used += 1
+                    return key
+
+                waits = [wait for wait in (k.ready_in(now) for k in self.keys) if wait is not None]
+
+            # 配额全部用尽，或最早可用的 Key 也等不到（如 401 的长隔离）时立即返回
+            remaining = deadline - time.monotonic()
+            if not waits or min(waits) > remaining:
+                return None
+            time.sleep(min(waits))
+
+    def release(self, key: ApiKey, status: str, retry_after: Optional[float] = None) -> None:
+        """记录请求结果；429 / 401 时隔离该 Key"""
+        with self._lock:
+            key.in_flight -= 1
+            key.last_status = status
+            if status == "429":
+                key.quarantined_until = time.monotonic() + (retry_after or QUARANTINE_429)
+            elif status == "401":
+                key.quarantined_until = time.monotonic() + QUARANTINE_401
+
+        metrics.KEY_REQUESTS.inc(key=key.label, status=status)
+        if status in ("429", "401"):
+            metrics.KEY_QUARANTINES.inc(key=key.label, status=status)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """各 Key 的当前状态（不含 Key 本身）"""
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "key": key.label,
+                "in_flight": key.in_flight,
+                "requests": key.requests,
+                "quota_used": key.quota_used,
+                "quota_remaining": None if key.quota is None else max(key.quota - key.quota_used, 0),
+                "quarantined_seconds": max(key.quarantined_until - now, 0.0),
+                "last_status": key.last_status,
+            } for key in self.keys]
+
+    def collect_metrics(self) -> None:
+        """渲染 /metrics 前刷新各 Key 的仪表"""
+        for state in self.snapshot():
+            metrics.KEY_IN_FLIGHT.set(state["in_flight"], key=state["key"])
+            metrics.KEY_QUARANTINED.set(1 if state["quarantined_seconds"] > 0 else 0, key=state["key"])
+            if state["quota_remaining"] is not None:
+                metrics.KEY_QUOTA_REMAINING.set(state["quota_remaining"], key=state["key"])
+
+
+def _optional_number(name: str, cast):
+    value = os.environ.get(name)
+    return cast(value) if value else None
+
+
+def pool_from_env(default_key: str) -> KeyPool:
+    """
+    按环境变量创建 Key 池：
+    TIKHUB_API_KEYS（逗号分隔，优先）或 TIKHUB_API_KEY；
+    TIKHUB_KEY_STRATEGY（least_loaded / round_robin）、TIKHUB_KEY_RATE（每个 Key 每秒请求数）、
+    TIKHUB_KEY_QUOTA（每个 Key 每个配额窗口的请求数）、TIKHUB_KEY_QUOTA_WINDOW（秒，默认一天）
+    """
+    secrets = [k.strip() for k in os.environ.get('TIKHUB_API_KEYS', '').split(',') if k.strip()]
+    if not secrets:
+        secrets = [os.environ.get('TIKHUB_API_KEY', default_key)]
+
+    pool = KeyPool(
+        secrets,
+        strategy=os.environ.get('TIKHUB_KEY_STRATEGY', 'least_loaded'),
+        rate=_optional_number('TIKHUB_KEY_RATE', float),
+        quota=_optional_number('TIKHUB_KEY_QUOTA', int),
+        quota_window=float(os.environ.get('TIKHUB_KEY_QUOTA_WINDOW', 86400)),
+    )
+    metrics.register_collector(pool.collect_metrics)
+    return pool
@@ -0,0 +1,227 @@
+"""
+按评论 ID（cid）去重
+翻页游标重叠或抓取期间有新评论插入时，上游会在后续页重复返回已抓到的评论
+
+  CidSet       精确去重：cid 存为 64 位整数的开放寻址哈希表（array），每条 12~24 字节；
+               Python set 存整数每条约 70 字节（集合槽位加整数对象）
+  BloomFilter  概率去重：可扩展的布隆过滤器，内存只与条数和误判率有关（0.1% 时每条数字节），
+               误判会丢弃少量不重复的评论，用于超大或长时间运行的抓取
+
+COMMENT_DEDUP=exact（默认）/ bloom / off 选择去重方式，COMMENT_DEDUP_ERROR 为布隆过滤器的目标误判率
+"""
+
+import hashlib
+import math
+import os
+from array import array
+from typing import Any, Dict, List, Optional
+
+MODES = ("exact", "bloom", "off")
+DEFAULT_MODE = os.environ.get('COMMENT_DEDUP', 'exact')
+BLOOM_ERROR = float(os.environ.get('COMMENT_DEDUP_ERROR', 0.001))
+
+# 布隆过滤器第一层的容量，写满后追加容量翻倍的新层
+BLOOM_INITIAL_CAPACITY = 16384
+
+_MASK64 = (1 << 64) - 1
+# Fibonacci 哈希的乘数（2^64 / 黄金分割比）
+_GOLDEN = 0x9E3779B97F4A7C15
+
+
+def cid_key(cid: Any) -> Optional[int]:
+    """cid 转为 64 位整数；数字 ID 直接使用，其他取摘要的前 8 字节。空 ID 返回 None（不参与去重）"""
+    if cid is None or cid == "":
+        return None
+    text = str(cid)
+    if text.isascii() and text.isdecimal() and len(text) <= 19:
+        return int(text)
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class CidSet:
+    """64 位整数集合：线性探测的开放寻址表，0 号槽表示空（键 0 单独记录），装载率超过 2/3 时扩容一倍"""
+
+    def __init__(self, capacity: int = 64):
+        bits = max(math.ceil(math.log2(max(capacity, 8) * 3 / 2)), 4)
+        self._init_table(bits)
+        self._size = 0
+        self._has_zero = False
+
+    def _init_table(self, bits: int) -> None:
+        self._bits = bits
+        self._mask = (1 << bits) - 1
+        self._shift = 64 - bits
+        self._slots = array('Q', bytes(8 << bits))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, key: int) -> bool:
+        if key == 0:
+            return self._has_zero
+        slots, mask = self._slots, self._mask
+        index = ((key * _GOLDEN) & _MASK64) >> self._shift
+        while True:
+            current = slots[index]
+            if current == key:
+                return True
+            if current == 0:
+                return False
+            index = (index + 1) & mask
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._slots) * self._slots.itemsize
+
+    def add(self, key: int) -> bool:
+        """加入集合，已存在时返回 False"""
+        if key == 0:
+            if self._has_zero:
+                return False
+            self._has_zero = True
+            self._size += 1
+            return True
+
+        slots, mask = self._slots, self._mask
+        index = ((key * _GOLDEN) & _MASK64) >> self._shift
+        while True:
+            current = slots[index]
+            if current == key:
+                return False
+            if current == 0:
+                break
+            index = (index + 1) & mask
+
+        slots[index] = key
+        self._size += 1
+        if self._size * 3 > len(slots) * 2:
+            self._grow()
+        return True
+
+    def _grow(self) -> None:
+        old = self._slots
+        self._init_table(self._bits + 1)
+        slots, mask, shift = self._slots, self._mask, self._shift
+        for key in old:
+            if key:
+                index = ((key * _GOLDEN) & _MASK64) >> shift
+                while slots[index]:
+                    index = (index + 1) & mask
+                slots[index] = key
+
+
+class _BloomLayer:
+    def __init__(self, capacity: int, error: float):
+        self.capacity = capacity
+        self.count = 0
+        # 位数取 2 的幂，位置用掩码计算
+        bits = max(math.ceil(-capacity * math.log(error) / math.log(2) ** 2), 64)
+        self.bits = 1 << math.ceil(math.log2(bits))
+        self.mask = self.bits - 1
+        self.hashes = max(round(self.bits / capacity * math.log(2)), 1)
+        self.array = bytearray(self.bits // 8)
+
+    def add(self, h1: int, h2: int) -> bool:
+        """置位；各位此前均已置位（键可能已存在）时返回 False"""
+        data, mask = self.array, self.mask
+        new = False
+        for i in range(self.hashes):
+            p = (h1 + i * h2) & mask
+            bit = 1 << (p & 7)
+            if not data[p >> 3] & bit:
+                data[p >> 3] |= bit
+                new = True
+        return new
+
+    def __contains__(self, hashes) -> bool:
+        h1, h2 = hashes
+        data, mask = self.array, self.mask
+        for i in range(self.hashes):
+            p = (h1 + i * h2) & mask
+            if not data[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+
+class BloomFilter:
+    """
+    可扩展的布隆过滤器：当前层写满时追加容量翻倍、误判率减半的新层，总误判率不超过 2 * error
+    接口与 CidSet 相同，add 对可能已存在的键返回 False
+    """
+
+    def __init__(self, error: float = BLOOM_ERROR, capacity: int = BLOOM_INITIAL_CAPACITY):
+        self.error = error
+        self._layers = [_BloomLayer(capacity, error / 2)]
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(layer.array) for layer in self._layers)
+
+    def add(self, key: int) -> bool:
+        # 双重哈希：由一个 64 位哈希派生各层的 k 个位置
+        h = (key * _GOLDEN) & _MASK64
+        hashes = (h >> 32, (h & 0xFFFFFFFF) | 1)
+        layers = self._layers
+        for layer in layers[:-1]:
+            if hashes in layer:
+                return False
+
+        layer = layers[-1]
+        if layer.count >= layer.capacity:
+            if hashes in layer:
+                return False
+            layer = _BloomLayer(layer.capacity * 2, self.error / 2 ** (len(layers) + 1))
+            layers.append(layer)
+        if not layer.add(*hashes):
+            return False
+        layer.count += 1
+        self._size += 1
+        return True
+
+
+class CommentDeduper:
+    """
+    一次抓取的去重状态，按页过滤已见过的评论并统计重复数
+    known 为此前已保存的评论（增量刷新），这些评论同样被过滤，但计入 known 而不是重复数
+    """
+
+    def __init__(self, mode: str = DEFAULT_MODE, known: Optional[CidSet] = None):
+        if mode not in MODES:
+            raise ValueError(f"不支持的去重方式: {mode}")
+        self.mode = mode
+        self.seen = None if mode == "off" else (BloomFilter() if mode == "bloom" else CidSet())
+        self.known_set = known
+        self.received = 0
+        self.duplicates = 0
+        self.known = 0
+
+    def filter(self, comments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """返回本页中未见过的评论（保持原顺序）"""
+        self.received += len(comments)
+        known = self.known_set
+        if self.seen is None and known is None:
+            return comments
+
+        fresh = []
+        add = self.seen.add if self.seen is not None else None
+        skipped = 0
+        for comment in comments:
+            key = cid_key(comment.get("cid"))
+            if key is not None and known is not None and key in known:
+                skipped += 1
+            elif key is None or add is None or add(key):
+                fresh.append(comment)
+        self.known += skipped
+        self.duplicates += len(comments) - len(fresh) - skipped
+        return fresh
+
+    def summary(self) -> Dict[str, Any]:
+        """抓取元数据中的去重统计"""
+        return {
+            "duplicates": self.duplicates,
+            "duplicate_rate": round(self.duplicates / self.received, 4) if self.received else 0.0,
+        }
@@ -0,0 +1,172 @@
+"""
+Excel 导出引擎
+使用 write-only 流式工作表逐行写出，样式以命名样式注册一次，单元格只引用样式名
+app.py、api/index.py 与 api/export/excel.py 共用
+openpyxl 导入较慢，在首次导出时才加载，不计入 serverless 函数的冷启动
+"""
+
+import tempfile
+from datetime import datetime
+from typing import Dict, Any, List, Tuple, IO
+
+from services import memory
+
+EXCEL_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# 每个视频占用的列：评论者、评论内容、点赞数、评论数
+SUB_COLUMNS = [("评论者", 20), ("评论内容", 40), ("点赞数", 10), ("评论数", 10)]
+LABEL_COLUMN_WIDTH = 20
+
+# 内存中超过该大小后写入临时文件
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+def _thin_border():
+    from openpyxl.styles import Border, Side
+    side = Side(style='thin')
+    return Border(left=side, right=side, top=side, bottom=side)
+
+
+def _named_styles() -> List[Any]:
+    """导出使用的全部样式，每个工作簿只创建一次"""
+    from openpyxl.styles import NamedStyle, Font, PatternFill, Alignment
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    info_fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
+    center_wrap = Alignment(horizontal='center', vertical='center', wrap_text=True)
+
+    return [
+        # 表头
+        NamedStyle(name="tk_header", font=Font(size=12, bold=True, color="FFFFFF"),
+                   fill=header_fill, border=_thin_border(), alignment=center_wrap),
+        # 视频信息标签
+        NamedStyle(name="tk_info_label", font=Font(bold=True), fill=info_fill, border=_thin_border(),
+                   alignment=Alignment(horizontal='center', vertical='center')),
+        # 视频信息内容
+        NamedStyle(name="tk_info", font=Font(bold=False, size=10), fill=info_fill,
+                   border=_thin_border(), alignment=center_wrap),
+        # 评论序号
+        NamedStyle(name="tk_row_label", border=_thin_border(), alignment=center_wrap),
+        # 评论者、评论内容
+        NamedStyle(name="tk_text", border=_thin_border(),
+                   alignment=Alignment(vertical='top', wrap_text=True)),
+        # 点赞数、评论数
+        NamedStyle(name="tk_number", border=_thin_border(),
+                   alignment=Alignment(horizontal='center', vertical='top')),
+        # 空白单元格
+        NamedStyle(name="tk_blank", border=_thin_border(), alignment=Alignment(vertical='top')),
+    ]
+
+
+def _style_arrays(ws) -> Dict[str, Any]:
+    """解析每个命名样式一次，之后所有单元格共享同一份样式索引"""
+    from openpyxl.cell import WriteOnlyCell
+    arrays = {}
+    for style in ws.parent._named_styles:
+        cell = WriteOnlyCell(ws)
+        cell.style = style.name
+        arrays[style.name] = cell._style
+    return arrays
+
+
+def write_videos_workbook(videos: List[Dict[str, Any]], output: IO[bytes]) -> int:
+    """
+    将视频评论写入 Excel，每个视频占 4 列
+    返回写入的评论行数
+    """
+    with memory.phase("workbook"):
+        wb, max_comments = _build_workbook(videos)
+    with memory.phase("save"):
+        wb.save(output)
+    return max_comments
+
+
+def _build_workbook(videos: List[Dict[str, Any]]) -> Tuple[Any, int]:
+    """逐行写出工作表，返回尚未保存的工作簿与评论行数"""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    for style in _named_styles():
+        wb.add_named_style(style)
+
+    ws = wb.create_sheet("TikTok评论汇总")
+    styles = _style_arrays(ws)
+
+    def cell(value, style):
+        written = WriteOnlyCell(ws, value=value)
+        # 单元格写出后立即丢弃，共享样式数组不会被修改
+        written._style = style
+        return written
+
+    header, info_label, info = styles["tk_header"], styles["tk_info_label"], styles["tk_info"]
+    row_label, text, number, blank = (styles["tk_row_label"], styles["tk_text"],
+                                      styles["tk_number"], styles["tk_blank"])
+
+    # 列宽、冻结与合并区域需在写入行之前设置
+    ws.column_dimensions[get_column_letter(1)].width = LABEL_COLUMN_WIDTH
+    for video_index in range(len(videos)):
+        start_col = 2 + video_index * 4
+        for offset, (_, width) in enumerate(SUB_COLUMNS):
+            ws.column_dimensions[get_column_letter(start_col + offset)].width = width
+        for row in (1, 2):
+            ws.merged_cells.add(
+                f"{get_column_letter(start_col)}{row}:{get_column_letter(start_col + 3)}{row}"
+            )
+    ws.row_dimensions[2].height = 80
+    ws.freeze_panes = "A3"
+
+    # 第 1 行：视频标题
+    row = [cell("视频信息", header)]
+    for i in range(1, len(videos) + 1):
+        row.append(cell(f"视频 {i}", header))
+        row.extend(cell(None, header) for _ in range(3))
+    ws.append(row)
+
+    # 第 2 行：视频信息
+    row = [cell("视频信息", info_label)]
+    for i, video in enumerate(videos, 1):
+        video_info = f"视频 {i}\n{video.get('url', 'N/A')}\n{video.get('video_id', 'N/A')}\n{video.get('total_comments', 0)}条"
+        row.append(cell(video_info, info))
+        row.extend(cell(None, info) for _ in range(3))
+    ws.append(row)
+
+    # 第 3 行：评论列表子列标题
+    row = [cell("评论列表", header)]
+    for i in range(1, len(videos) + 1):
+        row.extend(cell(f"视频 {i}-{title}", header) for title, _ in SUB_COLUMNS)
+    ws.append(row)
+
+    # 评论数据：逐行写出，不在内存中保留单元格
+    comment_lists = [video.get('comments', []) for video in videos]
+    max_comments = max((len(comments) for comments in comment_lists), default=0)
+
+    for comment_index in range(max_comments):
+        row = [cell(f"评论 {comment_index + 1}", row_label)]
+
+        for comments in comment_lists:
+            if comment_index < len(comments):
+                comment = comments[comment_index]
+                row.append(cell(comment.get('author', {}).get('nickname', '未知用户'), text))
+                row.append(cell(comment.get('text', ''), text))
+                row.append(cell(comment.get('likes', 0), number))
+                row.append(cell(comment.get('reply_count', 0), number))
+            else:
+                row.extend(cell(None, blank) for _ in range(4))
+
+        ws.append(row)
+
+    return wb, max_comments
+
+
+def export_videos_workbook(videos: List[Dict[str, Any]]) -> IO[bytes]:
+    """生成 Excel 文件，返回定位到开头的文件对象（较大时自动落到临时文件）"""
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    write_videos_workbook(videos, output)
+    output.seek(0)
+    return output
+
+
+def export_filename() -> str:
+    """批量导出的文件名"""
+    return f'tiktok_comments_batch_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
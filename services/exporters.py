@@ -0,0 +1,179 @@
+"""
+评论导出
+统一 JSON / CSV / NDJSON / Excel / Parquet / Arrow 的生成逻辑，供导出接口按格式分发
+文本格式以生成器逐块产出，内存占用与导出规模无关
+"""
+
+import codecs
+import csv
+import json
+import time
+from datetime import datetime
+from io import StringIO
+from typing import Dict, Any, List, Optional, Tuple, Iterator, Union, IO
+
+from services import metrics, timing
+from services.excel_export import export_videos_workbook, EXCEL_MIMETYPE
+from services.columnar_export import export_parquet, export_arrow, PARQUET_MIMETYPE, ARROW_MIMETYPE
+
+CSV_HEADER = [
+    'Comment ID', 'Author', 'Username', 'Comment Text',
+    'Likes', 'Reply Count', 'Created Time'
+]
+
+
+def csv_row(comment: Dict[str, Any]) -> List[Any]:
+    """单条评论对应的 CSV 行"""
+    author = comment.get('author', {})
+    return [
+        comment.get('id', ''),
+        author.get('nickname', ''),
+        author.get('username', ''),
+        comment.get('text', ''),
+        comment.get('likes', 0),
+        comment.get('reply_count', 0),
+        comment.get('create_time_formatted', '')
+    ]
+
+
+# 每累计多少行产出一个数据块
+CHUNK_ROWS = 500
+
+
+def iter_json(videos: List[Dict[str, Any]]) -> Iterator[bytes]:
+    """单个视频导出评论数组；多个视频按视频分组。逐条评论序列化"""
+    def dumps(obj):
+        return json.dumps(obj, ensure_ascii=False)
+
+    def iter_comments(comments):
+        parts = []
+        for i, comment in enumerate(comments):
+            parts.append(("" if i == 0 else ",\n") + "  " + dumps(comment))
+            if len(parts) >= CHUNK_ROWS:
+                yield "".join(parts).encode('utf-8')
+                parts = []
+        if parts:
+            yield "".join(parts).encode('utf-8')
+
+    if len(videos) == 1:
+        yield b"[\n"
+        yield from iter_comments(videos[0].get('comments', []))
+        yield b"\n]\n"
+        return
+
+    yield b"[\n"
+    for index, video in enumerate(videos):
+        comments = video.get('comments', [])
+        header = {
+            "video_id": video.get('video_id'),
+            "url": video.get('url'),
+            "total_comments": video.get('total_comments', len(comments))
+        }
+        # 去掉结尾的 }，在其后追加 comments 数组
+        prefix = ("" if index == 0 else ",\n") + dumps(header)[:-1] + ', "comments": [\n'
+        yield prefix.encode('utf-8')
+        yield from iter_comments(comments)
+        yield b"\n]}"
+    yield b"\n]\n"
+
+
+def iter_ndjson(videos: List[Dict[str, Any]]) -> Iterator[bytes]:
+    """JSON Lines：每行一条评论，附带所属视频 ID"""
+    lines = []
+    for video in videos:
+        video_id = video.get('video_id')
+        for comment in video.get('comments', []):
+            lines.append(json.dumps(dict(comment, video_id=video_id), ensure_ascii=False))
+            if len(lines) >= CHUNK_ROWS:
+                yield ("\n".join(lines) + "\n").encode('utf-8')
+                lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode('utf-8')
+
+
+def iter_csv(videos: List[Dict[str, Any]]) -> Iterator[bytes]:
+    """导出 CSV（带 UTF-8 BOM，Excel 可直接打开）；多个视频时首列为视频 ID"""
+    multi = len(videos) > 1
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+
+    def drain() -> bytes:
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return data.encode('utf-8')
+
+    yield codecs.BOM_UTF8
+    writer.writerow((['Video ID'] if multi else []) + CSV_HEADER)
+
+    rows = 0
+    for video in videos:
+        prefix = [video.get('video_id', '')] if multi else []
+        for comment in video.get('comments', []):
+            writer.writerow(prefix + csv_row(comment))
+            rows += 1
+            if rows % CHUNK_ROWS == 0:
+                yield drain()
+
+    yield drain()
+
+
+# 格式 -> (生成函数, MIME 类型, 扩展名)
+# 文本格式返回字节块生成器，Excel 与列式格式返回文件对象；text/* 的 charset 由发送方添加（Flask 自动加 utf-8）
+EXPORT_FORMATS = {
+    'json': (iter_json, 'application/json', 'json'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson', 'jsonl'),
+    'jsonl': (iter_ndjson, 'application/x-ndjson', 'jsonl'),
+    'csv': (iter_csv, 'text/csv', 'csv'),
+    'excel': (export_videos_workbook, EXCEL_MIMETYPE, 'xlsx'),
+    'xlsx': (export_videos_workbook, EXCEL_MIMETYPE, 'xlsx'),
+    'parquet': (export_parquet, PARQUET_MIMETYPE, 'parquet'),
+    'arrow': (export_arrow, ARROW_MIMETYPE, 'arrows'),
+}
+
+
+ExportBody = Union[IO[bytes], Iterator[bytes]]
+
+
+def export_file(format: str, videos: List[Dict[str, Any]]) -> Optional[Tuple[ExportBody, str, str]]:
+    """
+    按格式生成导出文件
+    返回 (文件对象或字节块生成器, MIME 类型, 下载文件名)，不支持的格式返回 None
+    """
+    if format not in EXPORT_FORMATS:
+        return None
+
+    build, mimetype, extension = EXPORT_FORMATS[format]
+
+    if len(videos) == 1:
+        name = f'tiktok_comments_{videos[0].get("video_id") or "unknown"}'
+    else:
+        name = f'tiktok_comments_batch_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+
+    start = time.perf_counter()
+    body = build(videos)
+    if is_stream(body):
+        body = _timed_stream(body, format, timing.current())
+    else:
+        elapsed = time.perf_counter() - start
+        metrics.EXPORT_SECONDS.observe(elapsed, format=format)
+        timing.record("export", elapsed)
+
+    return body, mimetype, f'{name}.{extension}'
+
+
+def _timed_stream(chunks: Iterator[bytes], format: str, timer) -> Iterator[bytes]:
+    """流式导出计时到最后一块发送完毕（或客户端断开）"""
+    start = time.perf_counter()
+    try:
+        yield from chunks
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.EXPORT_SECONDS.observe(elapsed, format=format)
+        if timer is not None:
+            timer.record("export", elapsed)
+
+
+def is_stream(body: ExportBody) -> bool:
+    """导出内容是否为字节块生成器"""
+    return not hasattr(body, 'read')
@@ -0,0 +1,189 @@
+"""
+按请求的内存追踪
+设置 MEMORY_TRACE=1 后，请求携带 X-Memory-Trace: 1 头或 memory_trace=1 查询参数即用 tracemalloc
+记录各阶段（fetch / format / serialize / workbook / save）的峰值分配，写入响应头、响应元数据与指标
+"""
+
+import contextvars
+import os
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Iterator
+
+from services import metrics
+
+# tracemalloc 会拖慢所有请求，需显式开启
+ENABLED = os.environ.get('MEMORY_TRACE') == '1'
+
+REQUEST_HEADER = 'X-Memory-Trace'
+REQUEST_PARAM = 'memory_trace'
+RESPONSE_HEADER = 'X-Memory-Peak'
+
+PHASE_ORDER = ("fetch", "format", "serialize", "workbook", "save")
+
+_active: "contextvars.ContextVar[Optional[MemoryTrace]]" = contextvars.ContextVar("memory_trace", default=None)
+
+# 同时追踪的请求数，最后一个结束时停止 tracemalloc
+_tracing_lock = threading.Lock()
+_tracing_requests = 0
+
+# 所有请求、线程中尚未结束的阶段；tracemalloc 只有一个进程级峰值，每次有阶段开始或结束时
+# 把上次重置以来的峰值计入此刻仍在进行的每个阶段再重置，嵌套或并行的阶段不会清掉彼此的峰值
+_phases_lock = threading.Lock()
+_open_phases: set = set()
+
+
+class MemoryTrace:
+    """
+    一个请求各阶段的峰值分配（字节）
+    tracemalloc 的峰值是进程级的，并发请求或线程池中并行的阶段会相互计入，结果为上界；
+    嵌套的阶段各自记录，外层阶段的峰值包含内层阶段
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, peak: int) -> None:
+        with self._lock:
+            self.phases[name] = max(self.phases.get(name, 0), peak)
+
+    def summary(self) -> Dict[str, Any]:
+        """响应元数据中的 memory 字段"""
+        with self._lock:
+            phases = dict(self.phases)
+        return {
+            "peak_bytes": max(phases.values(), default=0),
+            "phases": {name: phases[name] for name in _ordered(phases)}
+        }
+
+    def header(self) -> str:
+        with self._lock:
+            phases = dict(self.phases)
+        return ", ".join(f"{name};peak_kb={phases[name] / 1024:.1f}" for name in _ordered(phases))
+
+
+def _ordered(phases: Dict[str, int]):
+    names = [name for name in PHASE_ORDER if name in phases]
+    return names + sorted(name for name in phases if name not in PHASE_ORDER)
+
+
+def requested(value: Optional[str]) -> bool:
+    return ENABLED and value in ('1', 'true')
+
+
+def current() -> Optional[MemoryTrace]:
+    """当前请求的内存追踪，未开启时为 None"""
+    return _active.get()
+
+
+def begin() -> contextvars.Token:
+    global _tracing_requests
+    with _tracing_lock:
+        if _tracing_requests == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracing_requests += 1
+    return _active.set(MemoryTrace())
+
+
+def end(token: contextvars.Token) -> None:
+    global _tracing_requests
+    _active.reset(token)
+    with _tracing_lock:
+        _tracing_requests -= 1
+        if _tracing_requests == 0:
+            tracemalloc.stop()
+
+
+class _OpenPhase:
+    """进行中的阶段：进入时的已分配量与此后观测到的最高分配量"""
+
+    def __init__(self, before: int):
+        self.before = before
+        self.highest = before
+
+
+def _fold() -> int:
+    """把上次重置以来的峰值计入所有进行中的阶段并重置峰值，返回当前已分配量（调用方持有 _phases_lock）"""
+    current, peak = tracemalloc.get_traced_memory()
+    for entry in _open_phases:
+        entry.highest = max(entry.highest, peak)
+    tracemalloc.reset_peak()
+    return current
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """记录代码块的峰值分配（相对进入时的已分配量）；当前请求未开启追踪时不做任何事"""
+    trace = _active.get()
+    if trace is None or not tracemalloc.is_tracing():
+        yield
+        return
+
+    with _phases_lock:
+        entry = _OpenPhase(_fold())
+        _open_phases.add(entry)
+    try:
+        yield
+    finally:
+        with _phases_lock:
+            _fold()
+            _open_phases.discard(entry)
+        peak = max(entry.highest - entry.before, 0)
+        trace.record(name, peak)
+        metrics.PHASE_MEMORY.observe(peak, phase=name)
+
+
+def init_app(app) -> None:
+    """为 Flask 应用注册按请求的内存追踪"""
+    from flask import g, request
+
+    @app.before_request
+    def _begin_memory_trace():
+        if requested(request.headers.get(REQUEST_HEADER) or request.args.get(REQUEST_PARAM)):
+            g.memory_token = begin()
+            g.memory_trace = current()
+
+    @app.after_request
+    def _add_memory_header(response):
+        trace = g.get("memory_trace")
+        if trace is not None:
+            response.headers[RESPONSE_HEADER] = trace.header()
+        return response
+
+    @app.teardown_request
+    def _end_memory_trace(exc):
+        token = g.pop("memory_token", None)
+        if token is not None:
+            end(token)
+
+
+class MemoryTracedHandlerMixin:
+    """BaseHTTPRequestHandler 格式的 serverless 函数使用的按请求内存追踪"""
+
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+
+        if ENABLED:
+            from urllib.parse import urlparse, parse_qs
+            query = parse_qs(urlparse(self.path).query)
+            value = self.headers.get(REQUEST_HEADER) or query.get(REQUEST_PARAM, [None])[0]
+            if requested(value):
+                self._memory_token = begin()
+        return True
+
+    def handle_one_request(self):
+        self._memory_token = None
+        try:
+            super().handle_one_request()
+        finally:
+            if self._memory_token is not None:
+                end(self._memory_token)
+
+    def end_headers(self):
+        trace = current() if getattr(self, '_memory_token', None) is not None else None
+        if trace is not None:
+            self.send_header(RESPONSE_HEADER, trace.header())
+        super().end_headers()
@@ -0,0 +1,214 @@
+"""
+进程内指标
+计数器、仪表和直方图，按 Prometheus 文本格式在 /metrics 输出（不依赖 prometheus_client）
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Iterator, Iterable, Callable
+
+# 延迟直方图的默认桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry: List["_Metric"] = []
+
+# 渲染前调用的回调，用于刷新按需计算的仪表
+_collectors: List[Callable[[], None]] = []
+
+
+def _label_key(label_names: Tuple[str, ...], labels: Dict[str, str]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in label_names)
+
+
+def _format_labels(label_names: Tuple[str, ...], key: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(label_names, key)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.label_names, labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        if not items and not self.label_names:
+            items = [((), 0)]
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                for key, value in items]
+
+
+class Gauge(Counter):
+    """可增可减的瞬时值"""
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track(self, **labels) -> Iterator[None]:
+        """代码块执行期间值加一"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """分桶直方图，记录次数、总和与各桶累计数"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(self.label_names, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各桶计数..., +Inf 桶计数, 总和]
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """记录代码块耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(_label_key(self.label_names, labels))
+        return sum(state[:-1]) if state else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def register_collector(collector: Callable[[], None]) -> None:
+    """注册在每次渲染前调用的回调"""
+    _collectors.append(collector)
+
+
+def render() -> str:
+    """按 Prometheus 文本格式输出所有指标"""
+    for collector in _collectors:
+        collector()
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+# 上游 TikHub 接口
+UPSTREAM_SECONDS = Histogram(
+    "tikhub_upstream_request_seconds", "TikHub 单次请求耗时（秒），按 HTTP 状态或错误类型区分", ["status"])
+UPSTREAM_RETRIES = Counter(
+    "tikhub_upstream_retries_total", "上游请求重试次数")
+PAGES_FETCHED = Counter(
+    "tikhub_pages_fetched_total", "成功抓取的评论页数（每秒速率用 rate() 计算）")
+COMMENTS_FETCHED = Counter(
+    "tikhub_comments_fetched_total", "成功抓取的评论条数（每秒速率用 rate() 计算）")
+COMMENTS_DUPLICATE = Counter(
+    "tikhub_comments_duplicate_total", "翻页中重复返回、已按 cid 去重丢弃的评论数")
+CRAWLS_IN_FLIGHT = Gauge(
+    "tikhub_crawls_in_flight", "正在进行的视频抓取数")
+PAGE_COUNT = Gauge(
+    "tikhub_page_count", "探测到的上游每页最大条数（请求评论时使用的 count）")
+
+# 批量抓取执行器
+CRAWL_BATCHES = Gauge(
+    "crawl_batches", "共享执行器中的批次数，state 为 active（抓取中）/ queued（排队中）", ["state"])
+CRAWL_QUEUE_WAIT = Histogram(
+    "crawl_queue_wait_seconds", "批次从提交到开始抓取的排队时间（秒）")
+CRAWL_REJECTED = Counter(
+    "crawl_rejected_total", "因服务繁忙以 429 拒绝的批量请求数，reason 为 queue_full / client_limit", ["reason"])
+
+# API Key 池（标签为 key0、key1…，不暴露 Key 本身）
+KEY_REQUESTS = Counter(
+    "tikhub_key_requests_total", "各 API Key 的请求数，按 HTTP 状态或错误类型区分", ["key", "status"])
+KEY_QUARANTINES = Counter(
+    "tikhub_key_quarantines_total", "各 API Key 因 429 / 401 被隔离的次数", ["key", "status"])
+KEY_IN_FLIGHT = Gauge(
+    "tikhub_key_in_flight", "各 API Key 正在进行的请求数", ["key"])
+KEY_QUARANTINED = Gauge(
+    "tikhub_key_quarantined", "API Key 当前是否处于隔离期（1 / 0）", ["key"])
+KEY_QUOTA_REMAINING = Gauge(
+    "tikhub_key_quota_remaining", "配置了配额时，各 API Key 在当前窗口内的剩余请求数", ["key"])
+
+# 结果缓存
+CACHE_REQUESTS = Counter(
+    "result_store_requests_total", "结果缓存读取次数，result 为 hit / disk / miss", ["result"])
+SEARCH_INDEX = Gauge(
+    "search_index_size", "评论检索索引规模，kind 为 videos / comments / terms / pending_videos（等待索引）", ["kind"])
+
+# 处理流水线
+PHASE_SECONDS = Histogram(
+    "pipeline_phase_seconds", "处理阶段耗时（秒），phase 为 format / analytics / stats / search / serialize", ["phase"])
+EXPORT_SECONDS = Histogram(
+    "export_seconds", "导出文件生成耗时（秒），流式格式计到最后一块发送完毕", ["format"])
+PHASE_MEMORY = Histogram(
+    "pipeline_phase_memory_peak_bytes", "开启内存追踪的请求中各阶段的峰值分配（字节）", ["phase"],
+    buckets=tuple(2 ** n * 1024 * 1024 for n in range(11)))
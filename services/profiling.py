@@ -0,0 +1,287 @@
+"""
+按请求开启的性能分析
+设置 PROFILE_TOKEN 后，请求携带 X-Profile-Token 头或 profile_token 查询参数即在 cProfile 下运行，
+结果保存到 PROFILE_DIR，通过 /admin/profiles 列出和下载
+"""
+
+import contextvars
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+# 未设置 PROFILE_TOKEN 时关闭性能分析与管理接口
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'tiktok_comments_profiles'))
+
+# 最多保留的分析结果数，超出时删除最旧的
+MAX_PROFILES = 50
+
+TOKEN_HEADER = 'X-Profile-Token'
+TOKEN_PARAM = 'profile_token'
+ID_HEADER = 'X-Profile-Id'
+
+_PROFILE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+# 文本摘要支持的排序字段
+SORT_KEYS = frozenset(key.value for key in pstats.SortKey)
+
+_session: "contextvars.ContextVar[Optional[ProfileSession]]" = contextvars.ContextVar("profile_session", default=None)
+
+
+def authorized(token: Optional[str]) -> bool:
+    """校验令牌；未配置 PROFILE_TOKEN 时总是拒绝"""
+    if not PROFILE_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode('utf-8'), PROFILE_TOKEN.encode('utf-8'))
+
+
+class ProfileSession:
+    """
+    一个请求的性能分析
+    请求线程使用主分析器，线程池中的抓取任务各自分析后合并
+    """
+
+    def __init__(self):
+        self.profile_id = uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.profiler = cProfile.Profile()
+        self._workers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        self.profiler.enable()
+
+    def add_worker(self, profiler: cProfile.Profile) -> None:
+        with self._lock:
+            self._workers.append(profiler)
+
+    def stop(self, method: str, path: str, status: int) -> str:
+        """停止分析并保存，返回分析 ID"""
+        self.profiler.disable()
+        stats = pstats.Stats(self.profiler)
+        with self._lock:
+            for worker in self._workers:
+                stats.add(worker)
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stats.dump_stats(_path(self.profile_id, '.prof'))
+        meta = {
+            "id": self.profile_id,
+            "method": method,
+            "path": path,
+            "status": status,
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "worker_threads": len(self._workers),
+            "created_at": time.time(),
+        }
+        with open(_path(self.profile_id, '.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+        _prune()
+        return self.profile_id
+
+
+def _path(profile_id: str, suffix: str) -> str:
+    return os.path.join(PROFILE_DIR, profile_id + suffix)
+
+
+def _prune() -> None:
+    profiles = list_profiles()
+    for meta in profiles[MAX_PROFILES:]:
+        for suffix in ('.prof', '.json'):
+            try:
+                os.remove(_path(meta["id"], suffix))
+            except OSError:
+                pass
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """已保存的分析结果，最新的在前"""
+    try:
+        names = os.listdir(PROFILE_DIR)
+    except OSError:
+        return []
+
+    profiles = []
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name), 'r', encoding='utf-8') as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    profiles.sort(key=lambda meta: meta.get("created_at", 0), reverse=True)
+    return profiles
+
+
+def begin() -> Tuple[ProfileSession, contextvars.Token]:
+    session = ProfileSession()
+    token = _session.set(session)
+    session.start()
+    return session, token
+
+
+def end(token: contextvars.Token) -> None:
+    _session.reset(token)
+
+
+def profiled(fn: Callable, *args, **kwargs):
+    """线程池任务：所在请求开启了分析时在独立的分析器下运行，结束后并入请求的结果"""
+    session = _session.get()
+    if session is None:
+        return fn(*args, **kwargs)
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(fn, *args, **kwargs)
+    finally:
+        session.add_worker(profiler)
+
+
+def admin_response(path: str, query: Dict[str, str], token: Optional[str]) -> Tuple[Any, str, int, Dict[str, str]]:
+    """
+    处理 /admin/profiles 与 /admin/profiles/<id>
+    返回 (响应体, Content-Type, 状态码, 额外响应头)；format=text 时下载 pstats 文本摘要
+    """
+    if not authorized(token):
+        return {"success": False, "error": "未授权"}, 'application/json', 403, {}
+
+    match = re.match(r'^/admin/profiles/?([^/]*)$', path)
+    if not match:
+        return {"success": False, "error": "Not found"}, 'application/json', 404, {}
+
+    profile_id = match.group(1)
+    if not profile_id:
+        return {"success": True, "profiles": list_profiles()}, 'application/json', 200, {}
+
+    if not _PROFILE_ID.match(profile_id) or not os.path.exists(_path(profile_id, '.prof')):
+        return {"success": False, "error": "分析结果不存在"}, 'application/json', 404, {}
+
+    if query.get('format') == 'text':
+        sort = query.get('sort') or 'cumulative'
+        if sort not in SORT_KEYS:
+            return {
+                "success": False,
+                "error": f"不支持的排序字段: {sort}（可选 {', '.join(sorted(SORT_KEYS))}）"
+            }, 'application/json', 400, {}
+        output = io.StringIO()
+        stats = pstats.Stats(_path(profile_id, '.prof'), stream=output)
+        stats.sort_stats(sort).print_stats(50)
+        return output.getvalue().encode('utf-8'), 'text/plain; charset=utf-8', 200, {}
+
+    with open(_path(profile_id, '.prof'), 'rb') as f:
+        body = f.read()
+    headers = {'Content-Disposition': f'attachment; filename="{profile_id}.prof"'}
+    return body, 'application/octet-stream', 200, headers
+
+
+def init_app(app) -> None:
+    """为 Flask 应用注册按请求分析和 /admin/profiles 接口"""
+    from flask import g, request, jsonify, Response
+
+    @app.before_request
+    def _begin_profile():
+        if not PROFILE_TOKEN or request.path.startswith('/admin/profiles'):
+            return
+        if authorized(request.headers.get(TOKEN_HEADER) or request.args.get(TOKEN_PARAM)):
+            g.profile_session, g.profile_token = begin()
+
+    @app.after_request
+    def _finish_profile(response):
+        session = g.pop("profile_session", None)
+        if session is None:
+            return response
+
+        response.headers[ID_HEADER] = session.profile_id
+        method, path, status = request.method, request.path, response.status_code
+        # 流式导出在响应发送完毕后才结束，分析也到关闭时为止
+        response.call_on_close(lambda: session.stop(method, path, status))
+        return response
+
+    @app.teardown_request
+    def _end_profile(exc):
+        # 未经过 after_request（异常中断）时也要停止分析器
+        session = g.pop("profile_session", None)
+        if session is not None:
+            session.profiler.disable()
+        token = g.pop("profile_token", None)
+        if token is not None:
+            end(token)
+
+    def admin(profile_id=''):
+        token = request.headers.get(TOKEN_HEADER) or request.args.get(TOKEN_PARAM)
+        body, content_type, status, headers = admin_response(request.path, request.args, token)
+        if content_type == 'application/json':
+            return jsonify(body), status
+        return Response(body, status=status, content_type=content_type, headers=headers)
+
+    app.add_url_rule('/admin/profiles', 'admin_profiles', admin)
+    app.add_url_rule('/admin/profiles/<profile_id>', 'admin_profile', admin)
+
+
+class ProfiledHandlerMixin:
+    """
+    BaseHTTPRequestHandler 格式的 serverless 函数使用的按请求分析
+    以 /admin/profiles 开头的 GET 请求由 handle_admin() 处理
+    """
+
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+
+        self._profile = None
+        if PROFILE_TOKEN and not self.path.startswith('/admin/profiles'):
+            query = _query(self.path)
+            if authorized(self.headers.get(TOKEN_HEADER) or query.get(TOKEN_PARAM)):
+                self._profile = begin()
+        return True
+
+    def handle_one_request(self):
+        self._profile = None
+        self._profile_status = None
+        try:
+            super().handle_one_request()
+        finally:
+            if self._profile is not None:
+                session, token = self._profile
+                end(token)
+                session.stop(self.command, self.path.split('?', 1)[0], self._profile_status)
+
+    def send_response(self, code, message=None):
+        self._profile_status = code
+        super().send_response(code, message)
+
+    def end_headers(self):
+        if getattr(self, '_profile', None) is not None:
+            self.send_header(ID_HEADER, self._profile[0].profile_id)
+        super().end_headers()
+
+    def handle_admin(self) -> None:
+        query = _query(self.path)
+        token = self.headers.get(TOKEN_HEADER) or query.get(TOKEN_PARAM)
+        body, content_type, status, headers = admin_response(self.path.split('?', 1)[0], query, token)
+        if content_type == 'application/json':
+            body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _query(path: str) -> Dict[str, str]:
+    from urllib.parse import urlparse, parse_qs
+    return {k: v[0] for k, v in parse_qs(urlparse(path).query).items()}
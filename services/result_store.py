@@ -0,0 +1,301 @@
+"""
+抓取结果缓存
+批量接口抓取完成后把每个视频的评论保存在服务端，前端按页读取
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from services import metrics, timing
+from services.search import SearchIndex
+from services.stats import CommentColumns
+
+# 分页参数
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# 支持的排序方式
+SORT_KEYS = {
+    "default": None,
+    "likes": lambda c: c.get("likes", 0),
+    "time": lambda c: c.get("create_time", 0),
+    "replies": lambda c: c.get("reply_count", 0),
+}
+
+
+class ResultStore:
+    """
+    按视频 ID 保存格式化后的评论
+    内存中按 LRU 淘汰，配置 directory 后同时落盘，供同一主机上的其他进程读取
+    配置 index 后内存中的视频同步写入检索索引（后台增量构建），淘汰时一并移出
+    """
+
+    def __init__(self, max_videos: int = 200, ttl: int = 3600, directory: Optional[str] = None,
+                 index: Optional[SearchIndex] = None):
+        self.max_videos = max_videos
+        self.ttl = ttl
+        self.directory = directory
+        self.index = index
+        self._videos: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _write_file(self, key: str, payload: Dict[str, Any]) -> None:
+        # 临时文件名唯一：多个进程或线程同时保存同一视频时各写各的，最后一次替换生效
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{key}.", suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _read_file(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - payload.get("saved_at", 0) > self.ttl:
+            return None
+        return payload
+
+    def _evict(self) -> None:
+        """按 LRU 淘汰超出容量的视频（调用方持有锁）"""
+        while len(self._videos) > self.max_videos:
+            aweme_id, _ = self._videos.popitem(last=False)
+            if self.index is not None:
+                self.index.submit(aweme_id, None)
+
+    def save_video(self, video: Dict[str, Any]) -> None:
+        """保存单个视频的抓取结果（需包含 video_id 与 comments）"""
+        aweme_id = video.get("video_id")
+        if not aweme_id:
+            return
+
+        entry = {
+            "url": video.get("url"),
+            "video_id": aweme_id,
+            "total_comments": len(video.get("comments", [])),
+            "comments": video.get("comments", []),
+            "saved_at": time.time(),
+            "orders": {}
+        }
+
+        with self._lock:
+            self._videos[aweme_id] = entry
+            self._videos.move_to_end(aweme_id)
+            if self.index is not None:
+                self.index.submit(aweme_id, entry["comments"])
+            self._evict()
+
+        if self.directory and aweme_id.isalnum():
+            self._write_file(aweme_id, {k: v for k, v in entry.items() if k not in ("orders", "columns")})
+
+    def get_video(self, aweme_id: str) -> Optional[Dict[str, Any]]:
+        """读取视频结果，过期或不存在时返回 None"""
+        timing.add_aweme_id(aweme_id)
+        with self._lock:
+            entry = self._videos.get(aweme_id)
+            if entry is not None:
+                if time.time() - entry["saved_at"] > self.ttl:
+                    del self._videos[aweme_id]
+                    if self.index is not None:
+                        self.index.submit(aweme_id, None)
+                    entry = None
+                else:
+                    self._videos.move_to_end(aweme_id)
+
+        if entry is not None:
+            metrics.CACHE_REQUESTS.inc(result="hit")
+            return entry
+
+        # 视频 ID 来自查询参数，只读取由字母数字组成的文件名，避免路径穿越
+        if self.directory and aweme_id.isalnum():
+            entry = self._load_from_disk(aweme_id)
+        metrics.CACHE_REQUESTS.inc(result="disk" if entry is not None else "miss")
+
+        return entry
+
+    def _load_from_disk(self, aweme_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._read_file(aweme_id)
+        if entry is None:
+            return None
+
+        entry["orders"] = {}
+        with self._lock:
+            self._videos[aweme_id] = entry
+            if self.index is not None:
+                self.index.submit(aweme_id, entry["comments"])
+            self._evict()
+        return entry
+
+    def save_job(self, video_ids: List[str]) -> str:
+        """记录一次批量抓取包含的视频（按原始顺序），返回任务 ID"""
+        job_id = uuid.uuid4().hex
+        job = {"job_id": job_id, "video_ids": list(video_ids), "saved_at": time.time()}
+
+        with self._lock:
+            self._jobs[job_id] = job
+            while len(self._jobs) > self.max_videos:
+                self._jobs.popitem(last=False)
+
+        if self.directory:
+            self._write_file(f"job_{job_id}", job)
+
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """读取任务，过期或不存在时返回 None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None and time.time() - job["saved_at"] > self.ttl:
+            job = None
+
+        if job is None and self.directory and job_id.isalnum():
+            job = self._read_file(f"job_{job_id}")
+
+        return job
+
+    def resolve_videos(self, job_id: Optional[str] = None,
+                       aweme_ids: Optional[List[str]] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        按任务 ID 或视频 ID 列表取出完整结果，供导出接口直接使用
+        任一视频缺失时返回 None
+        """
+        if job_id:
+            job = self.get_job(job_id)
+            if job is None:
+                return None
+            aweme_ids = job["video_ids"]
+
+        if not aweme_ids:
+            return None
+
+        videos = []
+        for aweme_id in aweme_ids:
+            entry = self.get_video(aweme_id)
+            if entry is None:
+                return None
+            videos.append(entry)
+        return videos
+
+    def _ordered(self, entry: Dict[str, Any], sort: str) -> List[Dict[str, Any]]:
+        """按排序方式返回评论列表，排序结果按视频缓存，翻页时不再重复排序"""
+        key = SORT_KEYS.get(sort)
+        if key is None:
+            return entry["comments"]
+
+        orders = entry["orders"]
+        if sort not in orders:
+            orders[sort] = sorted(entry["comments"], key=key, reverse=True)
+        return orders[sort]
+
+    def video_columns(self, entry: Dict[str, Any]) -> CommentColumns:
+        """评论的列式数据（统计接口使用），与排序结果一样按视频缓存"""
+        columns = entry.get("columns")
+        if columns is None:
+            columns = entry["columns"] = CommentColumns.from_comments(entry["comments"])
+        return columns
+
+    def get_page(self, aweme_id: str, cursor: int = 0, limit: int = DEFAULT_PAGE_SIZE,
+                 sort: str = "default") -> Optional[Dict[str, Any]]:
+        """
+        读取一页评论
+        cursor 为偏移量，返回 next_cursor 供下一次请求使用
+        """
+        entry = self.get_video(aweme_id)
+        if entry is None:
+            return None
+
+        cursor = max(cursor, 0)
+        limit = min(max(limit, 1), MAX_PAGE_SIZE)
+        comments = self._ordered(entry, sort)
+        page = comments[cursor:cursor + limit]
+        next_cursor = cursor + len(page)
+
+        return {
+            "success": True,
+            "video_id": aweme_id,
+            "total": len(comments),
+            "sort": sort,
+            "cursor": cursor,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor < len(comments),
+            "comments": page
+        }
+
+
+def parse_page_args(args: Dict[str, Any]) -> Dict[str, Any]:
+    """解析分页查询参数，非法值回退为默认值"""
+    def to_int(value, default):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return default
+
+    sort = args.get("sort") or "default"
+    if sort not in SORT_KEYS:
+        sort = "default"
+
+    return {
+        "cursor": to_int(args.get("cursor"), 0),
+        "limit": to_int(args.get("limit"), DEFAULT_PAGE_SIZE),
+        "sort": sort
+    }
+
+
+def parse_page_size(value: Any) -> Optional[int]:
+    """解析批量接口的 page_size，限制在 1 ~ MAX_PAGE_SIZE 之间；不是整数时返回 None"""
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    if isinstance(value, bool):
+        return None
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return None
+    return min(max(size, 1), MAX_PAGE_SIZE)
+
+
+def first_page(video: Dict[str, Any], limit: Optional[int] = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+    """批量接口响应中只携带每个视频的第一页评论；limit 为 None 时携带全部评论"""
+    comments = video.get("comments", [])
+    page = comments[:limit]
+    return dict(
+        video,
+        comments=page,
+        next_cursor=len(page),
+        has_more=len(page) < len(comments)
+    )
+
+
+def parse_export_ref(args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    解析导出引用参数：job_id，或 aweme_id / aweme_ids（逗号分隔或列表）
+    """
+    aweme_ids = args.get("aweme_ids") or args.get("aweme_id") or []
+    if isinstance(aweme_ids, str):
+        aweme_ids = [i.strip() for i in aweme_ids.split(",") if i.strip()]
+
+    return {
+        "job_id": args.get("job_id") or None,
+        "aweme_ids": [str(i) for i in aweme_ids]
+    }
@@ -0,0 +1,352 @@
+"""
+批量抓取的页级调度
+进程内一组常驻工作线程（CrawlExecutor）服务所有批量请求：每个线程每次只为一个视频抓一页，再把它放回队列。
+评论少的视频不再排在大视频后面等待整个视频抓完，上游并发总数也不再随请求数增长
+
+调度策略（批次内）:
+  round_robin  按轮次交替推进各视频（默认）
+  srf          剩余最少优先：上游报告了总数时按剩余条数，否则按已抓页数（最少已服务优先）
+
+准入控制:
+  同时抓取的批次数不超过 CRAWL_MAX_BATCHES，其余批次在有界队列（CRAWL_QUEUE_SIZE）中等待；
+  队列已满时立即拒绝（QueueFull），Retry-After 按队列深度与近期批次耗时估算。
+  多个客户端同时有批次在抓取时按客户端轮流分配页请求；设置 CRAWL_CLIENT_MAX_BATCHES 后限制单个客户端占用的批次数
+  批次超过 CRAWL_BATCH_TIMEOUT 秒未完成时中止，未完成的视频记为失败
+"""
+
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque, OrderedDict
+from typing import Dict, Any, List, Optional
+
+from services import memory, metrics, profiling, timing
+from services.tikhub import POOL_SIZE, VideoCrawl, extract_video_id, video_error, video_result
+
+POLICIES = ("round_robin", "srf")
+
+# 进程内抓取线程数（即到上游的最大并发），默认与 HTTP 连接池大小一致
+DEFAULT_WORKERS = int(os.environ.get('CRAWL_WORKERS', POOL_SIZE))
+DEFAULT_POLICY = os.environ.get('CRAWL_SCHEDULER_POLICY', 'round_robin')
+
+# 同时抓取的批次数、排队等待的批次数、单个客户端的批次上限（0 表示不限）
+MAX_BATCHES = int(os.environ.get('CRAWL_MAX_BATCHES', 8))
+QUEUE_SIZE = int(os.environ.get('CRAWL_QUEUE_SIZE', 16))
+CLIENT_MAX_BATCHES = int(os.environ.get('CRAWL_CLIENT_MAX_BATCHES', 0))
+
+# 等待批次完成的最长秒数（包括排队时间）
+BATCH_TIMEOUT = float(os.environ.get('CRAWL_BATCH_TIMEOUT', 600))
+
+# 尚无完成批次时估算 Retry-After 使用的批次耗时（秒），以及 Retry-After 的上限
+INITIAL_BATCH_SECONDS = 5.0
+MAX_RETRY_AFTER = 60
+
+
+class QueueFull(Exception):
+    """抓取队列已满或客户端超出份额，retry_after 为建议的重试等待秒数"""
+
+    def __init__(self, retry_after: int, reason: str):
+        super().__init__(f"服务繁忙，请 {retry_after} 秒后重试")
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def client_id(headers, remote_addr: Optional[str]) -> str:
+    """按 X-Client-Id、X-Forwarded-For 首个地址或连接地址区分客户端"""
+    forwarded = headers.get('X-Forwarded-For', '')
+    return headers.get('X-Client-Id') or forwarded.split(',')[0].strip() or remote_addr or 'unknown'
+
+
+class _Task:
+    """队列中的一个视频"""
+
+    def __init__(self, index: int, url: str, crawl: VideoCrawl):
+        self.index = index
+        self.url = url
+        self.crawl = crawl
+
+    def priority(self) -> int:
+        remaining = self.crawl.remaining()
+        if remaining is not None:
+            return remaining
+        # 总数未知：已抓页数越少越优先（首页总是最先）
+        return self.crawl.pages
+
+
+class BatchScheduler:
+    """
+    一个批次的翻页队列，由 CrawlExecutor 的工作线程推进
+    每个视频同一时刻至多一个请求在途（下一页依赖上一页的游标）；队列状态由执行器的锁保护
+    """
+
+    def __init__(self, urls: List[str], max_comments: Optional[int] = None,
+                 policy: str = DEFAULT_POLICY, client: Optional[str] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"不支持的调度策略: {policy}")
+
+        self.policy = policy
+        self.client = client or 'unknown'
+        self.urls = list(urls)
+        self.results: List[Optional[Dict[str, Any]]] = [None] * len(urls)
+        # 每个视频完成的时间（秒，相对开始抓取），供基准使用
+        self.completed_at: List[Optional[float]] = [None] * len(urls)
+
+        self._ready = deque()
+        self._heap = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._started = 0.0
+        self._submitted = 0.0
+        self._done = threading.Event()
+        # 已进入抓取（计入 CRAWLS_IN_FLIGHT）；已中止时不再排入新的页请求
+        self._admitted = False
+        self._aborted = False
+        # 保护 results：抓完的视频与中止时的失败结果只写入一次
+        self._results_lock = threading.Lock()
+        # 提交批次的请求上下文（计时器、性能分析、内存追踪），工作线程在其副本中抓取
+        self._context: Optional[contextvars.Context] = None
+
+        for index, url in enumerate(urls):
+            video_id = extract_video_id(url)
+            if not video_id:
+                self.results[index] = video_error(url, "无法从 URL 中提取视频 ID")
+                self.completed_at[index] = 0.0
+                continue
+            timing.add_aweme_id(video_id)
+            self._push(_Task(index, url, VideoCrawl(video_id, max_comments)))
+
+        self.pending = len(self._ready) + len(self._heap)
+
+    def _push(self, task: _Task) -> None:
+        if self.policy == "srf":
+            heapq.heappush(self._heap, (task.priority(), next(self._seq), task))
+        else:
+            self._ready.append(task)
+
+    def _pop(self) -> Optional[_Task]:
+        if self.policy == "srf":
+            return heapq.heappop(self._heap)[2] if self._heap else None
+        return self._ready.popleft() if self._ready else None
+
+    def _finish(self, task: _Task) -> None:
+        crawl = task.crawl
+        try:
+            result = video_result(task.url, crawl.aweme_id, crawl.result())
+        except Exception as e:
+            result = video_error(task.url, f"处理失败: {str(e)}", crawl.aweme_id)
+        self._set_result(task.index, result)
+
+    def _set_result(self, index: int, result: Dict[str, Any]) -> bool:
+        """写入一个视频的结果；已有结果（如批次已中止）时忽略"""
+        with self._results_lock:
+            if self.results[index] is not None:
+                return False
+            self.results[index] = result
+            self.completed_at[index] = time.perf_counter() - self._started
+        if self._admitted:
+            metrics.CRAWLS_IN_FLIGHT.dec()
+        return True
+
+    def _fail_unfinished(self, error: str) -> None:
+        """把尚未完成的视频记为失败"""
+        for index, url in enumerate(self.urls):
+            if self.results[index] is None:
+                self._set_result(index, video_error(url, error, extract_video_id(url)))
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待全部视频完成，超时返回 False"""
+        return self._done.wait(timeout)
+
+
+class CrawlExecutor:
+    """
+    进程内共享的抓取执行器
+    工作线程在首次提交时启动并常驻；按客户端、再按批次轮流取下一页
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_batches: int = MAX_BATCHES,
+                 queue_size: int = QUEUE_SIZE, client_max_batches: int = CLIENT_MAX_BATCHES):
+        self.workers = max(workers, 1)
+        self.max_batches = max(max_batches, 1)
+        self.queue_size = max(queue_size, 0)
+        self.client_max_batches = client_max_batches
+
+        # 客户端 -> 正在抓取的批次；OrderedDict 的顺序即客户端轮转顺序
+        self._active: "OrderedDict[str, deque]" = OrderedDict()
+        self._active_count = 0
+        self._waiting = deque()
+        self._client_batches: Dict[str, int] = {}
+        self._avg_seconds = INITIAL_BATCH_SECONDS
+        self._threads: List[threading.Thread] = []
+        self._cond = threading.Condition()
+
+    def submit(self, batch: BatchScheduler) -> None:
+        """提交批次；队列已满或客户端超出份额时抛出 QueueFull"""
+        batch._context = contextvars.copy_context()
+        batch._submitted = time.perf_counter()
+        if batch.pending == 0:
+            batch._done.set()
+            return
+
+        with self._cond:
+            if self.client_max_batches and self._client_batches.get(batch.client, 0) >= self.client_max_batches:
+                raise self._reject("client_limit")
+            if self._active_count >= self.max_batches and len(self._waiting) >= self.queue_size:
+                raise self._reject("queue_full")
+
+            self._client_batches[batch.client] = self._client_batches.get(batch.client, 0) + 1
+            self._waiting.append(batch)
+            self._admit()
+            self._start_workers()
+            self._cond.notify_all()
+
+    def run(self, batch: BatchScheduler, timeout: float = BATCH_TIMEOUT) -> List[Dict[str, Any]]:
+        """提交批次并等待完成，按输入顺序返回结果（格式同 fetch_single_video）；超时未完成的视频记为失败"""
+        self.submit(batch)
+        with memory.phase("fetch"):
+            if not batch.wait(timeout):
+                self._abort(batch, f"抓取超时（{timeout:g} 秒）")
+        return batch.results
+
+    def _abort(self, batch: BatchScheduler, error: str) -> None:
+        """
+        中止批次：丢弃排队的页请求，未完成的视频记为失败；
+        在途的页请求完成后不再排入，最后一个完成时移出抓取
+        """
+        try:
+            with self._cond:
+                if batch._done.is_set():
+                    return
+                batch._aborted = True
+                batch._ready.clear()
+                batch._heap.clear()
+                if batch in self._waiting:
+                    self._waiting.remove(batch)
+                    self._release_client(batch.client)
+                    self._admit()
+                elif batch._admitted and batch._in_flight == 0 and batch in self._active.get(batch.client, ()):
+                    self._retire(batch)
+                self._cond.notify_all()
+        except Exception:
+            # 调度状态本身出错（如完成处理抛出异常）时不再整理队列，只保证等待的请求返回
+            pass
+        finally:
+            batch._fail_unfinished(error)
+            batch._done.set()
+
+    def _retry_after(self) -> int:
+        """按排队批次数与近期批次平均耗时估算的等待秒数（调用方持有锁）"""
+        rounds = (len(self._waiting) + 1) / self.max_batches
+        return min(max(math.ceil(rounds * self._avg_seconds), 1), MAX_RETRY_AFTER)
+
+    def _reject(self, reason: str) -> QueueFull:
+        metrics.CRAWL_REJECTED.inc(reason=reason)
+        return QueueFull(self._retry_after(), reason)
+
+    def _admit(self) -> None:
+        """把等待中的批次移入抓取（调用方持有锁）"""
+        while self._waiting and self._active_count < self.max_batches:
+            batch = self._waiting.popleft()
+            batch._started = time.perf_counter()
+            batch._admitted = True
+            metrics.CRAWLS_IN_FLIGHT.inc(batch.pending)
+            metrics.CRAWL_QUEUE_WAIT.observe(batch._started - batch._submitted)
+            self._active.setdefault(batch.client, deque()).append(batch)
+            self._active_count += 1
+        metrics.CRAWL_BATCHES.set(self._active_count, state="active")
+        metrics.CRAWL_BATCHES.set(len(self._waiting), state="queued")
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, name=f"crawl-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _next(self):
+        """按客户端、批次轮流取下一页（调用方持有锁）；返回 (批次, 视频) 或 None"""
+        for _ in range(len(self._active)):
+            client, batches = next(iter(self._active.items()))
+            self._active.move_to_end(client)
+            for _ in range(len(batches)):
+                batch = batches[0]
+                batches.rotate(-1)
+                task = batch._pop()
+                if task is not None:
+                    batch._in_flight += 1
+                    return batch, task
+        return None
+
+    @staticmethod
+    def _step(batch: BatchScheduler, task: _Task) -> None:
+        """抓取一页；视频抓完时整理结果（在请求上下文中运行，格式化耗时计入该请求）"""
+        try:
+            task.crawl.step()
+        except Exception as e:
+            task.crawl.error = {"error": f"处理失败: {str(e)}"}
+        if task.crawl.done:
+            batch._finish(task)
+
+    def _complete(self, batch: BatchScheduler, task: _Task) -> None:
+        with self._cond:
+            batch._in_flight -= 1
+            if not task.crawl.done and not batch._aborted:
+                batch._push(task)
+            elif batch._in_flight == 0 and not batch._ready and not batch._heap:
+                self._retire(batch)
+            self._cond.notify_all()
+
+    def _retire(self, batch: BatchScheduler) -> None:
+        """批次完成，移出抓取并放入下一个等待的批次（调用方持有锁）"""
+        batches = self._active[batch.client]
+        batches.remove(batch)
+        if not batches:
+            del self._active[batch.client]
+        self._active_count -= 1
+        self._release_client(batch.client)
+
+        elapsed = time.perf_counter() - batch._started
+        self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+        self._admit()
+        batch._done.set()
+
+    def _release_client(self, client: str) -> None:
+        """客户端占用的批次数减一（调用方持有锁）"""
+        remaining = self._client_batches[client] - 1
+        if remaining:
+            self._client_batches[client] = remaining
+        else:
+            del self._client_batches[client]
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                picked = self._next()
+                while picked is None:
+                    self._cond.wait()
+                    picked = self._next()
+
+            batch, task = picked
+            # 任何异常都只让该视频或批次失败，工作线程继续服务其他批次
+            try:
+                # 同一批次的多个视频可能同时在不同线程中抓取，每页使用请求上下文的独立副本
+                batch._context.copy().run(profiling.profiled, self._step, batch, task)
+            except Exception as e:
+                task.crawl.error = {"error": f"处理失败: {str(e)}"}
+                batch._set_result(task.index, video_error(task.url, task.crawl.error["error"], task.crawl.aweme_id))
+            try:
+                self._complete(batch, task)
+            except Exception as e:
+                self._abort(batch, f"处理失败: {str(e)}")
+
+
+EXECUTOR = CrawlExecutor()
+
+
+def crawl_batch(urls: List[str], max_comments: Optional[int] = None,
+                policy: str = DEFAULT_POLICY, client: Optional[str] = None) -> List[Dict[str, Any]]:
+    """在共享执行器上按页调度抓取一批 URL，结果与输入顺序一致；服务繁忙时抛出 QueueFull"""
+    return EXECUTOR.run(BatchScheduler(urls, max_comments, policy, client))
@@ -0,0 +1,496 @@
+"""
+评论全文检索
+抓取结果保存到结果缓存时，评论在后台线程中增量写入倒排索引；查询按 BM25 排序，返回 aweme_id 与评论 ID
+
+分词:
+  拉丁字母 / 数字   按词切分，统一为小写（NFKC 归一化，全角字母数字转半角）
+  中日韩文字        连续的汉字、假名、谚文按相邻两字切为二元组（单字保留为一元），
+                   索引时另外写入每个字的一元词，单字查询也能命中多字词中的该字
+  emoji            每个 emoji 一个词
+
+查询语法:
+  苹果 手机          同时包含（AND，也可写 AND）
+  苹果 OR 华为       任一包含
+  -广告 / NOT 广告    排除
+  "新品 发布"        短语，词必须相邻（中文之间的空格忽略，等同 "新品发布"）
+  (苹果 OR 华为) 手机 括号分组
+  多字的中文词本身按短语匹配（"可口可乐" 要求原文包含这四个字，而不只是各个二元组）
+"""
+
+import bisect
+import heapq
+import logging
+import math
+import queue
+import re
+import threading
+import unicodedata
+from array import array
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from services import metrics
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# 被删除的评论超过一半时重建倒排表
+COMPACT_RATIO = 0.5
+
+_CJK = "぀-ヿ㐀-䶿一-鿿가-힯豈-﫿"
+_EMOJI = "\U0001F000-\U0001FAFF☀-➿⬀-⯿"
+_TOKEN = re.compile(rf"[{_CJK}]+|[{_EMOJI}]|[^\W_{_CJK}]+")
+_CJK_WORD = re.compile(rf"[{_CJK}]+")
+EMOJI_CHAR = re.compile(rf"[{_EMOJI}]")
+
+_CJK_SPACE = re.compile(rf"(?<=[{_CJK}])\s+(?=[{_CJK}])")
+
+# 查询词法：括号、引号短语、运算符与普通词
+_QUERY_TOKEN = re.compile(r'\(|\)|-?"[^"]*"|-(?=\()|[^\s()"]+')
+
+logger = logging.getLogger("tiktok_comments.search")
+
+
+def normalize(text: str) -> str:
+    """NFKC 归一化并转小写（全角字母数字转半角）"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """把文本切为索引词（顺序即位置，短语匹配依赖相邻关系）"""
+    tokens = []
+    for match in _TOKEN.findall(normalize(text)):
+        if len(match) > 1 and _CJK_WORD.match(match):
+            tokens.extend(match[i:i + 2] for i in range(len(match) - 1))
+        else:
+            tokens.append(match)
+    return tokens
+
+
+def index_terms(text: str) -> List[str]:
+    """写入倒排表的词：tokenize 的结果加上多字中文词中每个字的一元词（只用于检索，不参与相邻关系）"""
+    tokens = tokenize(text)
+    for match in _CJK_WORD.findall(normalize(text)):
+        if len(match) > 1:
+            tokens.extend(match)
+    return tokens
+
+
+class QueryError(ValueError):
+    """查询语法错误"""
+
+
+class _Node:
+    """查询语法树节点：op 为 term / and / or / not"""
+
+    def __init__(self, op: str, children=None, tokens: Optional[List[str]] = None, text: str = ""):
+        self.op = op
+        self.children = children or []
+        self.tokens = tokens or []
+        self.text = text
+
+
+def parse_query(query: str) -> _Node:
+    """解析查询为语法树"""
+    parts = _QUERY_TOKEN.findall(query)
+    position = 0
+
+    def peek():
+        return parts[position] if position < len(parts) else None
+
+    def take():
+        nonlocal position
+        position += 1
+        return parts[position - 1]
+
+    def parse_or():
+        children = [parse_and()]
+        while peek() == "OR":
+            take()
+            children.append(parse_and())
+        return children[0] if len(children) == 1 else _Node("or", children)
+
+    def parse_and():
+        children = []
+        while peek() not in (None, ")", "OR"):
+            if peek() == "AND":
+                take()
+                continue
+            children.append(parse_unary())
+        if not children:
+            raise QueryError("查询条件不完整")
+        return children[0] if len(children) == 1 else _Node("and", children)
+
+    def parse_unary():
+        part = peek()
+        if part in (None, ")", "OR"):
+            raise QueryError("查询条件不完整")
+        if part in ("NOT", "-"):
+            take()
+            return _Node("not", [parse_unary()])
+        if part.startswith("-"):
+            parts[position] = part[1:]
+            return _Node("not", [parse_unary()])
+        return parse_primary()
+
+    def parse_primary():
+        part = take()
+        if part == "(":
+            node = parse_or()
+            if peek() != ")":
+                raise QueryError("括号不匹配")
+            take()
+            return node
+        # 中文短语按连写处理："新品 发布" 与 "新品发布" 相同
+        text = _CJK_SPACE.sub("", normalize(part[1:-1] if part.startswith('"') else part))
+        tokens = tokenize(text)
+        if not tokens:
+            raise QueryError(f"无法检索的词: {part}")
+        return _Node("term", tokens=tokens, text=text.strip())
+
+    if not parts:
+        raise QueryError("请输入检索词")
+    tree = parse_or()
+    if peek() is not None:
+        raise QueryError("括号不匹配")
+    return tree
+
+
+class SearchIndex:
+    """
+    倒排索引：每个词一个按文档号递增的 array('I') 与对应词频 array('H')
+    文档表保存评论字典的引用（与结果缓存共享，不复制文本），删除的视频先标记，比例过高时重建
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._doc_video = array('I')
+        self._doc_length = array('H')
+        self._alive = bytearray()
+        self._comments: List[Optional[Dict[str, Any]]] = []
+        self._videos: List[str] = []
+        self._video_index: Dict[str, int] = {}
+        # 视频 -> 该视频的文档号区间 [start, end)
+        self._video_docs: Dict[str, Tuple[int, int]] = {}
+        self._live_docs = 0
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._pending = 0
+        self._indexer: Optional[threading.Thread] = None
+
+    # 写入
+
+    def submit(self, aweme_id: str, comments: Optional[List[Dict[str, Any]]]) -> None:
+        """
+        排入后台索引线程（结果缓存保存视频时调用，不阻塞批量接口）
+        comments 为 None 表示移除该视频；增删按提交顺序执行
+        """
+        with self._lock:
+            self._pending += 1
+            metrics.SEARCH_INDEX.set(self._pending, kind="pending_videos")
+            if self._indexer is None:
+                self._indexer = threading.Thread(target=self._index_loop, name="search-indexer", daemon=True)
+                self._indexer.start()
+        self._queue.put((aweme_id, comments))
+
+    def _index_loop(self) -> None:
+        while True:
+            aweme_id, comments = self._queue.get()
+            try:
+                if comments is None:
+                    self.remove_video(aweme_id)
+                else:
+                    self.add_video(aweme_id, comments)
+            except Exception:
+                # 单个视频出错不影响后续索引；线程退出后 _indexer 不会重建
+                logger.exception("索引视频 %s 失败", aweme_id)
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                    self._report()
+
+    def _report(self) -> None:
+        """更新索引规模指标（调用方持有锁）"""
+        metrics.SEARCH_INDEX.set(len(self._video_docs), kind="videos")
+        metrics.SEARCH_INDEX.set(self._live_docs, kind="comments")
+        metrics.SEARCH_INDEX.set(len(self._postings), kind="terms")
+        metrics.SEARCH_INDEX.set(self._pending, kind="pending_videos")
+
+    def add_video(self, aweme_id: str, comments: List[Dict[str, Any]]) -> None:
+        """索引一个视频的评论；同一视频重新抓取时替换旧的索引"""
+        # 分词在锁外完成，查询不被长时间阻塞
+        tokenized = [index_terms(comment.get("text") or "") for comment in comments]
+
+        with self._lock:
+            self._remove(aweme_id)
+            video = self._video_index.get(aweme_id)
+            if video is None:
+                video = self._video_index[aweme_id] = len(self._videos)
+                self._videos.append(aweme_id)
+
+            start = len(self._comments)
+            for offset, (comment, tokens) in enumerate(zip(comments, tokenized)):
+                doc = start + offset
+                counts: Dict[str, int] = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                for token, count in counts.items():
+                    posting = self._postings.get(token)
+                    if posting is None:
+                        posting = self._postings[token] = (array('I'), array('H'))
+                    posting[0].append(doc)
+                    posting[1].append(min(count, 65535))
+                self._comments.append(comment)
+                self._doc_video.append(video)
+                self._doc_length.append(min(len(tokens), 65535))
+                self._total_length += len(tokens)
+
+            self._alive.extend(b"\x01" * len(comments))
+            self._live_docs += len(comments)
+            self._video_docs[aweme_id] = (start, len(self._comments))
+
+    def remove_video(self, aweme_id: str) -> None:
+        """把视频移出索引"""
+        with self._lock:
+            self._remove(aweme_id)
+
+    def _remove(self, aweme_id: str) -> None:
+        docs = self._video_docs.pop(aweme_id, None)
+        if docs is None:
+            return
+        start, end = docs
+        for doc in range(start, end):
+            self._alive[doc] = 0
+            self._comments[doc] = None
+            self._total_length -= self._doc_length[doc]
+        self._live_docs -= end - start
+
+        if len(self._comments) and self._live_docs < len(self._comments) * COMPACT_RATIO:
+            self._compact()
+
+    def _compact(self) -> None:
+        """丢弃已删除的文档并重新编号（调用方持有锁）"""
+        mapping = array('i', [-1]) * len(self._comments)
+        comments, doc_video, doc_length = [], array('I'), array('H')
+        for doc, alive in enumerate(self._alive):
+            if alive:
+                mapping[doc] = len(comments)
+                comments.append(self._comments[doc])
+                doc_video.append(self._doc_video[doc])
+                doc_length.append(self._doc_length[doc])
+
+        postings = {}
+        for token, (docs, tfs) in self._postings.items():
+            new_docs, new_tfs = array('I'), array('H')
+            for doc, tf in zip(docs, tfs):
+                if mapping[doc] >= 0:
+                    new_docs.append(mapping[doc])
+                    new_tfs.append(tf)
+            if new_docs:
+                postings[token] = (new_docs, new_tfs)
+
+        self._video_docs = {aweme_id: (mapping[start], mapping[start] + end - start)
+                            for aweme_id, (start, end) in self._video_docs.items()}
+        self._postings = postings
+        self._comments = comments
+        self._doc_video = doc_video
+        self._doc_length = doc_length
+        self._alive = bytearray(b"\x01" * len(comments))
+
+    # 查询
+
+    @property
+    def pending(self) -> int:
+        """排队等待索引的视频数"""
+        return self._pending
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"videos": len(self._video_docs), "comments": self._live_docs,
+                    "terms": len(self._postings), "pending_videos": self._pending}
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT, offset: int = 0,
+               aweme_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """执行查询，返回按相关度排序的一页结果；语法错误时抛出 QueryError"""
+        tree = parse_query(query)
+        terms = {token for node in _terms(tree) for token in node.tokens}
+        scored = {token for node in _terms(tree, positive=True) for token in node.tokens}
+
+        with self._lock:
+            # 倒排表会被后台线程追加，只复制本次查询涉及的几个；文档表只追加、重建时整体替换，直接引用
+            postings = {token: (self._postings[token][0][:], self._postings[token][1][:])
+                        for token in terms if token in self._postings}
+            doc_count = self._live_docs
+            average_length = self._total_length / doc_count if doc_count else 0.0
+            alive, comments = self._alive, self._comments
+            doc_video, doc_length, videos = self._doc_video, self._doc_length, self._videos
+            allowed = None
+            if aweme_ids is not None:
+                allowed = {self._video_index[i] for i in aweme_ids if i in self._video_index}
+
+        matched = self._evaluate(tree, postings, comments, alive)
+        if allowed is not None:
+            matched = {doc for doc in matched if doc_video[doc] in allowed}
+
+        # BM25：只对命中文档累加各肯定词的得分；评论短、词频小，(词频, 长度) 组合有限，每个词的得分项按组合缓存
+        scores = dict.fromkeys(matched, 0.0)
+        for token in scored & postings.keys():
+            docs, tfs = postings[token]
+            idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            contributions: Dict[int, float] = {}
+            for doc, tf in _frequencies(docs, tfs, scores):
+                key = tf << 16 | doc_length[doc]
+                value = contributions.get(key)
+                if value is None:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_length[doc] / (average_length or 1))
+                    value = contributions[key] = idf * tf * (BM25_K1 + 1) / (tf + norm)
+                scores[doc] += value
+
+        top = [(doc, scores[doc]) for doc in heapq.nlargest(offset + limit, scores, key=scores.__getitem__)][offset:]
+        # 查询期间被移除的视频，其评论引用已清空
+        top = [(doc, score) for doc, score in top if comments[doc] is not None]
+        return {
+            "success": True,
+            "query": query,
+            "total": len(matched),
+            "offset": offset,
+            "limit": limit,
+            "pending_videos": self._pending,
+            "hits": [{
+                "aweme_id": videos[doc_video[doc]],
+                "comment_id": comments[doc].get("id", ""),
+                "score": round(score, 4),
+                "comment": comments[doc],
+            } for doc, score in top],
+        }
+
+    def _evaluate(self, node: _Node, postings, comments, alive, within: Optional[Set[int]] = None) -> Set[int]:
+        """命中的文档集合；within 不为 None 时只在其中求（AND 用先算出的结果缩小后续条件的范围）"""
+        if node.op == "term":
+            return self._match_term(node, postings, comments, alive, within)
+        if node.op == "or":
+            result = set()
+            for child in node.children:
+                result |= self._evaluate(child, postings, comments, alive, within)
+            return result
+        if node.op == "and":
+            positive = sorted((c for c in node.children if c.op != "not"), key=lambda c: _cost(c, postings))
+            negative = [c.children[0] for c in node.children if c.op == "not"]
+            if not positive:
+                raise QueryError("查询需要至少一个不带 NOT 的条件")
+            result = within
+            for child in positive:
+                result = self._evaluate(child, postings, comments, alive, result)
+                if not result:
+                    return set()
+            for child in negative:
+                result = result - self._evaluate(child, postings, comments, alive, result)
+            return result
+        raise QueryError("查询需要至少一个不带 NOT 的条件")
+
+    @staticmethod
+    def _match_term(node: _Node, postings, comments, alive, within: Optional[Set[int]]) -> Set[int]:
+        """单词或短语：先按倒排表求交集，多词时再核对原文中的相邻关系"""
+        lists = []
+        for token in dict.fromkeys(node.tokens):
+            posting = postings.get(token)
+            if posting is None:
+                return set()
+            lists.append(posting[0])
+        lists.sort(key=len)
+
+        if within is None:
+            result = {doc for doc in lists[0] if alive[doc]}
+            lists = lists[1:]
+        else:
+            result = within
+        for docs in lists:
+            if not result:
+                break
+            result = _intersect(result, docs)
+        if len(node.tokens) == 1:
+            return result
+
+        if _CJK_WORD.fullmatch(node.text):
+            # 单个中文词：二元组依次相邻等价于原文包含该词，直接查子串，不再分词
+            return {doc for doc in result if comments[doc] is not None and _contains_text(comments[doc], node.text)}
+        return {doc for doc in result
+                if comments[doc] is not None and _contains_sequence(tokenize(comments[doc].get("text") or ""), node.tokens)}
+
+
+def _terms(node: _Node, positive: bool = False):
+    """查询中的词；positive 时只取参与打分的词（NOT 下的词不计分）"""
+    if node.op == "term":
+        yield node
+    elif not (positive and node.op == "not"):
+        for child in node.children:
+            yield from _terms(child, positive)
+
+
+def _cost(node: _Node, postings) -> Tuple[int, int]:
+    """AND 中条件的求值顺序：倒排表短的单词先算，需要核对原文的短语与嵌套条件在缩小后的范围内再算"""
+    if node.op != "term":
+        return 2, 0
+    size = min(len(postings[token][0]) if token in postings else 0 for token in node.tokens)
+    return int(len(node.tokens) > 1), size
+
+
+def _intersect(docs: Set[int], posting: array) -> Set[int]:
+    """文档集合与有序倒排表求交；集合远小于倒排表时逐个二分查找"""
+    if len(docs) * 16 < len(posting):
+        return {doc for doc in docs if _position(posting, doc) is not None}
+    return docs.intersection(posting)
+
+
+def _position(posting: array, doc: int) -> Optional[int]:
+    i = bisect.bisect_left(posting, doc)
+    return i if i < len(posting) and posting[i] == doc else None
+
+
+def _frequencies(docs: array, tfs: array, matched):
+    """命中文档在某个词上的 (文档号, 词频)"""
+    if len(matched) * 16 < len(docs):
+        for doc in matched:
+            i = _position(docs, doc)
+            if i is not None:
+                yield doc, tfs[i]
+    else:
+        for doc, tf in zip(docs, tfs):
+            if doc in matched:
+                yield doc, tf
+
+
+def _contains_text(comment: Dict[str, Any], word: str) -> bool:
+    text = comment.get("text") or ""
+    return word in text or word in normalize(text)
+
+
+def _contains_sequence(tokens: List[str], sequence: List[str]) -> bool:
+    size = len(sequence)
+    first = sequence[0]
+    for i, token in enumerate(tokens):
+        if token == first and tokens[i:i + size] == sequence:
+            return True
+    return False
+
+
+def parse_search_args(args: Dict[str, Any]) -> Dict[str, Any]:
+    """解析检索参数：q、limit、offset、aweme_ids（逗号分隔）"""
+    def to_int(value, default):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return default
+
+    aweme_ids = args.get("aweme_ids") or args.get("aweme_id")
+    return {
+        "query": (args.get("q") or "").strip(),
+        "limit": min(max(to_int(args.get("limit"), DEFAULT_LIMIT), 1), MAX_LIMIT),
+        "offset": max(to_int(args.get("offset"), 0), 0),
+        "aweme_ids": [i.strip() for i in aweme_ids.split(",") if i.strip()] if aweme_ids else None,
+    }
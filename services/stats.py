@@ -0,0 +1,215 @@
+"""
+评论统计
+把 likes、create_time、reply_count 读入连续的 int64 数组，直方图、分位数、按时间分桶的序列与作者排行均为向量化计算
+依赖 numpy（可选依赖，未安装时统计接口返回错误提示）
+"""
+
+from typing import Dict, Any, List
+
+# 分位数
+PERCENTILES = (50, 75, 90, 95, 99)
+
+# 时间分桶（秒）；auto 时选不超过 MAX_AUTO_BUCKETS 个桶的最小粒度
+BUCKETS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+MAX_AUTO_BUCKETS = 200
+
+DEFAULT_TOP_AUTHORS = 10
+MAX_TOP_AUTHORS = 100
+
+
+def _numpy():
+    """延迟导入 numpy，只有统计接口才需要"""
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError("统计接口需要安装 numpy（pip install numpy）")
+    return numpy
+
+
+class CommentColumns:
+    """一组评论的列式数据：数值列为 int64 数组，作者为整数编码加去重后的作者表"""
+
+    def __init__(self, likes, create_time, reply_count, author_codes, authors: List[Dict[str, Any]]):
+        self.likes = likes
+        self.create_time = create_time
+        self.reply_count = reply_count
+        self.author_codes = author_codes
+        self.authors = authors
+
+    def __len__(self) -> int:
+        return len(self.likes)
+
+    @classmethod
+    def from_comments(cls, comments: List[Dict[str, Any]]) -> "CommentColumns":
+        """从格式化后的评论构建（每个视频构建一次，由结果缓存保存）"""
+        np = _numpy()
+        n = len(comments)
+        codes: Dict[str, int] = {}
+        authors = []
+
+        def author_code(comment):
+            author = comment.get("author") or {}
+            uid = author.get("uid") or author.get("username") or ""
+            code = codes.get(uid)
+            if code is None:
+                code = codes[uid] = len(authors)
+                authors.append({
+                    "uid": uid,
+                    "nickname": author.get("nickname", ""),
+                    "username": author.get("username", ""),
+                })
+            return code
+
+        return cls(
+            np.fromiter((c.get("likes") or 0 for c in comments), dtype=np.int64, count=n),
+            np.fromiter((c.get("create_time") or 0 for c in comments), dtype=np.int64, count=n),
+            np.fromiter((c.get("reply_count") or 0 for c in comments), dtype=np.int64, count=n),
+            np.fromiter((author_code(c) for c in comments), dtype=np.int64, count=n),
+            authors,
+        )
+
+    @classmethod
+    def concat(cls, parts: List["CommentColumns"]) -> "CommentColumns":
+        """合并多个视频的列（批量统计），作者按 uid 重新编码"""
+        np = _numpy()
+        if len(parts) == 1:
+            return parts[0]
+
+        codes: Dict[str, int] = {}
+        authors = []
+        remapped = []
+        for part in parts:
+            mapping = np.empty(len(part.authors), dtype=np.int64)
+            for i, author in enumerate(part.authors):
+                code = codes.get(author["uid"])
+                if code is None:
+                    code = codes[author["uid"]] = len(authors)
+                    authors.append(author)
+                mapping[i] = code
+            remapped.append(mapping[part.author_codes])
+
+        return cls(
+            np.concatenate([p.likes for p in parts]),
+            np.concatenate([p.create_time for p in parts]),
+            np.concatenate([p.reply_count for p in parts]),
+            np.concatenate(remapped),
+            authors,
+        )
+
+
+def _edges(maximum: int) -> List[int]:
+    """1-2-5 递增的分桶边界：0, 1, 2, 5, 10, 20, 50…（点赞、回复数都是长尾分布）"""
+    edges = [0, 1]
+    while edges[-1] <= maximum:
+        last = edges[-1]
+        edges.append(last * 5 // 2 if str(last)[0] == "2" else last * 2)
+    return edges
+
+
+def distribution(values) -> Dict[str, Any]:
+    """总和、均值、最大值、分位数与直方图；直方图每个桶为 [下界, 上界)"""
+    np = _numpy()
+    if len(values) == 0:
+        return {"sum": 0, "mean": 0.0, "max": 0, "percentiles": {}, "histogram": {"edges": [], "counts": []}}
+
+    maximum = int(values.max())
+    edges = _edges(maximum)
+    # 边界不等宽，按边界二分定位后计数，比 np.histogram 的排序实现快
+    counts = np.bincount(np.searchsorted(edges, values, side="right") - 1, minlength=len(edges) - 1)
+    percentiles = np.percentile(values, PERCENTILES)
+    return {
+        "sum": int(values.sum()),
+        "mean": round(float(values.mean()), 3),
+        "max": maximum,
+        "percentiles": {f"p{p}": round(float(v), 3) for p, v in zip(PERCENTILES, percentiles)},
+        "histogram": {"edges": edges, "counts": counts.tolist()},
+    }
+
+
+def timeline(columns: CommentColumns, bucket: str = "auto") -> Dict[str, Any]:
+    """按时间分桶的评论数与点赞数；bucket 为 hour / day / week / auto"""
+    np = _numpy()
+    # 缺少创建时间（为 0）的评论不计入时间序列
+    valid = columns.create_time > 0
+    times = columns.create_time[valid]
+    if len(times) == 0:
+        return {"bucket": bucket, "seconds": 0, "series": []}
+
+    start, end = int(times.min()), int(times.max())
+    if bucket not in BUCKETS:
+        bucket = next((name for name, size in BUCKETS.items() if (end - start) // size < MAX_AUTO_BUCKETS), "week")
+    size = BUCKETS[bucket]
+
+    # 桶起点对齐到 UTC 的整点 / 整日 / 整周
+    origin = start - start % size
+    index = (times - origin) // size
+    comments = np.bincount(index)
+    likes = np.bincount(index, weights=columns.likes[valid]).astype(np.int64)
+    return {
+        "bucket": bucket,
+        "seconds": size,
+        "series": [
+            {"time": origin + i * size, "comments": int(c), "likes": int(l)}
+            for i, (c, l) in enumerate(zip(comments.tolist(), likes.tolist()))
+        ],
+    }
+
+
+def top_authors(columns: CommentColumns, limit: int = DEFAULT_TOP_AUTHORS) -> List[Dict[str, Any]]:
+    """评论数最多的作者（同数时按获赞数）"""
+    np = _numpy()
+    if len(columns) == 0:
+        return []
+
+    counts = np.bincount(columns.author_codes, minlength=len(columns.authors))
+    likes = np.bincount(columns.author_codes, weights=columns.likes, minlength=len(columns.authors))
+    order = np.lexsort((-likes, -counts))[:limit]
+    return [dict(columns.authors[i], comments=int(counts[i]), likes=int(likes[i])) for i in order.tolist()]
+
+
+def summarize(columns: CommentColumns, bucket: str = "auto", top: int = DEFAULT_TOP_AUTHORS) -> Dict[str, Any]:
+    """一组评论的完整统计"""
+    replies = distribution(columns.reply_count)
+    total = len(columns)
+    with_replies = int((columns.reply_count > 0).sum()) if total else 0
+    replies["with_replies"] = with_replies
+    replies["reply_ratio"] = round(with_replies / total, 4) if total else 0.0
+
+    return {
+        "total_comments": total,
+        "authors": len(columns.authors),
+        "likes": distribution(columns.likes),
+        "replies": replies,
+        "timeline": timeline(columns, bucket),
+        "top_authors": top_authors(columns, top),
+    }
+
+
+def parse_stats_args(args: Dict[str, Any]) -> Dict[str, Any]:
+    """解析统计查询参数：bucket（hour/day/week/auto）、top（作者排行条数）"""
+    bucket = args.get("bucket") or "auto"
+    if bucket not in BUCKETS:
+        bucket = "auto"
+    try:
+        top = int(args.get("top", DEFAULT_TOP_AUTHORS))
+    except (TypeError, ValueError):
+        top = DEFAULT_TOP_AUTHORS
+    return {"bucket": bucket, "top": min(max(top, 0), MAX_TOP_AUTHORS)}
+
+
+def videos_stats(items: List[Dict[str, Any]], bucket: str = "auto",
+                 top: int = DEFAULT_TOP_AUTHORS) -> Dict[str, Any]:
+    """
+    items 为 [{"video_id", "columns"}]；单个视频时直接返回该视频的统计，
+    多个视频时返回每个视频的统计与合并后的整体统计
+    """
+    if len(items) == 1:
+        return dict({"success": True, "video_id": items[0]["video_id"]},
+                    **summarize(items[0]["columns"], bucket, top))
+
+    return {
+        "success": True,
+        "videos": [dict({"video_id": item["video_id"]}, **summarize(item["columns"], bucket, top))
+                   for item in items],
+        "combined": summarize(CommentColumns.concat([item["columns"] for item in items]), bucket, top),
+    }
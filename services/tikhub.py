@@ -0,0 +1,399 @@
+"""
+TikHub 评论抓取
+app.py 与 api/ 下的 Vercel 函数共用的抓取核心
+"""
+
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, TextIO, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services import memory, metrics, timing
+from services.credentials import pool_from_env
+from services.dedup import CidSet, CommentDeduper
+
+# API 配置 - 从环境变量读取（TIKHUB_BASE_URL 可指向本地模拟服务）
+API_KEY = os.environ.get('TIKHUB_API_KEY', "yY08aG9D6Gt45xNfyVW/s2oZ0kAkzYzcqMxwkGb27TJErnoTdfwowAWLEA==")
+# Key 池：设置 TIKHUB_API_KEYS（逗号分隔）后在多个 Key 间分配请求
+KEY_POOL = pool_from_env(API_KEY)
+BASE_URL = os.environ.get('TIKHUB_BASE_URL', "https://api.tikhub.io")
+
+COMMENTS_PATH = "/api/v1/tiktok/app/v3/fetch_video_comments"
+
+# 单次上游请求超时（秒）
+REQUEST_TIMEOUT = float(os.environ.get('TIKHUB_TIMEOUT', 30))
+
+# 连接池大小，不小于批量接口的并发数
+POOL_SIZE = 16
+
+# 每页条数：DEFAULT_PAGE_COUNT 为原先固定使用的值；每个进程先用 PROBE_PAGE_COUNT 请求，
+# 按上游实际返回的条数确定其接受的最大值并缓存，减少翻页次数
+DEFAULT_PAGE_COUNT = 30
+PROBE_PAGE_COUNT = int(os.environ.get('TIKHUB_PAGE_COUNT_MAX', 100))
+# 下调后的条数缓存多久（秒），到期后重新用 PROBE_PAGE_COUNT 探测
+PAGE_COUNT_TTL = float(os.environ.get('TIKHUB_PAGE_COUNT_TTL', 600))
+
+# 支持的 URL 格式，模块加载时编译一次
+VIDEO_ID_PATTERNS = [re.compile(pattern) for pattern in (
+    r'/video/(\d+)',
+    r'/v/(\d+)',
+    r'tiktok\.com/.*?/video/(\d+)',
+    r'vm\.tiktok\.com/(\w+)',
+    r'vt\.tiktok\.com/(\w+)'
+)]
+
+
+def _make_session() -> requests.Session:
+    """进程内共享的 HTTP 会话，复用到 TikHub 的连接（每个 serverless 容器只建一次）"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+SESSION = _make_session()
+
+
+def extract_video_id(url: str) -> str:
+    """
+    从 TikTok URL 中提取视频 ID
+    支持多种 URL 格式
+    """
+    for pattern in VIDEO_ID_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return match.group(1)
+
+    return None
+
+
+def read_urls(source: TextIO) -> List[Tuple[str, Optional[str]]]:
+    """读取 URL 列表（每行一个 URL 或视频 ID，# 开头为注释），返回 [(原始行, 视频 ID)]；同一视频只保留第一次出现"""
+    entries, seen = [], set()
+    for line in source:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        video_id = line if line.isdigit() else extract_video_id(line)
+        if video_id is not None and video_id in seen:
+            continue
+        seen.add(video_id)
+        entries.append((line, video_id))
+    return entries
+
+
+class PageSizer:
+    """
+    进程内缓存上游接受的最大每页条数
+    还有下一页却返回不满时，说明上游截断了 count，按实际条数下调（不低于 DEFAULT_PAGE_COUNT）
+    下调的结果只保留 ttl 秒，到期后重新探测，避免一次偶然的截断或拒绝永久拖慢翻页
+    """
+
+    def __init__(self, default: int = DEFAULT_PAGE_COUNT, probe: int = PROBE_PAGE_COUNT,
+                 ttl: float = PAGE_COUNT_TTL):
+        self.default = default
+        self.probe = max(probe, default)
+        self.ttl = ttl
+        self.count: Optional[int] = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def next_count(self) -> int:
+        """下一次请求使用的条数；尚未确定或下调已过期时用探测值"""
+        with self._lock:
+            if self.count is not None and self.count < self.probe and time.monotonic() >= self._expires:
+                self.count = None
+            return self.count or self.probe
+
+    def observe(self, requested: int, returned: int, has_more: bool) -> None:
+        # 最后一页本来就可能不满，不能说明上限
+        if not has_more:
+            return
+
+        with self._lock:
+            honored = requested if returned >= requested else max(returned, self.default)
+            if self.count is None or honored < self.count:
+                self._set(honored)
+
+    def reject(self, requested: int) -> None:
+        """上游以 4xx 拒绝了 requested，而默认条数重试同一页成功：退回默认值"""
+        if requested <= self.default:
+            return
+        with self._lock:
+            self._set(self.default)
+
+    def _set(self, count: int) -> None:
+        self.count = count
+        self._expires = time.monotonic() + self.ttl
+        metrics.PAGE_COUNT.set(count)
+
+
+PAGE_SIZER = PageSizer()
+
+
+def fetch_comments_app_v3(aweme_id: str, cursor: int = 0, count: int = 30) -> Dict[Any, Any]:
+    """
+    使用 APP V3 接口获取评论
+    """
+    params = {
+        "aweme_id": aweme_id,
+        "cursor": cursor,
+        "count": count
+    }
+
+    # 429 / 401 时隔离当前 Key 并换一个 Key 重试；所有 Key 都试过后再试一次，
+    # 由 acquire 等待最早解除隔离的 Key（只有一个 Key 时即等待其 Retry-After）
+    result = {"error": "没有可用的 API Key（均被限流或配额已用尽），请稍后重试"}
+    for attempt in range(KEY_POOL.size + 1):
+        key = KEY_POOL.acquire()
+        if key is None:
+            break
+        if attempt:
+            metrics.UPSTREAM_RETRIES.inc()
+
+        result, status, retry_after = _request_page(params, key.secret)
+        KEY_POOL.release(key, status, retry_after)
+        if status not in ("429", "401"):
+            break
+
+    return result
+
+
+def _request_page(params: Dict[str, Any], api_key: str):
+    """发送一次上游请求，返回 (结果, 状态, Retry-After 秒数)"""
+    endpoint = f"{BASE_URL}{COMMENTS_PATH}"
+
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+    start = time.perf_counter()
+    status = "error"
+    try:
+        response = SESSION.get(endpoint, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+        status = str(response.status_code)
+
+        if response.status_code == 200:
+            return response.json(), status, None
+        else:
+            return {
+                "error": f"HTTP {response.status_code}",
+                "message": response.text[:200]
+            }, status, _retry_after(response)
+    except requests.exceptions.Timeout:
+        status = "timeout"
+        return {"error": "请求超时，请重试"}, status, None
+    except requests.exceptions.ConnectionError:
+        status = "connection_error"
+        return {"error": "网络连接失败，请检查网络"}, status, None
+    except Exception as e:
+        return {"error": f"请求失败: {str(e)}"}, status, None
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.UPSTREAM_SECONDS.observe(elapsed, status=status)
+        timing.record("upstream", elapsed)
+
+
+def _retry_after(response) -> Optional[float]:
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class VideoCrawl:
+    """
+    单个视频的翻页状态
+    step() 抓取一页并推进游标；fetch_all_comments 连续调用，批量调度器在多个视频间交替调用
+    known 为此前已保存评论的 cid 集合（定时监控的增量刷新），comments 中只保留新评论
+    """
+
+    def __init__(self, aweme_id: str, max_comments: Optional[int] = None, known: Optional[CidSet] = None):
+        self.aweme_id = aweme_id
+        self.max_comments = max_comments
+        self.comments = []
+        self.cursor = 0
+        self.has_more = True
+        self.pages = 0
+        # 上游报告的评论总数（未提供时为 None）
+        self.total: Optional[int] = None
+        self.error: Optional[Dict[str, Any]] = None
+        # 按 cid 去重：游标重叠或抓取期间有新评论时，后续页会重复返回已抓到的评论
+        self.dedup = CommentDeduper(known=known)
+        # 较大的 count 被 4xx 拒绝时记下该条数，下一步以默认条数重试同一页
+        self.rejected_count: Optional[int] = None
+
+    @property
+    def done(self) -> bool:
+        if self.error is not None or not self.has_more:
+            return True
+        return self.max_comments is not None and len(self.comments) >= self.max_comments
+
+    def remaining(self) -> Optional[int]:
+        """估计还需抓取的评论数，总数未知时为 None"""
+        if self.total is None:
+            return None
+        target = self.total if self.max_comments is None else min(self.total, self.max_comments)
+        return max(target - len(self.comments), 0)
+
+    def step(self) -> None:
+        """抓取下一页"""
+        rejected = self.rejected_count
+        count = PAGE_SIZER.default if rejected else PAGE_SIZER.next_count()
+        result = fetch_comments_app_v3(self.aweme_id, cursor=self.cursor, count=count)
+
+        if "error" in result:
+            if not rejected and count > PAGE_SIZER.default and str(result["error"]).startswith("HTTP 4") \
+                    and result["error"] not in ("HTTP 429", "HTTP 401"):
+                # 可能是上游不接受较大的 count，只对这一页以默认条数重试
+                self.rejected_count = count
+                return
+            # 默认条数同样失败，是视频本身的问题（如 404），不影响进程内的条数
+            self.rejected_count = None
+            self.error = result
+            return
+
+        if rejected:
+            # 默认条数重试成功，确认是 count 过大，之后的请求都退回默认值
+            self.rejected_count = None
+            PAGE_SIZER.reject(rejected)
+
+        data = result.get("data", {})
+        comments = data.get("comments", [])
+
+        if not comments:
+            self.has_more = False
+            return
+
+        duplicates = self.dedup.duplicates
+        fresh = self.dedup.filter(comments)
+        self.comments.extend(fresh)
+        self.pages += 1
+        metrics.PAGES_FETCHED.inc()
+        metrics.COMMENTS_FETCHED.inc(len(fresh))
+        if self.dedup.duplicates > duplicates:
+            metrics.COMMENTS_DUPLICATE.inc(self.dedup.duplicates - duplicates)
+
+        has_more = data.get("has_more", False)
+        previous_cursor = self.cursor
+        self.cursor = data.get("cursor", 0)
+        if isinstance(data.get("total"), int):
+            self.total = data["total"]
+        PAGE_SIZER.observe(count, len(comments), bool(has_more) and self.cursor != 0)
+
+        # 如果没有更多或游标为 0，停止；整页重复且游标未前进时同样停止，避免反复抓取同一页
+        if not has_more or self.cursor == 0 or (not fresh and self.cursor == previous_cursor):
+            self.has_more = False
+
+    def result(self) -> Dict[str, Any]:
+        """与 fetch_all_comments 相同格式的结果"""
+        if self.error is not None:
+            return {
+                "success": False,
+                "error": self.error.get("error", "未知错误"),
+                "message": self.error.get("message", ""),
+                "total_comments": 0,
+                "comments": []
+            }
+
+        return {
+            "success": True,
+            "aweme_id": self.aweme_id,
+            "total_comments": len(self.comments),
+            "comments": self.comments,
+            **self.dedup.summary()
+        }
+
+
+def fetch_all_comments(aweme_id: str, max_comments: Optional[int] = None) -> Dict[str, Any]:
+    """
+    获取视频的所有评论（自动翻页）
+    max_comments: 评论数上限（serverless 环境用于防止超时），None 表示不限制
+    """
+    timing.add_aweme_id(aweme_id)
+    with metrics.CRAWLS_IN_FLIGHT.track(), memory.phase("fetch"):
+        crawl = VideoCrawl(aweme_id, max_comments)
+        while not crawl.done:
+            crawl.step()
+        return crawl.result()
+
+
+def format_comment(comment: Dict) -> Dict:
+    """
+    格式化评论数据
+    """
+    user = comment.get("user", {})
+    avatar_data = user.get("avatar_thumb", {})
+    avatar_urls = avatar_data.get("url_list", [])
+
+    return {
+        "id": comment.get("cid", ""),
+        "text": comment.get("text", ""),
+        "author": {
+            "uid": user.get("uid", ""),
+            "nickname": user.get("nickname", "Unknown"),
+            "username": user.get("unique_id", ""),
+            "avatar": avatar_urls[0] if avatar_urls else "",
+            "signature": user.get("signature", "")
+        },
+        "likes": comment.get("digg_count", 0),
+        "create_time": comment.get("create_time", 0),
+        "create_time_formatted": datetime.fromtimestamp(
+            comment.get("create_time", 0)
+        ).strftime("%Y-%m-%d %H:%M:%S"),
+        "reply_count": comment.get("reply_comment_total", 0),
+        "status": comment.get("status", 0)
+    }
+
+
+def video_error(url: str, error: str, video_id: Optional[str] = None) -> Dict[str, Any]:
+    """批量接口中单个视频失败时的结果"""
+    return {
+        "url": url,
+        "success": False,
+        "error": error,
+        "video_id": video_id,
+        "total_comments": 0,
+        "comments": []
+    }
+
+
+def video_result(url: str, video_id: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """把 fetch_all_comments 的结果整理为批量接口中单个视频的结果（格式化评论）"""
+    if not result["success"]:
+        return video_error(url, result.get("error", "获取评论失败"), video_id)
+
+    with timing.phase("format"):
+        formatted_comments = [format_comment(c) for c in result["comments"]]
+    return {
+        "url": url,
+        "success": True,
+        "error": None,
+        "video_id": video_id,
+        "total_comments": len(formatted_comments),
+        "duplicates": result.get("duplicates", 0),
+        "duplicate_rate": result.get("duplicate_rate", 0.0),
+        "comments": formatted_comments
+    }
+
+
+def fetch_single_video(url: str, max_comments: Optional[int] = None) -> Dict[str, Any]:
+    """
+    获取单个视频的评论（批量接口中每个 URL 调用一次）
+    """
+    try:
+        video_id = extract_video_id(url)
+        if not video_id:
+            return video_error(url, "无法从 URL 中提取视频 ID")
+
+        result = fetch_all_comments(video_id, max_comments=max_comments)
+        return video_result(url, video_id, result)
+    except Exception as e:
+        return video_error(url, f"处理失败: {str(e)}")
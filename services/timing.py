@@ -0,0 +1,207 @@
+"""
+单次请求的阶段耗时
+每个请求累计 upstream / format / serialize / export 等阶段的耗时，写入 Server-Timing 响应头，
+请求结束时输出一行 JSON 日志（含涉及的 aweme_id）
+"""
+
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Iterator
+
+from services import memory, metrics
+
+# Server-Timing 中各阶段的顺序
+PHASE_ORDER = ("upstream", "format", "analytics", "stats", "search", "serialize", "export")
+
+# 响应头只能是 ASCII
+PHASE_DESCRIPTIONS = {
+    "format": "format_comment",
+    "analytics": "text analytics",
+    "stats": "comment stats",
+    "search": "comment search",
+    "serialize": "JSON serialization",
+    "export": "export build",
+}
+
+# REQUEST_LOG=0 时不输出请求日志（Server-Timing 头不受影响）
+LOG_ENABLED = os.environ.get('REQUEST_LOG', '1') != '0'
+
+logger = logging.getLogger("tiktok_comments.requests")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_current: "contextvars.ContextVar[Optional[RequestTimer]]" = contextvars.ContextVar("request_timer", default=None)
+
+
+class RequestTimer:
+    """一个请求的阶段耗时与涉及的视频，线程池中的抓取任务共享同一实例"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, List[float]] = {}
+        self.aweme_ids: List[str] = []
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            entry = self.phases.setdefault(name, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def add_aweme_id(self, aweme_id: str) -> None:
+        with self._lock:
+            if aweme_id not in self.aweme_ids:
+                self.aweme_ids.append(aweme_id)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """
+        Server-Timing 头的值
+        并发抓取时 upstream 为各请求耗时之和，可能大于 total
+        """
+        with self._lock:
+            phases = dict(self.phases)
+
+        names = [name for name in PHASE_ORDER if name in phases]
+        names += sorted(name for name in phases if name not in PHASE_ORDER)
+
+        entries = []
+        for name in names:
+            seconds, count = phases[name]
+            desc = PHASE_DESCRIPTIONS.get(name, name)
+            if name == "upstream":
+                desc = f"{count} pages"
+            entries.append(f'{name};dur={seconds * 1000:.1f};desc="{desc}"')
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(entries)
+
+    def log_record(self, method: str, path: str, status: int) -> Dict[str, Any]:
+        with self._lock:
+            phases = {name: {"ms": round(seconds * 1000, 1), "count": count}
+                      for name, (seconds, count) in self.phases.items()}
+            aweme_ids = list(self.aweme_ids)
+
+        return {
+            "event": "request",
+            "method": method,
+            "path": path,
+            "status": status,
+            "duration_ms": round(self.elapsed() * 1000, 1),
+            "pages": phases.get("upstream", {}).get("count", 0),
+            "phases": phases,
+            "aweme_ids": aweme_ids,
+        }
+
+
+def current() -> Optional[RequestTimer]:
+    """当前请求的计时器，不在请求中时为 None"""
+    return _current.get()
+
+
+def begin() -> contextvars.Token:
+    """开始计时一个请求"""
+    return _current.set(RequestTimer())
+
+
+def end(token: contextvars.Token) -> None:
+    _current.reset(token)
+
+
+def record(name: str, seconds: float) -> None:
+    """把一段耗时计入当前请求"""
+    timer = _current.get()
+    if timer is not None:
+        timer.record(name, seconds)
+
+
+def add_aweme_id(aweme_id: str) -> None:
+    timer = _current.get()
+    if timer is not None:
+        timer.add_aweme_id(aweme_id)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """记录代码块耗时：计入当前请求，同时写入 pipeline_phase_seconds 指标（开启内存追踪时一并记录峰值分配）"""
+    start = time.perf_counter()
+    try:
+        with memory.phase(name):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.PHASE_SECONDS.observe(elapsed, phase=name)
+        record(name, elapsed)
+
+
+def log_request(timer: RequestTimer, method: str, path: str, status: int) -> None:
+    """输出一行结构化请求日志"""
+    if LOG_ENABLED:
+        logger.info(json.dumps(timer.log_record(method, path, status), ensure_ascii=False))
+
+
+def init_app(app) -> None:
+    """为 Flask 应用的每个请求计时，添加 Server-Timing 头并在响应结束后写日志"""
+    from flask import g, request
+
+    @app.before_request
+    def _begin_timing():
+        g.timing_token = begin()
+        g.timer = current()
+
+    @app.after_request
+    def _add_server_timing(response):
+        timer = g.get("timer")
+        if timer is None:
+            return response
+
+        response.headers['Server-Timing'] = timer.server_timing()
+        method, path, status = request.method, request.path, response.status_code
+        # 流式导出在响应发送完毕后才结束，日志放到关闭时输出
+        response.call_on_close(lambda: log_request(timer, method, path, status))
+        return response
+
+    @app.teardown_request
+    def _end_timing(exc):
+        token = g.pop("timing_token", None)
+        if token is not None:
+            end(token)
+
+
+class TimedHandlerMixin:
+    """
+    BaseHTTPRequestHandler 格式的 serverless 函数使用的计时
+    发送响应头前加入 Server-Timing，请求处理完后写日志
+    """
+
+    def handle_one_request(self):
+        token = begin()
+        self._timer = current()
+        self._timing_status = None
+        try:
+            super().handle_one_request()
+        finally:
+            end(token)
+            if self._timing_status is not None:
+                log_request(self._timer, self.command, self.path.split('?', 1)[0], self._timing_status)
+
+    def send_response(self, code, message=None):
+        self._timing_status = code
+        super().send_response(code, message)
+
+    def end_headers(self):
+        timer = getattr(self, "_timer", None)
+        if timer is not None:
+            self.send_header('Server-Timing', timer.server_timing())
+        super().end_headers()
@@ -0,0 +1,404 @@
+"""
+定时监控视频评论
+监控列表、已抓到的评论与每次刷新的结果保存在 SQLite（WATCH_DB，默认 watch.db）:
+  videos     监控列表：刷新间隔、下次刷新时间、上游报告的评论总数、评论增速
+  refreshes  每次刷新的结果：方式、页数、新增条数、错误
+  comments   已保存的评论（同一视频内 cid 唯一），记录首次出现时的刷新 ID，按刷新 ID 读取增量
+
+每次刷新只保存新评论：已保存的 cid 作为去重的已知集合。上游游标是评论列表中的偏移量，
+先从上次列表末尾附近续抓（按时间排序时新评论都在末尾），新增条数达到上游总数的增量即结束，
+否则再从头补扫；每 WATCH_FULL_EVERY 次刷新从头完整抓取一次，补上增量估计漏掉的评论
+
+刷新间隔按评论增速（条/小时，指数平滑）调整，使每次刷新平均带回 WATCH_TARGET_NEW 条新评论，
+限制在 WATCH_MIN_INTERVAL ~ WATCH_MAX_INTERVAL 秒之间并加随机抖动，避免大量视频同时到期；
+所有刷新共享一个令牌桶，上游请求不超过 WATCH_RATE 页/秒
+"""
+
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Iterator, List, Optional, TextIO
+
+from services.dedup import CidSet, cid_key
+from services.tikhub import VideoCrawl, format_comment
+
+DEFAULT_DB = os.environ.get('WATCH_DB', 'watch.db')
+RATE = float(os.environ.get('WATCH_RATE', 2.0))
+MIN_INTERVAL = float(os.environ.get('WATCH_MIN_INTERVAL', 900))
+MAX_INTERVAL = float(os.environ.get('WATCH_MAX_INTERVAL', 86400))
+TARGET_NEW = int(os.environ.get('WATCH_TARGET_NEW', 200))
+FULL_EVERY = int(os.environ.get('WATCH_FULL_EVERY', 24))
+
+# 续抓时从已保存条数往前回退的条数，容忍列表中少量评论被删除或位置变化
+TAIL_OVERLAP = 50
+# 增速的指数平滑系数（本次观测的权重）
+SMOOTHING = 0.5
+# 下次刷新时间的随机抖动比例
+JITTER = 0.1
+# 调度循环检查到期视频的最长间隔（秒）
+POLL_SECONDS = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    aweme_id TEXT PRIMARY KEY,
+    added_at REAL NOT NULL,
+    next_run REAL NOT NULL,
+    interval REAL NOT NULL,
+    last_run REAL,
+    total INTEGER,
+    comments INTEGER NOT NULL DEFAULT 0,
+    rate REAL,
+    refreshes INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS videos_next_run ON videos (next_run);
+CREATE TABLE IF NOT EXISTS refreshes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    aweme_id TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL NOT NULL,
+    mode TEXT NOT NULL,
+    pages INTEGER NOT NULL,
+    new_comments INTEGER NOT NULL,
+    total INTEGER,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS comments (
+    aweme_id TEXT NOT NULL,
+    cid TEXT NOT NULL,
+    refresh_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (aweme_id, cid)
+);
+CREATE INDEX IF NOT EXISTS comments_refresh ON comments (refresh_id);
+"""
+
+
+class RateLimiter:
+    """线程安全的令牌桶：每秒补充 rate 个，容量为 rate（至少 1）"""
+
+    def __init__(self, rate: float):
+        if rate <= 0:
+            raise ValueError("请求速率必须大于 0")
+        self.rate = rate
+        self.capacity = max(rate, 1.0)
+        self.tokens = self.capacity
+        self.refilled_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop: Optional[threading.Event] = None) -> bool:
+        """取一个令牌，不足时等待；stop 被设置时放弃并返回 False"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.refilled_at) * self.rate)
+                self.refilled_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                delay = (1 - self.tokens) / self.rate
+            if stop is None:
+                time.sleep(delay)
+            elif stop.wait(delay):
+                return False
+
+
+def next_interval(rate: Optional[float], previous: float) -> float:
+    """按评论增速（条/小时）计算刷新间隔（秒）；没有新增时间隔翻倍"""
+    if not rate:
+        return min(previous * 2, MAX_INTERVAL)
+    return min(max(TARGET_NEW / rate * 3600, MIN_INTERVAL), MAX_INTERVAL)
+
+
+class WatchStore:
+    """监控数据库；连接在线程间共享，读写都在锁内进行"""
+
+    def __init__(self, path: str = DEFAULT_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            # WAL 模式下调度进程写入时，其他进程仍可读取列表与增量
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def add(self, aweme_ids: List[str]) -> int:
+        """加入监控列表（已存在的忽略），返回新加入的个数；新视频立即到期"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO videos (aweme_id, added_at, next_run, interval) VALUES (?, ?, ?, ?)",
+                [(aweme_id, now, now, MIN_INTERVAL) for aweme_id in aweme_ids])
+            return cursor.rowcount
+
+    def remove(self, aweme_ids: List[str], purge: bool = False) -> int:
+        """移出监控列表，purge 时同时删除已保存的评论与刷新记录"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            cursor = self._conn.executemany("DELETE FROM videos WHERE aweme_id = ?", [(a,) for a in aweme_ids])
+            removed = cursor.rowcount
+            if purge:
+                for table in ("comments", "refreshes"):
+                    self._conn.executemany(f"DELETE FROM {table} WHERE aweme_id = ?", [(a,) for a in aweme_ids])
+            self._conn.execute("COMMIT")
+            return removed
+
+    def videos(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM videos ORDER BY next_run").fetchall()
+        return [dict(row) for row in rows]
+
+    def due(self, now: float, limit: Optional[int] = None, exclude=()) -> List[Dict[str, Any]]:
+        """已到期的视频，按到期时间排序"""
+        exclude = set(exclude)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM videos WHERE next_run <= ? ORDER BY next_run LIMIT ?",
+                (now, -1 if limit is None else limit + len(exclude))).fetchall()
+        videos = [dict(row) for row in rows if row["aweme_id"] not in exclude]
+        return videos if limit is None else videos[:limit]
+
+    def next_due(self) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(next_run) FROM videos").fetchone()
+        return row[0]
+
+    def known_keys(self, aweme_id: str) -> CidSet:
+        """视频已保存评论的 cid 集合"""
+        with self._lock:
+            rows = self._conn.execute("SELECT cid FROM comments WHERE aweme_id = ?", (aweme_id,)).fetchall()
+        known = CidSet(len(rows))
+        for (cid,) in rows:
+            key = cid_key(cid)
+            if key is not None:
+                known.add(key)
+        return known
+
+    def record_refresh(self, video: Dict[str, Any], refresh: Dict[str, Any],
+                       comments: List[Dict[str, Any]], state: Dict[str, Any]) -> int:
+        """在一个事务中保存刷新结果、新评论与视频的调度状态，返回刷新 ID"""
+        aweme_id = video["aweme_id"]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                refresh_id = self._conn.execute(
+                    "INSERT INTO refreshes (aweme_id, started_at, finished_at, mode, pages, new_comments, total, error) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (aweme_id, refresh["started_at"], refresh["finished_at"], refresh["mode"], refresh["pages"],
+                     len(comments), refresh["total"], refresh["error"])).lastrowid
+                inserted = self._conn.executemany(
+                    "INSERT OR IGNORE INTO comments (aweme_id, cid, refresh_id, data) VALUES (?, ?, ?, ?)",
+                    [(aweme_id, str(c["id"]), refresh_id, json.dumps(c, ensure_ascii=False))
+                     for c in comments]).rowcount
+                self._conn.execute(
+                    "UPDATE videos SET next_run = ?, interval = ?, last_run = ?, total = ?, rate = ?, "
+                    "comments = comments + ?, refreshes = refreshes + 1, last_error = ? WHERE aweme_id = ?",
+                    (state["next_run"], state["interval"], state["last_run"], state["total"], state["rate"],
+                     max(inserted, 0), refresh["error"], aweme_id))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return refresh_id
+
+    def deltas(self, aweme_ids: Optional[List[str]] = None, after: int = 0) -> Iterator[Dict[str, Any]]:
+        """刷新 ID 大于 after 的评论（按刷新顺序），附带 video_id 与 refresh_id"""
+        sql = "SELECT aweme_id, refresh_id, data FROM comments WHERE refresh_id > ?"
+        params: List[Any] = [after]
+        if aweme_ids:
+            sql += f" AND aweme_id IN ({','.join('?' * len(aweme_ids))})"
+            params += aweme_ids
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY refresh_id", params).fetchall()
+        for aweme_id, refresh_id, data in rows:
+            yield dict(json.loads(data), video_id=aweme_id, refresh_id=refresh_id)
+
+
+def _recent_rate(comments: List[Dict[str, Any]], now: float) -> float:
+    """首次抓取时按最近 24 小时内发布的评论数估计增速（条/小时）"""
+    recent = sum(1 for c in comments if isinstance(c.get("create_time"), (int, float))
+                 and c["create_time"] >= now - 86400)
+    return recent / 24
+
+
+def failure_interval(video: Dict[str, Any]) -> float:
+    """刷新失败后的重试间隔：上次也失败时翻倍，否则为最短间隔"""
+    if video["last_error"]:
+        return min(max(video["interval"] * 2, MIN_INTERVAL), MAX_INTERVAL)
+    return MIN_INTERVAL
+
+
+def record_failure(store: WatchStore, video: Dict[str, Any], started: float, error: str) -> Dict[str, Any]:
+    """刷新中途抛出异常：记录失败并推迟下次刷新，避免到期后立即重试；返回本次刷新的摘要"""
+    finished = time.time()
+    interval = failure_interval(video)
+    refresh = {"started_at": started, "finished_at": finished, "mode": "failed", "pages": 0,
+               "total": None, "error": error}
+    state = {"next_run": finished + interval * random.uniform(1 - JITTER, 1 + JITTER), "interval": interval,
+             "last_run": video["last_run"], "total": video["total"], "rate": video["rate"]}
+    refresh_id = store.record_refresh(video, refresh, [], state)
+    return {"aweme_id": video["aweme_id"], "refresh_id": refresh_id, "mode": "failed", "pages": 0,
+            "new_comments": 0, "known": 0, "total": None, "interval": round(interval), "error": error,
+            "seconds": round(finished - started, 2)}
+
+
+def refresh_video(store: WatchStore, limiter: RateLimiter, video: Dict[str, Any],
+                  stop: Optional[threading.Event] = None) -> Optional[Dict[str, Any]]:
+    """
+    刷新一个视频并保存新评论，返回本次刷新的摘要；stop 被设置时中途放弃（不保存，下次重新刷新）
+    """
+    aweme_id = video["aweme_id"]
+    started = time.time()
+    crawl = VideoCrawl(aweme_id, known=store.known_keys(aweme_id))
+    previous_total = video["total"]
+    full = video["refreshes"] == 0 or previous_total is None or (video["refreshes"] + 1) % FULL_EVERY == 0
+
+    def caught_up() -> bool:
+        # 新增条数达到上游总数的增量（总数减少或不变时第一页即结束）
+        return crawl.total is not None and len(crawl.comments) >= crawl.total - previous_total
+
+    def crawl_until(early_stop: bool) -> bool:
+        while not crawl.done:
+            if not limiter.acquire(stop):
+                return False
+            crawl.step()
+            if early_stop and crawl.error is None and caught_up():
+                break
+        return True
+
+    if full:
+        mode = "full"
+        if not crawl_until(early_stop=False):
+            return None
+    else:
+        mode = "tail"
+        start = crawl.cursor = max(video["comments"] - TAIL_OVERLAP, 0)
+        if not crawl_until(early_stop=True):
+            return None
+        if crawl.error is None and not caught_up() and start > 0:
+            # 末尾没有找齐新评论（评论不按时间排序或有删除），从头补扫
+            mode = "tail+head"
+            crawl.cursor, crawl.has_more = 0, True
+            if not crawl_until(early_stop=True):
+                return None
+
+    finished = time.time()
+    comments = [format_comment(c) for c in crawl.comments]
+    error = None
+    if crawl.error is not None:
+        error = crawl.error.get("error", "未知错误")
+
+    rate = video["rate"]
+    if error is None:
+        if video["last_run"] is None:
+            rate = _recent_rate(comments, finished)
+        else:
+            observed = len(comments) / max((finished - video["last_run"]) / 3600, 1e-6)
+            rate = observed if rate is None else SMOOTHING * observed + (1 - SMOOTHING) * rate
+        interval = next_interval(rate, video["interval"])
+        total = crawl.total if crawl.total is not None else previous_total
+    else:
+        # 失败时退避重试，上游总数保持上次成功时的值
+        interval = failure_interval(video)
+        total = previous_total
+
+    refresh = {"started_at": started, "finished_at": finished, "mode": mode, "pages": crawl.pages,
+               "total": crawl.total, "error": error}
+    state = {"next_run": finished + interval * random.uniform(1 - JITTER, 1 + JITTER), "interval": interval,
+             "last_run": finished if error is None else video["last_run"], "total": total, "rate": rate}
+    refresh_id = store.record_refresh(video, refresh, comments, state)
+    return {"aweme_id": aweme_id, "refresh_id": refresh_id, "mode": mode, "pages": crawl.pages,
+            "new_comments": len(comments), "known": crawl.dedup.known, "total": crawl.total,
+            "interval": round(interval), "error": error, "seconds": round(finished - started, 2)}
+
+
+class Watcher:
+    """
+    调度循环：到期的视频交给线程池刷新（同时刷新不超过 concurrency 个），
+    所有刷新的翻页请求共享 rate 页/秒 的令牌桶
+    """
+
+    def __init__(self, store: WatchStore, rate: float = RATE, concurrency: int = 4, log: TextIO = sys.stderr):
+        self.store = store
+        self.limiter = RateLimiter(rate)
+        self.concurrency = max(concurrency, 1)
+        self.log = log
+        self.stop = threading.Event()
+
+    def _refresh(self, video: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        started = time.time()
+        try:
+            return refresh_video(self.store, self.limiter, video, self.stop)
+        except Exception as e:
+            error = f"处理失败: {str(e)}"
+        try:
+            return record_failure(self.store, video, started, error)
+        except Exception as e:
+            # 数据库也不可用时只报告，视频的下次刷新时间不变
+            return {"aweme_id": video["aweme_id"], "error": f"{error}；记录失败: {str(e)}"}
+
+    def _report(self, summary: Optional[Dict[str, Any]]) -> None:
+        if summary is None:
+            return
+        if summary.get("refresh_id") is None:
+            print(f"{summary['aweme_id']} 失败: {summary['error']}", file=self.log)
+            return
+        line = (f"{summary['aweme_id']} [{summary['mode']}] 新增 {summary['new_comments']} 条，"
+                f"{summary['pages']} 页，{summary['seconds']}s，下次间隔 {summary['interval']}s")
+        if summary["error"]:
+            line += f"，错误: {summary['error']}"
+        print(line, file=self.log)
+
+    def run(self, once: bool = False) -> Dict[str, int]:
+        """
+        持续刷新到期的视频，直到 stop 被设置；once 时只刷新当前已到期的视频后返回
+        """
+        counts = {"refreshes": 0, "new_comments": 0, "failed": 0}
+        backlog = self.store.due(time.time()) if once else None
+        in_flight: Dict[Any, str] = {}
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            while not self.stop.is_set():
+                free = self.concurrency - len(in_flight)
+                if free > 0:
+                    if backlog is not None:
+                        batch, backlog = backlog[:free], backlog[free:]
+                    else:
+                        batch = self.store.due(time.time(), free, exclude=in_flight.values())
+                    for video in batch:
+                        in_flight[executor.submit(self._refresh, video)] = video["aweme_id"]
+
+                if not in_flight:
+                    if once:
+                        break
+                    next_due = self.store.next_due()
+                    delay = POLL_SECONDS if next_due is None else min(max(next_due - time.time(), 0.05), POLL_SECONDS)
+                    self.stop.wait(delay)
+                    continue
+
+                completed, _ = wait(in_flight, timeout=POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    del in_flight[future]
+                    summary = future.result()
+                    self._report(summary)
+                    if summary is None:
+                        continue
+                    counts["refreshes"] += 1
+                    counts["new_comments"] += summary.get("new_comments", 0)
+                    counts["failed"] += summary.get("error") is not None
+        finally:
+            # 正在进行的刷新在下一个令牌处放弃，不保存不完整的结果
+            self.stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+        return counts
@@ -0,0 +1,362 @@
+"""
+多进程 / 多主机抓取队列
+批次中的每个视频是队列中的一个任务，保存在 SQLite 文件中（CRAWL_QUEUE_DB），任意数量的工作进程（worker.py）
+从中领取任务并把结果写入共享的结果目录（与 Web 服务的 RESULT_STORE_DIR 相同），吞吐随工作进程数增加
+
+租约与心跳:
+  领取任务时写入租约（持有者与到期时间），工作进程每 LEASE_SECONDS / 3 秒续期一次；
+  进程崩溃或失联后租约到期，任务被其他工作进程重新领取。续期时发现租约已被他人领取则放弃该任务，
+  完成、失败的写入也只对仍持有租约的进程生效，同一任务不会被两次记为完成
+  抓取失败的任务重新排队，累计领取 MAX_ATTEMPTS 次后记为失败
+
+队列文件使用回滚日志（不用 WAL），多台主机可以通过支持文件锁的共享文件系统访问同一个队列文件
+"""
+
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional, TextIO
+
+from services.result_store import ResultStore
+from services.tikhub import VideoCrawl, extract_video_id, video_error, video_result
+
+DEFAULT_DB = os.environ.get('CRAWL_QUEUE_DB', 'queue.db')
+LEASE_SECONDS = float(os.environ.get('CRAWL_LEASE_SECONDS', 60))
+MAX_ATTEMPTS = int(os.environ.get('CRAWL_MAX_ATTEMPTS', 3))
+
+# 队列为空时工作进程再次领取前等待的秒数
+IDLE_SECONDS = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    job_id TEXT
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    video_id TEXT,
+    max_comments INTEGER,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    lease_expires REAL,
+    enqueued_at REAL NOT NULL,
+    finished_at REAL,
+    comments INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_expires);
+CREATE INDEX IF NOT EXISTS tasks_batch ON tasks (batch_id, position);
+"""
+
+STATUSES = ("queued", "leased", "done", "failed")
+
+
+class CrawlQueue:
+    """SQLite 任务队列；每个线程使用自己的连接，领取任务在写事务中完成，多个进程之间互斥"""
+
+    def __init__(self, path: str = DEFAULT_DB, lease_seconds: float = LEASE_SECONDS,
+                 max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._conn())
+
+    def submit(self, urls: List[str], max_comments: Optional[int] = None) -> str:
+        """加入一个批次，返回批次 ID；无法提取视频 ID 的 URL 直接记为失败"""
+        batch_id = uuid.uuid4().hex
+        now = time.time()
+        rows = []
+        for position, url in enumerate(urls):
+            video_id = url if url.isdigit() else extract_video_id(url)
+            if video_id is None:
+                rows.append((batch_id, position, url, None, max_comments, "failed", now, now,
+                             "无法从 URL 中提取视频 ID"))
+            else:
+                rows.append((batch_id, position, url, video_id, max_comments, "queued", now, None, None))
+
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO batches (id, created_at) VALUES (?, ?)", (batch_id, now))
+            conn.executemany(
+                "INSERT INTO tasks (batch_id, position, url, video_id, max_comments, status, enqueued_at, "
+                "finished_at, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return batch_id
+
+    def lease(self, owner: str) -> Optional[Dict[str, Any]]:
+        """
+        领取最早排队的任务（包括租约已过期的任务），队列为空时返回 None
+        租约到期时已领取 max_attempts 次的任务（多半每次都使工作进程崩溃）记为失败，不再领取
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = 'failed', finished_at = ?, lease_expires = NULL, "
+                "error = COALESCE(error, '租约多次到期未完成') "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts))
+            row = conn.execute(
+                "SELECT * FROM tasks WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                row = conn.execute(
+                    "SELECT * FROM tasks WHERE status = 'leased' AND lease_expires < ? "
+                    "ORDER BY lease_expires LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE id = ?", (owner, now + self.lease_seconds, row["id"]))
+        task = dict(row)
+        task.update(owner=owner, attempts=task["attempts"] + 1)
+        return task
+
+    def heartbeat(self, task_id: int, owner: str) -> bool:
+        """续期租约；租约已被他人领取时返回 False"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_expires = ? WHERE id = ? AND owner = ? AND status = 'leased'",
+                (time.time() + self.lease_seconds, task_id, owner))
+        return cursor.rowcount == 1
+
+    def complete(self, task_id: int, owner: str, comments: int) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = 'done', finished_at = ?, comments = ?, error = NULL, lease_expires = NULL "
+                "WHERE id = ? AND owner = ? AND status = 'leased'", (time.time(), comments, task_id, owner))
+        return cursor.rowcount == 1
+
+    def fail(self, task_id: int, owner: str, error: str, retry: bool = True) -> bool:
+        """记录失败；未超过领取次数上限且 retry 时重新排队"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = CASE WHEN ? AND attempts < ? THEN 'queued' ELSE 'failed' END, "
+                "finished_at = ?, error = ?, lease_expires = NULL "
+                "WHERE id = ? AND owner = ? AND status = 'leased'",
+                (retry, self.max_attempts, time.time(), error, task_id, owner))
+        return cursor.rowcount == 1
+
+    def release(self, task_id: int, owner: str) -> None:
+        """工作进程退出时交还未完成的任务（不计入领取次数）"""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = 'queued', owner = NULL, lease_expires = NULL, attempts = attempts - 1 "
+                "WHERE id = ? AND owner = ? AND status = 'leased'", (task_id, owner))
+
+    def counts(self, batch_id: Optional[str] = None) -> Dict[str, int]:
+        """各状态的任务数"""
+        sql = "SELECT status, COUNT(*) FROM tasks"
+        params: List[Any] = []
+        if batch_id is not None:
+            sql += " WHERE batch_id = ?"
+            params.append(batch_id)
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(self._conn().execute(sql + " GROUP BY status", params).fetchall())
+        return counts
+
+    def batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """批次及其任务（按提交顺序），不存在时返回 None"""
+        conn = self._conn()
+        batch = conn.execute("SELECT * FROM batches WHERE id = ?", (batch_id,)).fetchone()
+        if batch is None:
+            return None
+        tasks = conn.execute(
+            "SELECT url, video_id, status, attempts, comments, error FROM tasks WHERE batch_id = ? "
+            "ORDER BY position", (batch_id,)).fetchall()
+        return {"batch_id": batch_id, "created_at": batch["created_at"], "job_id": batch["job_id"],
+                "tasks": [dict(task) for task in tasks]}
+
+    def set_job(self, batch_id: str, job_id: str) -> str:
+        """记录批次完成后生成的结果任务 ID；已有时返回已记录的 ID"""
+        with self._transaction() as conn:
+            conn.execute("UPDATE batches SET job_id = ? WHERE id = ? AND job_id IS NULL", (job_id, batch_id))
+            return conn.execute("SELECT job_id FROM batches WHERE id = ?", (batch_id,)).fetchone()[0]
+
+
+class _Transaction:
+    """写事务：BEGIN IMMEDIATE 立即取得写锁，多个进程同时领取时依次进行"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.conn.execute("COMMIT" if exc_type is None else "ROLLBACK")
+
+
+class Worker:
+    """
+    工作进程：threads 个线程各自循环领取任务、抓取并把结果写入结果目录，
+    一个心跳线程为所有持有的租约续期
+    """
+
+    def __init__(self, queue: CrawlQueue, results: str, threads: int = 4, log: TextIO = sys.stderr):
+        self.queue = queue
+        # 结果只写入目录，不在工作进程内存中保留
+        self.store = ResultStore(max_videos=0, directory=results)
+        self.threads = max(threads, 1)
+        self.log = log
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.stop = threading.Event()
+        self.counts = {"done": 0, "failed": 0, "lost": 0}
+        # 任务 ID -> 持有者；续期失败的任务记入 lost
+        self._held: Dict[int, str] = {}
+        self._lost: set = set()
+        self._lock = threading.Lock()
+        # 仍在运行的抓取线程数，全部结束时设置 _finished
+        self._running = 0
+        self._finished = threading.Event()
+
+    def _heartbeat(self) -> None:
+        while not self.stop.wait(self.queue.lease_seconds / 3):
+            with self._lock:
+                held = list(self._held.items())
+            for task_id, owner in held:
+                try:
+                    alive = self.queue.heartbeat(task_id, owner)
+                except sqlite3.Error:
+                    # 队列暂时不可用，下次再续期；租约在此期间到期会被他人领取
+                    continue
+                if not alive:
+                    with self._lock:
+                        self._lost.add(task_id)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counts[name] += 1
+
+    def _is_lost(self, task_id: int) -> bool:
+        with self._lock:
+            return task_id in self._lost
+
+    def _run_task(self, task: Dict[str, Any]) -> None:
+        task_id, owner = task["id"], task["owner"]
+        start = time.perf_counter()
+        crawl = VideoCrawl(task["video_id"], task["max_comments"])
+        try:
+            while not crawl.done:
+                if self.stop.is_set() or self._is_lost(task_id):
+                    break
+                crawl.step()
+        except Exception as e:
+            crawl.error = {"error": f"处理失败: {str(e)}"}
+
+        if self.stop.is_set() and not crawl.done:
+            self.queue.release(task_id, owner)
+            return
+        if self._is_lost(task_id):
+            self._count("lost")
+            print(f"{task['video_id']} 租约已失效，放弃", file=self.log)
+            return
+
+        result = crawl.result()
+        video = video_result(task["url"], task["video_id"], result) if result["success"] \
+            else video_error(task["url"], result.get("error", "获取评论失败"), task["video_id"])
+        seconds = time.perf_counter() - start
+        if not video["success"]:
+            self.queue.fail(task_id, owner, video["error"])
+            self._count("failed")
+            print(f"{task['video_id']} 失败（第 {task['attempts']} 次）: {video['error']}", file=self.log)
+            return
+
+        # 先写结果再标记完成：两步之间崩溃时任务会被重新抓取，结果文件被覆盖
+        self.store.save_video(video)
+        if self.queue.complete(task_id, owner, video["total_comments"]):
+            self._count("done")
+            print(f"{task['video_id']} {video['total_comments']} 条 ({seconds:.1f}s)", file=self.log)
+        else:
+            self._count("lost")
+
+    def _loop(self, index: int, drain: bool) -> None:
+        try:
+            self._lease_loop(f"{self.name}:{index}", drain)
+        finally:
+            with self._lock:
+                self._running -= 1
+                if self._running == 0:
+                    self._finished.set()
+
+    def _lease_loop(self, owner: str, drain: bool) -> None:
+        while not self.stop.is_set():
+            try:
+                task = self.queue.lease(owner)
+            except sqlite3.Error as e:
+                print(f"领取任务失败: {e}", file=self.log)
+                self.stop.wait(IDLE_SECONDS)
+                continue
+            if task is None:
+                if drain and not self._has_pending():
+                    return
+                self.stop.wait(IDLE_SECONDS)
+                continue
+
+            with self._lock:
+                self._held[task["id"]] = owner
+            try:
+                self._run_task(task)
+            except Exception as e:
+                # 写结果或更新队列失败（如数据库被锁、磁盘错误）：任务重新排队，本线程继续领取
+                self._count("failed")
+                print(f"{task['video_id']} 保存失败: {e}", file=self.log)
+                try:
+                    self.queue.fail(task["id"], owner, f"保存失败: {str(e)}")
+                except sqlite3.Error:
+                    # 队列仍不可用时不再处理，租约到期后任务由其他工作进程领取
+                    pass
+            finally:
+                with self._lock:
+                    self._held.pop(task["id"], None)
+                    self._lost.discard(task["id"])
+
+    def _has_pending(self) -> bool:
+        """还有排队或被他人持有的任务（其租约可能到期后由本进程接手）"""
+        counts = self.queue.counts()
+        return counts["queued"] + counts["leased"] > 0
+
+    def run(self, drain: bool = False) -> Dict[str, int]:
+        """
+        运行直到 stop 被设置；drain 时队列中没有未完成的任务后退出
+        """
+        heartbeat = threading.Thread(target=self._heartbeat, name="lease-heartbeat", daemon=True)
+        heartbeat.start()
+        self._running = self.threads
+        # 抓取线程不设为守护线程，主线程因中断退出时解释器仍会等它们交还任务
+        loops = [threading.Thread(target=self._loop, args=(i, drain), name=f"crawl-worker-{i}")
+                 for i in range(self.threads)]
+        try:
+            for thread in loops:
+                thread.start()
+            # 等待结束计数而不是 join / is_alive：二者被 KeyboardInterrupt 打断时可能把仍在运行的线程标记为已结束
+            while not self._finished.wait(0.5):
+                pass
+        finally:
+            # 中断时各线程在下一页之前停止并交还任务；启动前就被中断的线程不再等待
+            self.stop.set()
+            with self._lock:
+                self._running -= sum(1 for thread in loops if thread.ident is None)
+                if self._running == 0:
+                    self._finished.set()
+            while not self._finished.wait(0.5):
+                pass
+        return dict(self.counts)
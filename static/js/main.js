@@ -4,6 +4,25 @@
 
 let currentVideos = [];
 let processedVideos = [];
+let currentJobId = null;
+
+// 每页评论条数（首屏与滚动加载共用），也是评论列表按块渲染的单位
+const PAGE_SIZE = 50;
+
+// 复制评论时每次请求的条数（服务端单页上限）
+const COPY_PAGE_SIZE = 200;
+
+// 评论列表只渲染可见区域及上下各 OVERSCAN_PX 像素内的块
+const OVERSCAN_PX = 800;
+
+// 每个视频缓存的评论页数上限，超出时丢弃离可见区域最远的页
+const MAX_CACHED_PAGES = 20;
+
+// 评论条目高度的初始估计（像素），渲染后按实测平均值修正
+const ESTIMATED_ROW_HEIGHT = 96;
+
+// 当前结果中各视频的评论列表
+let commentWindows = [];
 
 // ========================================
 // DOM 元素
@@ -139,7 +158,7 @@ async function fetchBatchComments(urls) {
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify({ urls })
+            body: JSON.stringify({ urls, page_size: PAGE_SIZE })
         });
 
         const data = await response.json();
@@ -155,34 +174,113 @@ async function fetchBatchComments(urls) {
 }
 
 /**
- * 导出Excel文件
+ * 批量响应已携带全部评论时（服务端没有跨实例共享的结果缓存）直接在本地分页，否则返回 null
  */
-async function exportExcel() {
-    try {
-        const response = await fetch('/api/export/excel', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                videos: processedVideos
-            })
-        });
+function localCommentsPage(video, cursor, limit = PAGE_SIZE) {
+    if (video.has_more || !video.comments) {
+        return null;
+    }
+    const comments = video.comments.slice(cursor, cursor + limit);
+    return {
+        comments,
+        next_cursor: cursor + comments.length,
+        has_more: cursor + comments.length < video.comments.length
+    };
+}
 
-        if (!response.ok) {
-            throw new Error('导出Excel失败');
+/**
+ * 获取服务端缓存的一页评论
+ */
+async function fetchCommentsPage(videoId, cursor, limit = PAGE_SIZE, sort = 'default') {
+    const params = new URLSearchParams({ cursor, limit, sort });
+    const response = await fetch(`/api/videos/${encodeURIComponent(videoId)}/comments?${params}`);
+    const data = await response.json();
+
+    if (!response.ok) {
+        throw new Error(data.error || '获取评论分页失败');
+    }
+
+    return data;
+}
+
+/**
+ * 读取视频的全部评论（复制前使用），不进入评论列表的缓存
+ */
+async function fetchAllComments(video) {
+    if (localCommentsPage(video, 0)) {
+        return video.comments;
+    }
+
+    const comments = [];
+    let cursor = 0;
+    let hasMore = true;
+    while (hasMore) {
+        const page = await fetchCommentsPage(video.video_id, cursor, COPY_PAGE_SIZE);
+        comments.push(...page.comments);
+        cursor = page.next_cursor;
+        hasMore = page.has_more;
+    }
+    return comments;
+}
+
+/**
+ * 下载服务端生成的导出文件；传 body 时以 JSON 请求体 POST
+ */
+async function downloadExport(url, filename, body = null) {
+    const response = body === null ? await fetch(url) : await fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(body)
+    });
+
+    if (!response.ok) {
+        let message = '导出失败';
+        try {
+            message = (await response.json()).error || message;
+        } catch (e) {
+            // 非 JSON 错误响应
         }
+        const error = new Error(message);
+        error.status = response.status;
+        throw error;
+    }
 
-        const blob = await response.blob();
-        const downloadUrl = window.URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = downloadUrl;
-        a.download = `tiktok_comments_batch_${new Date().toISOString().slice(0, 19).replace(/[:\s]/g, '_')}.xlsx`;
-        document.body.appendChild(a);
-        a.click();
-        document.body.removeChild(a);
-        window.URL.revokeObjectURL(downloadUrl);
+    const blob = await response.blob();
+    const downloadUrl = window.URL.createObjectURL(blob);
+    const a = document.createElement('a');
+    a.href = downloadUrl;
+    a.download = filename;
+    document.body.appendChild(a);
+    a.click();
+    document.body.removeChild(a);
+    window.URL.revokeObjectURL(downloadUrl);
+}
 
+/**
+ * 导出Excel文件
+ * 服务端按任务 ID 直接从缓存生成，无需回传评论数据；
+ * 任务不在处理本请求的实例上（如 Vercel 未设置 RESULT_STORE_DIR）而返回 404 时，
+ * 若本地已有完整评论则回传 videos 导出
+ */
+async function exportExcel() {
+    if (!currentJobId) {
+        showToast('没有可导出的结果');
+        return;
+    }
+
+    const filename = `tiktok_comments_batch_${new Date().toISOString().slice(0, 19).replace(/[:\s]/g, '_')}.xlsx`;
+    try {
+        try {
+            await downloadExport(`/api/jobs/${encodeURIComponent(currentJobId)}/export/excel`, filename);
+        } catch (error) {
+            const complete = currentVideos.length > 0 && currentVideos.every(v => localCommentsPage(v, 0));
+            if (error.status !== 404 || !complete) {
+                throw error;
+            }
+            await downloadExport('/api/export/excel', filename, { videos: currentVideos });
+        }
         showToast('Excel文件已导出');
     } catch (error) {
         showToast('导出Excel失败: ' + error.message);
@@ -194,42 +292,293 @@ async function exportExcel() {
 // ========================================
 
 /**
- * 创建评论单元格
+ * 转义 HTML 特殊字符
  */
-function createCommentsCell(comments) {
-    const container = document.createElement('div');
-    container.className = 'comments-list';
-
-    if (!comments || comments.length === 0) {
-        container.innerHTML = '<div class="no-comments">暂无评论</div>';
-        return container;
-    }
+function escapeHtml(text) {
+    return String(text).replace(/[&<>"']/g, ch => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    })[ch]);
+}
 
-    comments.forEach(comment => {
-        const commentEl = document.createElement('div');
-        commentEl.className = 'comment-item';
+const DEFAULT_AVATAR = 'data:image/svg+xml,%3Csvg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="%236366f1"%3E%3Cpath d="M12 12c2.21 0 4-1.79 4-4s-1.79-4-4-4-4 1.79-4 4 1.79 4 4 4zm0 2c-2.67 0-8 1.34-8 4v2h16v-2c0-2.66-5.33-4-8-4z"/%3E%3C/svg%3E';
 
-        const avatar = comment.author?.avatar || 'data:image/svg+xml,%3Csvg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="%236366f1"%3E%3Cpath d="M12 12c2.21 0 4-1.79 4-4s-1.79-4-4-4-4 1.79-4 4 1.79 4 4 4zm0 2c-2.67 0-8 1.34-8 4v2h16v-2c0-2.66-5.33-4-8-4z"/%3E%3C/svg%3E';
+/**
+ * 一条评论的 HTML
+ */
+function commentItemHtml(comment) {
+    const avatar = comment.author?.avatar || DEFAULT_AVATAR;
+    const nickname = comment.author?.nickname || '未知用户';
 
-        commentEl.innerHTML = `
+    return `
+        <div class="comment-item">
             <div class="comment-header">
-                <img src="${avatar}" alt="${comment.author?.nickname || 'Unknown'}" class="comment-avatar"
-                     onerror="this.src='data:image/svg+xml,%3Csvg xmlns=%22http://www.w3.org/2000/svg%22 viewBox=%220 0 24 24%22 fill=%22%236366f1%22%3E%3Cpath d=%22M12 12c2.21 0 4-1.79 4-4s-1.79-4-4-4-4 1.79-4 4 1.79 4 4 4zm0 2c-2.67 0-8 1.34-8 4v2h16v-2c0-2.66-5.33-4-8-4z%22/%3E%3C/svg%3E'">
+                <img src="${escapeHtml(avatar)}" alt="${escapeHtml(comment.author?.nickname || 'Unknown')}" class="comment-avatar" loading="lazy"
+                     onerror="this.onerror=null;this.src='${DEFAULT_AVATAR.replace(/"/g, '%22')}'">
                 <div class="comment-author-info">
-                    <div class="comment-author">${comment.author?.nickname || '未知用户'}</div>
+                    <div class="comment-author">${escapeHtml(nickname)}</div>
                     <div class="comment-stats">
                         <span class="comment-likes">👍 ${formatNumber(comment.likes || 0)}</span>
                         ${comment.reply_count > 0 ? `<span class="comment-replies">💬 ${formatNumber(comment.reply_count)}</span>` : ''}
                     </div>
                 </div>
             </div>
-            <div class="comment-content">${comment.text || '(无文字内容)'}</div>
-        `;
+            <div class="comment-content">${comment.text ? escapeHtml(comment.text) : '(无文字内容)'}</div>
+        </div>
+    `;
+}
 
-        container.appendChild(commentEl);
-    });
+/**
+ * 虚拟滚动的评论列表
+ * 列表按服务端的页分块（每块 PAGE_SIZE 条），滚动区域按评论总数撑开，只渲染可见区域附近的块；
+ * 块滚入可见区域时才按偏移量请求对应的页，离开后节点被移除，缓存的页数也有上限，
+ * 因此 DOM 节点数与内存不随评论总数增长。块高度渲染后实测，未渲染的块按平均条目高度估计
+ */
+class CommentWindow {
+    constructor(video) {
+        this.video = video;
+        this.total = video.total_comments || 0;
+        this.blockCount = Math.ceil(this.total / PAGE_SIZE);
+        // 块序号 -> 评论数组 / 进行中的请求 / 加载失败信息 / 已渲染节点
+        this.pages = new Map();
+        this.requests = new Map();
+        this.errors = new Map();
+        this.nodes = new Map();
+        // 已实测的块高度（0 表示未测量）
+        this.heights = new Array(this.blockCount).fill(0);
+        this.measuredRows = 0;
+        this.measuredHeight = 0;
+        this.frame = null;
+        this.width = 0;
+
+        if (video.comments && video.comments.length > 0) {
+            this.pages.set(0, video.comments.slice(0, PAGE_SIZE));
+        }
 
-    return container;
+        this.element = document.createElement('div');
+        this.element.className = 'comments-list';
+        this.content = document.createElement('div');
+        this.content.className = 'comments-window';
+        this.element.appendChild(this.content);
+
+        if (this.blockCount === 0) {
+            this.element.innerHTML = '<div class="no-comments">暂无评论</div>';
+            return;
+        }
+
+        this.element.addEventListener('scroll', () => this.schedule(), { passive: true });
+        // 列宽变化后条目高度随之变化，重新测量
+        this.resizeObserver = new ResizeObserver(entries => {
+            const width = entries[0].contentRect.width;
+            if (width !== this.width) {
+                if (this.width) {
+                    this.heights.fill(0);
+                    this.measuredRows = 0;
+                    this.measuredHeight = 0;
+                    this.clear();
+                }
+                this.width = width;
+                this.schedule();
+            }
+        });
+        this.resizeObserver.observe(this.element);
+    }
+
+    blockRows(index) {
+        return Math.min(PAGE_SIZE, this.total - index * PAGE_SIZE);
+    }
+
+    blockHeight(index) {
+        if (this.heights[index]) {
+            return this.heights[index];
+        }
+        const rowHeight = this.measuredRows ? this.measuredHeight / this.measuredRows : ESTIMATED_ROW_HEIGHT;
+        return Math.round(this.blockRows(index) * rowHeight);
+    }
+
+    schedule() {
+        if (this.frame === null) {
+            this.frame = requestAnimationFrame(() => {
+                this.frame = null;
+                this.update();
+            });
+        }
+    }
+
+    clear() {
+        this.nodes.forEach(node => node.remove());
+        this.nodes.clear();
+    }
+
+    destroy() {
+        if (this.frame !== null) {
+            cancelAnimationFrame(this.frame);
+        }
+        this.resizeObserver?.disconnect();
+        this.clear();
+        this.pages.clear();
+    }
+
+    /**
+     * 按滚动位置渲染可见的块，移除离开可见区域的块
+     */
+    update() {
+        const scrollTop = this.element.scrollTop;
+        const top = scrollTop - OVERSCAN_PX;
+        const bottom = scrollTop + this.element.clientHeight + OVERSCAN_PX;
+
+        const visible = new Map();
+        let offset = 0;
+        for (let index = 0; index < this.blockCount; index++) {
+            const height = this.blockHeight(index);
+            if (offset + height >= top && offset <= bottom) {
+                visible.set(index, offset);
+            }
+            offset += height;
+        }
+        this.content.style.height = `${offset}px`;
+
+        this.nodes.forEach((node, index) => {
+            if (!visible.has(index)) {
+                node.remove();
+                this.nodes.delete(index);
+                // 离开后重新进入时重试失败的请求
+                this.errors.delete(index);
+            }
+        });
+
+        const measured = [];
+        visible.forEach((position, index) => {
+            let node = this.nodes.get(index);
+            if (!node) {
+                node = this.createBlock(index);
+                this.nodes.set(index, node);
+                this.content.appendChild(node);
+                if (this.pages.has(index)) {
+                    measured.push(index);
+                }
+            }
+            node.style.transform = `translateY(${position}px)`;
+        });
+
+        // 实测新渲染的块；可见区域上方的块高度变化时调整滚动位置，保持当前内容不跳动
+        let shift = 0;
+        let changed = false;
+        measured.forEach(index => {
+            const height = this.nodes.get(index).offsetHeight;
+            if (height === 0) {
+                // 列表未显示（如结果区域隐藏）时无法测量
+                return;
+            }
+            const previous = this.blockHeight(index);
+            if (!this.heights[index]) {
+                this.measuredRows += this.blockRows(index);
+                this.measuredHeight += height;
+            }
+            this.heights[index] = height;
+            if (height !== previous) {
+                changed = true;
+                if (visible.get(index) + previous <= scrollTop) {
+                    shift += height - previous;
+                }
+            }
+        });
+        if (shift) {
+            this.element.scrollTop = scrollTop + shift;
+        }
+        if (changed) {
+            this.schedule();
+        }
+
+        this.evict(visible);
+    }
+
+    /**
+     * 创建块节点；页尚未加载时显示占位并发起请求
+     */
+    createBlock(index) {
+        const node = document.createElement('div');
+        node.className = 'comments-block';
+
+        const comments = this.pages.get(index);
+        if (comments) {
+            node.innerHTML = comments.map(commentItemHtml).join('');
+            return node;
+        }
+
+        node.classList.add('loading');
+        node.style.height = `${this.blockHeight(index)}px`;
+        node.textContent = this.errors.get(index) || '加载评论中...';
+        if (!this.errors.has(index)) {
+            this.load(index);
+        }
+        return node;
+    }
+
+    /**
+     * 按偏移量请求一块评论，返回后替换占位节点
+     */
+    load(index) {
+        if (this.requests.has(index)) {
+            return;
+        }
+
+        const local = localCommentsPage(this.video, index * PAGE_SIZE);
+        const request = (local ? Promise.resolve(local) : fetchCommentsPage(this.video.video_id, index * PAGE_SIZE))
+            .then(page => {
+                this.pages.set(index, page.comments);
+            })
+            .catch(error => {
+                this.errors.set(index, error.message);
+            })
+            .finally(() => {
+                this.requests.delete(index);
+                const node = this.nodes.get(index);
+                if (node) {
+                    node.remove();
+                    this.nodes.delete(index);
+                }
+                this.schedule();
+            });
+        this.requests.set(index, request);
+    }
+
+    /**
+     * 缓存超出上限时丢弃离可见区域最远的页
+     */
+    evict(visible) {
+        if (this.pages.size <= MAX_CACHED_PAGES) {
+            return;
+        }
+
+        const anchors = [...visible.keys()];
+        const first = anchors.length ? Math.min(...anchors) : 0;
+        const last = anchors.length ? Math.max(...anchors) : 0;
+        const distance = index => (index < first ? first - index : Math.max(index - last, 0));
+        const candidates = [...this.pages.keys()]
+            .filter(index => !visible.has(index))
+            .sort((a, b) => distance(b) - distance(a));
+
+        for (const index of candidates.slice(0, this.pages.size - MAX_CACHED_PAGES)) {
+            this.pages.delete(index);
+        }
+    }
+}
+
+/**
+ * 创建评论单元格
+ */
+function createCommentsCell(video) {
+    const commentWindow = new CommentWindow(video);
+    commentWindows.push(commentWindow);
+    return commentWindow.element;
+}
+
+/**
+ * 移除当前结果的评论列表
+ */
+function destroyCommentWindows() {
+    commentWindows.forEach(commentWindow => commentWindow.destroy());
+    commentWindows = [];
 }
 
 /**
@@ -271,6 +620,7 @@ function renderTable(videos) {
     const tbody = elements.videosTable.querySelector('tbody');
 
     // 清空现有内容
+    destroyCommentWindows();
     thead.innerHTML = '<th>视频信息</th>';
     tbody.innerHTML = '';
 
@@ -326,7 +676,7 @@ function renderTable(videos) {
                     td.innerHTML = `<div class="comment-count"><span class="count-number">${formatNumber(video.total_comments)}</span><span class="count-unit">条</span></div>`;
                     break;
                 case 'comments-row':
-                    td.appendChild(createCommentsCell(video.comments));
+                    td.appendChild(createCommentsCell(video));
                     break;
             }
 
@@ -343,6 +693,7 @@ function renderTable(videos) {
 function displayResults(data) {
     currentVideos = data.videos || [];
     processedVideos = currentVideos.filter(v => v.success);
+    currentJobId = data.job_id || null;
 
     // 更新统计信息
     elements.totalVideos.textContent = data.total_videos || 0;
@@ -369,20 +720,35 @@ function displayResults(data) {
  * 导出单个视频的Excel
  */
 async function exportSingleVideo(video) {
-    // 这里可以实现单个视频的Excel导出
-    showToast('单个视频导出功能开发中...');
+    try {
+        await downloadExport(
+            `/api/videos/${encodeURIComponent(video.video_id)}/export/excel`,
+            `tiktok_comments_${video.video_id}.xlsx`
+        );
+        showToast('Excel文件已导出');
+    } catch (error) {
+        showToast('导出Excel失败: ' + error.message);
+    }
 }
 
 /**
  * 复制视频评论
  */
 async function copyVideoComments(video) {
-    if (!video.comments || video.comments.length === 0) {
+    let comments;
+    try {
+        comments = video.total_comments > 0 ? await fetchAllComments(video) : [];
+    } catch (error) {
+        showToast('加载评论失败: ' + error.message);
+        return;
+    }
+
+    if (comments.length === 0) {
         showToast('没有可复制的评论');
         return;
     }
 
-    const text = video.comments.map(comment => {
+    const text = comments.map(comment => {
         const author = comment.author?.nickname || '未知用户';
         const content = comment.text || '';
         const likes = comment.likes || 0;
@@ -469,8 +835,10 @@ function handleRetry() {
  * 清空结果
  */
 function handleClearResults() {
+    destroyCommentWindows();
     currentVideos = [];
     processedVideos = [];
+    currentJobId = null;
     elements.videosTable.innerHTML = `
         <thead>
             <tr>
@@ -0,0 +1,24 @@
+"""
+测试公共夹具：本地模拟 TikHub 服务（benchmarks/mock_tikhub.py），抓取请求不访问外网
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mock_tikhub import MockConfig, start_mock_server  # noqa: E402
+from services import tikhub  # noqa: E402
+
+
+@pytest.fixture
+def mock_tikhub(monkeypatch):
+    """启动模拟服务并把上游地址指向它，返回 (config, stats)；测试中可直接修改 config"""
+    config = MockConfig(comments=120)
+    server, stats, base_url = start_mock_server(config)
+    monkeypatch.setattr(tikhub, "BASE_URL", base_url)
+    yield config, stats
+    server.shutdown()
+    server.server_close()
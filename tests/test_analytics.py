@@ -0,0 +1,86 @@
+"""文本分析：计数、进程池与进程内结果一致、进程池不可用时回退"""
+
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from services import analytics
+from services.analytics import MIN_PARALLEL, TextAnalyzer, analyze_texts
+
+TEXTS = ["great video 😂😂 @Alice #Dance", "好看的视频 好看", "great great @alice", "#dance 🔥", ""]
+
+
+def make_videos(count):
+    comments = [{"text": TEXTS[i % len(TEXTS)]} for i in range(count)]
+    return [{"comments": comments}, {"comments": comments[:7]}, {"comments": []}]
+
+
+def test_analyze_texts_counts():
+    counts = analyze_texts(TEXTS)
+    assert counts["comments"] == 5
+    assert counts["emoji_comments"] == 2
+    assert counts["emoji"]["😂"] == 2
+    assert counts["keywords"]["great"] == 3
+    assert counts["mentions"] == {"alice": 2}
+    assert counts["hashtags"] == {"dance": 2}
+    assert counts["languages"]["zh"] == 1
+
+
+def test_process_pool_matches_inline():
+    videos = make_videos(MIN_PARALLEL + 500)
+    analyzer = TextAnalyzer("process", workers=2)
+    try:
+        pooled = analyzer.analyze(videos)
+        assert analyzer._pool is not None
+    finally:
+        if analyzer._pool is not None:
+            analyzer._pool.shutdown()
+
+    inline = TextAnalyzer("inline").analyze(videos)
+    assert pooled == inline
+    assert pooled[0]["comments"] == MIN_PARALLEL + 500
+    assert pooled[2]["comments"] == 0 and pooled[2]["emoji_ratio"] == 0.0
+
+
+class BrokenPool:
+    """工作进程已异常退出的进程池"""
+
+    def __init__(self):
+        self.shut_down = False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool("worker died"))
+        return future
+
+    def shutdown(self, wait=True):
+        self.shut_down = True
+
+
+def test_broken_pool_falls_back_inline():
+    videos = make_videos(MIN_PARALLEL)
+    analyzer = TextAnalyzer("process")
+    broken = analyzer._pool = BrokenPool()
+
+    assert analyzer.analyze(videos) == TextAnalyzer("inline").analyze(videos)
+    # 丢弃坏掉的进程池，下次重建
+    assert broken.shut_down and analyzer._pool is None
+    assert analyzer.mode == "process"
+
+
+def test_pool_creation_failure_switches_to_inline(monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise OSError("no semaphores")
+
+    monkeypatch.setattr(analytics, "ProcessPoolExecutor", unavailable)
+    analyzer = TextAnalyzer("process")
+    videos = make_videos(MIN_PARALLEL)
+    assert analyzer.analyze(videos) == TextAnalyzer("inline").analyze(videos)
+    assert analyzer.mode == "inline"
+
+
+def test_off_and_invalid_modes():
+    assert TextAnalyzer("off").analyze(make_videos(3)) == [None, None, None]
+    with pytest.raises(ValueError):
+        TextAnalyzer("threads")
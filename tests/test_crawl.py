@@ -0,0 +1,95 @@
+"""批量抓取命令行：断点续抓不重复、不丢失评论，失败的视频重试，Parquet 分片清理"""
+
+import io
+import json
+import os
+
+import pytest
+
+import crawl
+from services.tikhub import read_urls
+
+IDS = [f"71000000000000000{i:02d}" for i in range(4)]
+
+
+def entries(ids):
+    return read_urls(io.StringIO("\n".join(f"https://www.tiktok.com/@user/video/{i}" for i in ids)))
+
+
+def run(output, ids, format="ndjson"):
+    return crawl.run(entries(ids), str(output), format, concurrency=2, log=io.StringIO())
+
+
+def comment_ids(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["id"] for line in f]
+
+
+def test_resume_after_interrupted_run(mock_tikhub, tmp_path):
+    config, _ = mock_tikhub
+    config.sizes = {IDS[1]: 30}
+    first = run(tmp_path, IDS[:2])
+    assert first["done"] == 2 and first["comments"] == 150
+
+    # 模拟中断：数据文件多出写了一半的视频，进度日志最后一行不完整
+    data = tmp_path / crawl.DATA_FILES["ndjson"]
+    with open(data, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "half-written", "video_id": IDS[2]}) + "\n{\"id\": \"tru")
+    with open(tmp_path / crawl.PROGRESS_FILE, "a", encoding="utf-8") as f:
+        f.write('{"video_id": "' + IDS[2])
+
+    second = run(tmp_path, IDS)
+    assert second["skipped"] == 2 and second["done"] == 2 and second["comments"] == 240
+
+    ids = comment_ids(data)
+    assert len(ids) == len(set(ids)) == 120 + 30 + 120 + 120
+    assert "half-written" not in ids
+
+
+def test_failed_videos_are_retried(mock_tikhub, tmp_path, monkeypatch):
+    fetch = crawl.fetch_all_comments
+
+    def flaky(video_id, **kwargs):
+        if video_id == IDS[0]:
+            raise ConnectionError("boom")
+        return fetch(video_id, **kwargs)
+
+    monkeypatch.setattr(crawl, "fetch_all_comments", flaky)
+    first = run(tmp_path, IDS[:2], format="csv")
+    assert first["failed"] == 1 and first["done"] == 1
+
+    monkeypatch.setattr(crawl, "fetch_all_comments", fetch)
+    second = run(tmp_path, IDS[:2], format="csv")
+    assert second["skipped"] == 1 and second["done"] == 1
+
+    with open(tmp_path / crawl.DATA_FILES["csv"], "r", encoding="utf-8-sig") as f:
+        lines = f.read().splitlines()
+    assert lines[0].startswith("Video ID")
+    assert len(lines) == 1 + 240
+
+
+def test_format_must_match_previous_run(mock_tikhub, tmp_path):
+    run(tmp_path, IDS[:1])
+    with pytest.raises(RuntimeError):
+        run(tmp_path, IDS[:1], format="csv")
+
+
+def test_parquet_cleanup_ignores_foreign_files(tmp_path):
+    pytest.importorskip("pyarrow")
+    for name in ("part-00001.parquet", "part-00002.parquet", "part-00002.parquet.tmp", "part-old.parquet"):
+        (tmp_path / name).write_bytes(b"")
+
+    crawl.ParquetWriter(str(tmp_path), parts=1)
+    assert sorted(os.listdir(tmp_path)) == ["part-00001.parquet", "part-old.parquet"]
+
+
+def test_parquet_resume(mock_tikhub, tmp_path, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(crawl, "PART_ROWS", 200)
+    run(tmp_path, IDS[:2], format="parquet")
+    summary = run(tmp_path, IDS, format="parquet")
+    assert summary["skipped"] == 2 and summary["done"] == 2
+
+    table = pq.read_table(str(tmp_path / crawl.PARTS_DIR))
+    ids = table.column("comment_id").to_pylist()
+    assert len(ids) == len(set(ids)) == 4 * 120
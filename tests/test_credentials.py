@@ -0,0 +1,69 @@
+"""API Key 池：轮询、429 / 401 隔离与隔离到期后恢复"""
+
+import time
+
+from services import tikhub
+from services.credentials import KeyPool
+from services.tikhub import PageSizer, fetch_all_comments
+
+
+def test_round_robin_rotates_keys():
+    pool = KeyPool(["a", "b", "c"], strategy="round_robin")
+    picked = []
+    for _ in range(4):
+        key = pool.acquire()
+        picked.append(key.secret)
+        pool.release(key, "200")
+    assert picked == ["a", "b", "c", "a"]
+
+
+def test_429_quarantines_key_and_others_serve():
+    pool = KeyPool(["a", "b"])
+    key = pool.acquire()
+    pool.release(key, "429", retry_after=30)
+
+    states = {state["key"]: state for state in pool.snapshot()}
+    assert states[key.label]["quarantined_seconds"] > 0
+    for _ in range(3):
+        other = pool.acquire()
+        assert other.secret != key.secret
+        pool.release(other, "200")
+
+
+def test_single_key_recovers_after_quarantine():
+    pool = KeyPool(["only"])
+    key = pool.acquire()
+    pool.release(key, "429", retry_after=0.2)
+
+    started = time.monotonic()
+    again = pool.acquire()
+    assert again is key
+    assert 0.15 <= time.monotonic() - started < 1
+
+
+def test_long_quarantine_returns_none_without_waiting():
+    pool = KeyPool(["only"])
+    pool.release(pool.acquire(), "401")
+
+    started = time.monotonic()
+    assert pool.acquire() is None
+    assert time.monotonic() - started < 0.1
+
+
+def test_quota_exhausted():
+    pool = KeyPool(["only"], quota=1)
+    pool.release(pool.acquire(), "200")
+    assert pool.acquire() is None
+
+
+def test_single_key_crawl_survives_429(mock_tikhub, monkeypatch):
+    config, stats = mock_tikhub
+    config.key_rate = 4
+    monkeypatch.setattr(tikhub, "KEY_POOL", KeyPool(["only"]))
+    monkeypatch.setattr(tikhub, "PAGE_SIZER", PageSizer(default=20, probe=20))
+
+    # 模拟服务按 Retry-After: 1 限流，唯一的 Key 被隔离后等待其到期继续抓取
+    result = fetch_all_comments("7100000000000000000")
+    assert result["success"] is True
+    assert result["total_comments"] == 120
+    assert stats.rate_limited >= 1
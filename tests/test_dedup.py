@@ -0,0 +1,93 @@
+"""按 cid 去重"""
+
+import random
+
+import pytest
+
+from services.dedup import BloomFilter, CidSet, CommentDeduper, cid_key
+
+
+def test_cid_key():
+    assert cid_key("7301234567890123456") == 7301234567890123456
+    assert cid_key(42) == 42
+    assert cid_key(None) is None and cid_key("") is None
+    # 非数字或超过 19 位的 ID 取摘要，结果稳定
+    assert cid_key("abc") == cid_key("abc") != cid_key("abd")
+    assert cid_key("9" * 25) < 2 ** 64
+    # 只有 ASCII 数字按整数处理：上标数字不能传给 int()，全角数字不能与同值的 ASCII ID 冲突
+    assert cid_key("²³") == cid_key("²³") < 2 ** 64
+    assert cid_key("１２３") != cid_key("123") == 123
+
+
+def test_cid_set_add_and_contains():
+    cids = CidSet()
+    assert cids.add(5) and not cids.add(5)
+    assert 5 in cids and 6 not in cids
+    assert len(cids) == 1
+
+
+def test_cid_set_zero_key():
+    cids = CidSet()
+    assert 0 not in cids
+    assert cids.add(0) and not cids.add(0)
+    assert 0 in cids and len(cids) == 1
+
+
+def test_cid_set_grows_without_losing_keys():
+    keys = random.Random(1).sample(range(1, 2 ** 63), 5000)
+    cids = CidSet(capacity=8)
+    initial = cids.nbytes
+    for key in keys:
+        assert cids.add(key)
+    assert len(cids) == 5000 and cids.nbytes > initial
+    assert all(key in cids for key in keys)
+    assert not any(cids.add(key) for key in keys)
+    absent = [key for key in range(1, 1000) if key not in set(keys)]
+    assert not any(key in cids for key in absent)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(error=0.01, capacity=100)
+    for key in range(1, 1000):
+        bloom.add(key)
+    assert not any(bloom.add(key) for key in range(1, 1000))
+
+
+def page(*cids):
+    return [{"cid": cid, "text": str(cid)} for cid in cids]
+
+
+def test_deduper_filters_repeats_across_pages():
+    dedup = CommentDeduper("exact")
+    assert [c["cid"] for c in dedup.filter(page("1", "2", "3"))] == ["1", "2", "3"]
+    assert [c["cid"] for c in dedup.filter(page("3", "4", "4", ""))] == ["4", ""]
+    assert dedup.received == 7 and dedup.duplicates == 2
+    assert dedup.summary() == {"duplicates": 2, "duplicate_rate": round(2 / 7, 4)}
+
+
+def test_deduper_known_comments_are_not_duplicates():
+    known = CidSet()
+    known.add(cid_key("1"))
+    dedup = CommentDeduper("exact", known=known)
+    assert [c["cid"] for c in dedup.filter(page("1", "2", "2"))] == ["2"]
+    assert dedup.known == 1 and dedup.duplicates == 1
+
+
+def test_deduper_off_keeps_everything():
+    dedup = CommentDeduper("off")
+    assert len(dedup.filter(page("1", "1"))) == 2 and dedup.duplicates == 0
+
+
+def test_deduper_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        CommentDeduper("fuzzy")
+
+
+def test_crawl_drops_overlapping_pages(mock_tikhub):
+    from services.tikhub import fetch_all_comments
+
+    config, _ = mock_tikhub
+    config.overlap = 5
+    result = fetch_all_comments("7100000000000000001")
+    ids = [c["cid"] for c in result["comments"]]
+    assert len(ids) == len(set(ids)) == 120
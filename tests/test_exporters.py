@@ -0,0 +1,151 @@
+"""导出格式：内容与响应头"""
+
+import codecs
+import csv
+import io
+import json
+
+import pytest
+
+import app as flask_app
+from api.export import excel
+from services.exporters import EXPORT_FORMATS, export_file, is_stream
+from services.result_store import ResultStore
+
+
+def make_videos(count=2, comments=3):
+    return [{
+        "video_id": f"71000000000000000{v:02d}",
+        "url": f"https://www.tiktok.com/@user/video/71000000000000000{v:02d}",
+        "total_comments": comments,
+        "comments": [{
+            "id": f"{v}{i:04d}", "text": f"评论 {i}, \"quoted\"", "likes": i, "reply_count": 1,
+            "create_time": 1700000000 + i, "create_time_formatted": "2023-11-14 22:13:20", "status": 1,
+            "author": {"uid": "1", "nickname": "昵称", "username": "user"},
+        } for i in range(comments)],
+    } for v in range(count)]
+
+
+def read(body):
+    return b"".join(body) if is_stream(body) else body.read()
+
+
+def test_json_single_video_is_a_comment_array():
+    body, mimetype, name = export_file("json", make_videos(1))
+    assert mimetype == "application/json"
+    assert name == "tiktok_comments_7100000000000000000.json"
+    data = json.loads(read(body))
+    assert [c["id"] for c in data] == ["00000", "00001", "00002"]
+
+
+def test_json_batch_groups_by_video():
+    body, _, name = export_file("json", make_videos(2))
+    assert name.startswith("tiktok_comments_batch_")
+    data = json.loads(read(body))
+    assert [v["video_id"] for v in data] == ["7100000000000000000", "7100000000000000001"]
+    assert all(len(v["comments"]) == 3 for v in data)
+
+
+def test_ndjson_adds_video_id_to_each_line():
+    body, mimetype, name = export_file("ndjson", make_videos(2))
+    assert mimetype == "application/x-ndjson" and name.endswith(".jsonl")
+    lines = [json.loads(line) for line in read(body).decode("utf-8").splitlines()]
+    assert len(lines) == 6
+    assert lines[-1]["video_id"] == "7100000000000000001"
+
+
+def test_csv_has_bom_header_and_escaped_rows():
+    body, mimetype, _ = export_file("csv", make_videos(2))
+    assert mimetype == "text/csv"
+    data = read(body)
+    assert data.startswith(codecs.BOM_UTF8)
+    rows = list(csv.reader(io.StringIO(data[len(codecs.BOM_UTF8):].decode("utf-8"))))
+    assert rows[0][0] == "Video ID" and rows[0][1] == "Comment ID"
+    assert len(rows) == 7
+    assert rows[1][4] == '评论 0, "quoted"'
+
+
+def test_excel_workbook():
+    openpyxl = pytest.importorskip("openpyxl")
+    body, mimetype, name = export_file("excel", make_videos(2))
+    assert mimetype == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    assert name.endswith(".xlsx")
+    workbook = openpyxl.load_workbook(io.BytesIO(read(body)), read_only=True)
+    assert len(workbook.sheetnames) >= 1
+
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_columnar_exports_keep_types(format):
+    pa = pytest.importorskip("pyarrow")
+    body, _, _ = export_file(format, make_videos(2))
+    data = read(body)
+    if format == "parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(io.BytesIO(data))
+    else:
+        table = pa.ipc.open_stream(data).read_all()
+    assert table.num_rows == 6
+    assert table.schema.field("likes").type == pa.int64()
+    assert pa.types.is_timestamp(table.schema.field("create_time").type)
+
+
+def test_unknown_format():
+    assert export_file("xml", make_videos(1)) is None
+
+
+@pytest.fixture
+def client():
+    store = flask_app.result_store
+    for video in make_videos(2):
+        store.save_video(video)
+    return flask_app.app.test_client()
+
+
+@pytest.mark.parametrize("format, content_type, extension", [
+    ("json", "application/json", "json"),
+    ("ndjson", "application/x-ndjson", "jsonl"),
+    ("csv", "text/csv; charset=utf-8", "csv"),
+    ("excel", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+])
+def test_export_response_headers(client, format, content_type, extension):
+    response = client.get(f"/api/videos/7100000000000000000/export/{format}")
+    assert response.status_code == 200
+    assert response.data
+    assert response.headers["Content-Type"] == content_type
+    assert response.headers["Content-Disposition"] == \
+        f"attachment; filename=tiktok_comments_7100000000000000000.{extension}"
+
+
+def test_export_by_job_and_ids(client):
+    job_id = flask_app.result_store.save_job(["7100000000000000000", "7100000000000000001"])
+    # 流式响应读完后再发下一个请求
+    by_job = client.get(f"/api/jobs/{job_id}/export/ndjson").data
+    by_ids = client.get("/api/export/ndjson?aweme_ids=7100000000000000000,7100000000000000001").data
+    assert by_job == by_ids and len(by_job.splitlines()) == 6
+
+
+def test_export_errors(client):
+    assert client.get("/api/videos/7100000000000000000/export/xml").status_code == 400
+    missing = client.get("/api/jobs/0123456789abcdef/export/csv")
+    assert missing.status_code == 404 and missing.get_json()["success"] is False
+
+
+def test_every_format_is_registered():
+    assert set(EXPORT_FORMATS) >= {"json", "ndjson", "jsonl", "csv", "excel", "xlsx", "parquet", "arrow"}
+
+
+def test_serverless_excel_export_by_reference_and_body(monkeypatch, tmp_path):
+    # Vercel 的 Excel 函数只能读取 RESULT_STORE_DIR；引用不存在时返回 404，页面改为回传 videos
+    monkeypatch.setattr(excel, "result_store", ResultStore(directory=str(tmp_path)))
+
+    assert excel.process_export({"job_id": "missing"})[1] == 404
+    assert excel.process_export({"videos": []})[1] == 400
+
+    videos = make_videos(2)
+    output = excel.process_export({"videos": videos})
+    assert output.read(2) == b"PK"
+
+    for video in videos:
+        excel.result_store.save_video(dict(video, success=True))
+    job_id = excel.result_store.save_job([v["video_id"] for v in videos])
+    assert excel.process_export({"job_id": job_id}).read(2) == b"PK"
@@ -0,0 +1,56 @@
+"""按请求内存追踪：X-Memory-Peak 头、响应中的 memory 字段与嵌套阶段的峰值"""
+
+import re
+
+import pytest
+
+import app as flask_app
+from services import memory
+
+ENTRY = re.compile(r'^([a-z_]+);peak_kb=\d+\.\d$')
+URL = "https://www.tiktok.com/@user/video/7100000000000000001"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(memory, "ENABLED", True)
+    return flask_app.app.test_client()
+
+
+def test_batch_reports_memory_peaks(mock_tikhub, client):
+    response = client.post("/api/fetch-comments-batch", json={"urls": [URL]},
+                           headers={memory.REQUEST_HEADER: "1"})
+    assert response.status_code == 200
+
+    names = []
+    for part in response.headers[memory.RESPONSE_HEADER].split(", "):
+        match = ENTRY.match(part)
+        assert match, part
+        names.append(match.group(1))
+    assert "format" in names
+
+    summary = response.get_json()["memory"]
+    assert summary["peak_bytes"] == max(summary["phases"].values()) > 0
+
+
+def test_untraced_requests_have_no_header(mock_tikhub, client):
+    response = client.post("/api/fetch-comments-batch", json={"urls": [URL]})
+    assert memory.RESPONSE_HEADER not in response.headers
+    assert "memory" not in response.get_json()
+
+
+def test_nested_phases_keep_their_own_peaks():
+    token = memory.begin()
+    try:
+        trace = memory.current()
+        with memory.phase("outer"):
+            outer = bytearray(2 * 1024 * 1024)
+            with memory.phase("inner"):
+                inner = bytearray(1024 * 1024)
+                del inner
+            del outer
+    finally:
+        memory.end(token)
+
+    assert trace.phases["inner"] >= 1024 * 1024
+    assert trace.phases["outer"] >= trace.phases["inner"] + 2 * 1024 * 1024
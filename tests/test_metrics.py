@@ -0,0 +1,66 @@
+"""/metrics：Prometheus 文本格式与抓取指标"""
+
+import re
+
+import pytest
+
+import app as flask_app
+from services import metrics
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})? (-?[0-9.e+-]+|\+Inf)$')
+URL = "https://www.tiktok.com/@user/video/7100000000000000001"
+
+
+@pytest.fixture
+def client():
+    return flask_app.app.test_client()
+
+
+def scrape(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type == metrics.CONTENT_TYPE
+    return response.get_data(as_text=True)
+
+
+def samples(text):
+    """解析样本行，同时检查每个指标都有 HELP / TYPE 且样本行格式正确"""
+    declared, values = {}, {}
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            declared[name] = kind
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        name, labels, value = match.groups()
+        base = re.sub(r'_(bucket|sum|count)$', '', name) if name not in declared else name
+        assert base in declared, line
+        values[name + (labels or "")] = float(value)
+    return declared, values
+
+
+def test_exposition_is_well_formed_and_counts_pages(mock_tikhub, client):
+    _, before = samples(scrape(client))
+    response = client.post("/api/fetch-comments-batch", json={"urls": [URL], "analytics": False})
+    assert response.status_code == 200
+
+    declared, after = samples(scrape(client))
+    assert declared["tikhub_pages_fetched_total"] == "counter"
+    assert declared["tikhub_upstream_request_seconds"] == "histogram"
+    assert after["tikhub_comments_fetched_total"] - before.get("tikhub_comments_fetched_total", 0) == 120
+    assert after["tikhub_pages_fetched_total"] > before.get("tikhub_pages_fetched_total", 0)
+
+
+def test_histogram_buckets_are_cumulative(mock_tikhub, client):
+    client.post("/api/fetch-comments-batch", json={"urls": [URL], "analytics": False})
+    _, values = samples(scrape(client))
+
+    prefix = 'tikhub_upstream_request_seconds_bucket{status="200",le="'
+    buckets = [(key[len(prefix):-2], value) for key, value in values.items() if key.startswith(prefix)]
+    counts = [value for _, value in buckets]
+    assert buckets[-1][0] == "+Inf"
+    assert counts == sorted(counts)
+    assert values['tikhub_upstream_request_seconds_count{status="200"}'] == counts[-1]
@@ -0,0 +1,57 @@
+"""按请求性能分析：X-Profile-Id、/admin/profiles 列表、下载与文本摘要"""
+
+import marshal
+
+import pytest
+
+import app as flask_app
+from services import profiling
+
+TOKEN = "secret-token"
+HEADERS = {profiling.TOKEN_HEADER: TOKEN}
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", TOKEN)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    return flask_app.app.test_client()
+
+
+def profile_health(client):
+    response = client.get("/health", headers=HEADERS)
+    response.get_data()
+    response.close()
+    return response.headers[profiling.ID_HEADER]
+
+
+def test_profiled_request_is_saved_and_listed(client):
+    profile_id = profile_health(client)
+    assert client.get("/health").headers.get(profiling.ID_HEADER) is None
+
+    listing = client.get("/admin/profiles", headers=HEADERS).get_json()
+    assert [meta["id"] for meta in listing["profiles"]] == [profile_id]
+    assert listing["profiles"][0]["path"] == "/health"
+    assert listing["profiles"][0]["status"] == 200
+
+    download = client.get(f"/admin/profiles/{profile_id}", headers=HEADERS)
+    assert download.content_type == "application/octet-stream"
+    assert isinstance(marshal.loads(download.data), dict)
+
+
+def test_text_summary_and_sort_validation(client):
+    profile_id = profile_health(client)
+
+    text = client.get(f"/admin/profiles/{profile_id}?format=text&sort=time", headers=HEADERS)
+    assert text.status_code == 200
+    assert "function calls" in text.get_data(as_text=True)
+
+    bad = client.get(f"/admin/profiles/{profile_id}?format=text&sort=bogus", headers=HEADERS)
+    assert bad.status_code == 400
+    assert bad.get_json()["success"] is False
+
+
+def test_admin_requires_token(client):
+    assert client.get("/admin/profiles").status_code == 403
+    assert client.get("/admin/profiles", headers={profiling.TOKEN_HEADER: "wrong"}).status_code == 403
+    assert client.get("/admin/profiles/" + "0" * 32, headers=HEADERS).status_code == 404
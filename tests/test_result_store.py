@@ -0,0 +1,169 @@
+"""结果缓存：游标分页、page_size 限制与结果目录"""
+
+import threading
+
+import pytest
+
+import app as flask_app
+from api import fetch_comments_batch
+from services.result_store import (
+    MAX_PAGE_SIZE, ResultStore, first_page, parse_page_args, parse_page_size
+)
+
+
+def make_video(aweme_id="7100000000000000001", count=230):
+    comments = [{"id": str(i), "text": f"comment {i}", "likes": i % 7, "create_time": 1700000000 + i,
+                 "reply_count": i % 3} for i in range(count)]
+    return {"url": f"https://www.tiktok.com/@user/video/{aweme_id}", "video_id": aweme_id,
+            "success": True, "total_comments": count, "comments": comments}
+
+
+def test_cursor_paging_covers_every_comment_once():
+    store = ResultStore()
+    video = make_video()
+    store.save_video(video)
+
+    seen, cursor = [], 0
+    while True:
+        page = store.get_page(video["video_id"], cursor=cursor, limit=50)
+        assert page["total"] == 230
+        assert page["cursor"] == cursor
+        seen += [c["id"] for c in page["comments"]]
+        if not page["has_more"]:
+            break
+        cursor = page["next_cursor"]
+
+    assert seen == [str(i) for i in range(230)]
+    assert page["next_cursor"] == 230
+
+
+def test_page_limit_and_cursor_are_clamped():
+    store = ResultStore()
+    store.save_video(make_video())
+
+    assert len(store.get_page("7100000000000000001", limit=10000)["comments"]) == MAX_PAGE_SIZE
+    assert len(store.get_page("7100000000000000001", limit=-5)["comments"]) == 1
+    assert store.get_page("7100000000000000001", cursor=-10, limit=5)["cursor"] == 0
+    past_end = store.get_page("7100000000000000001", cursor=500)
+    assert past_end["comments"] == [] and not past_end["has_more"]
+
+
+def test_sorted_pages():
+    store = ResultStore()
+    store.save_video(make_video())
+
+    page = store.get_page("7100000000000000001", limit=20, sort="time")
+    times = [c["create_time"] for c in page["comments"]]
+    assert times == sorted(times, reverse=True)
+    assert store.get_page("missing", limit=20) is None
+
+
+def test_parse_page_args_falls_back_to_defaults():
+    assert parse_page_args({"cursor": "x", "limit": "", "sort": "nope"}) == \
+        {"cursor": 0, "limit": 50, "sort": "default"}
+    assert parse_page_args({"cursor": "100", "limit": "20", "sort": "likes"}) == \
+        {"cursor": 100, "limit": 20, "sort": "likes"}
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, 50), (10, 10), ("10", 10), (-5, 1), (0, 1), (10000, MAX_PAGE_SIZE),
+    ("abc", None), (True, None), ([10], None),
+])
+def test_parse_page_size(value, expected):
+    assert parse_page_size(value) == expected
+
+
+def test_first_page():
+    page = first_page(make_video(count=30), 20)
+    assert len(page["comments"]) == 20
+    assert page["next_cursor"] == 20 and page["has_more"]
+
+
+def test_directory_store_shared_between_instances(tmp_path):
+    writer = ResultStore(directory=str(tmp_path))
+    video = make_video()
+    writer.save_video(video)
+    job_id = writer.save_job([video["video_id"]])
+
+    reader = ResultStore(directory=str(tmp_path))
+    assert reader.get_page(video["video_id"], limit=5)["total"] == 230
+    assert [v["video_id"] for v in reader.resolve_videos(job_id=job_id)] == [video["video_id"]]
+
+
+def test_rejects_path_traversal_in_video_ids(tmp_path):
+    directory = tmp_path / "results"
+    store = ResultStore(directory=str(directory))
+    (tmp_path / "secret.json").write_text('{"saved_at": 9999999999, "comments": []}')
+
+    assert store.get_video("../secret") is None
+    assert store.resolve_videos(aweme_ids=["../secret"]) is None
+
+
+def test_concurrent_saves_of_the_same_video(tmp_path):
+    store = ResultStore(directory=str(tmp_path))
+    errors = []
+
+    def save():
+        try:
+            for _ in range(50):
+                store.save_video(make_video(count=5))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["7100000000000000001.json"]
+
+
+@pytest.fixture
+def client():
+    return flask_app.app.test_client()
+
+
+URL = "https://www.tiktok.com/@user/video/7100000000000000001"
+
+
+@pytest.mark.parametrize("page_size, expected", [("10", 10), (-5, 1), (None, 50), (1000, 120)])
+def test_batch_page_size_is_clamped(mock_tikhub, client, page_size, expected):
+    body = {"urls": [URL], "analytics": False}
+    if page_size is not None:
+        body["page_size"] = page_size
+    response = client.post("/api/fetch-comments-batch", json=body)
+
+    assert response.status_code == 200
+    video = response.get_json()["videos"][0]
+    assert video["total_comments"] == 120
+    assert len(video["comments"]) == expected
+    assert video["next_cursor"] == expected
+
+
+@pytest.mark.parametrize("page_size", ["abc", True, [10]])
+def test_batch_rejects_invalid_page_size(client, page_size):
+    response = client.post("/api/fetch-comments-batch", json={"urls": [URL], "page_size": page_size})
+    assert response.status_code == 400
+    assert response.get_json()["success"] is False
+
+
+def test_pages_after_batch(mock_tikhub, client):
+    job = client.post("/api/fetch-comments-batch", json={"urls": [URL], "page_size": 50, "analytics": False})
+    assert job.status_code == 200
+
+    page = client.get("/api/videos/7100000000000000001/comments?cursor=100&limit=50").get_json()
+    assert page["cursor"] == 100 and len(page["comments"]) == 20 and not page["has_more"]
+    assert client.get("/api/videos/7199999999999999999/comments").status_code == 404
+
+
+@pytest.mark.parametrize("shared, expected", [(False, 120), (True, 20)])
+def test_serverless_batch_pages_only_with_shared_store(mock_tikhub, monkeypatch, tmp_path, shared, expected):
+    # 没有共享结果目录时，翻页可能落到其他容器，批量函数返回全部评论
+    monkeypatch.setattr(fetch_comments_batch, "result_store", ResultStore(directory=str(tmp_path) if shared else None))
+    result, status = fetch_comments_batch.process_request({"urls": [URL], "page_size": 20, "analytics": False})
+    assert status == 200
+    video = result["videos"][0]
+    assert len(video["comments"]) == expected
+    assert video["has_more"] is shared
@@ -0,0 +1,111 @@
+"""批量抓取调度：准入控制、429 / Retry-After 与失败隔离"""
+
+import time
+
+import pytest
+
+import app as flask_app
+from services import scheduler
+from services.scheduler import BatchScheduler, CrawlExecutor, QueueFull
+
+URLS = [f"https://www.tiktok.com/@user/video/71000000000000000{i:02d}" for i in range(3)]
+
+
+def test_batch_results_keep_input_order(mock_tikhub):
+    config, _ = mock_tikhub
+    config.sizes = {"7100000000000000000": 300, "7100000000000000002": 10}
+    results = CrawlExecutor(workers=2).run(BatchScheduler(URLS + ["not a url"]))
+
+    assert [r["total_comments"] for r in results[:3]] == [300, 120, 10]
+    assert results[3]["success"] is False
+
+
+def test_queue_full_rejects_with_retry_after(mock_tikhub):
+    config, _ = mock_tikhub
+    config.latency_ms = 100
+    executor = CrawlExecutor(workers=1, max_batches=1, queue_size=0)
+    running = BatchScheduler(URLS[:1])
+    executor.submit(running)
+
+    with pytest.raises(QueueFull) as rejected:
+        executor.submit(BatchScheduler(URLS[1:2]))
+    assert rejected.value.reason == "queue_full"
+    assert 1 <= rejected.value.retry_after <= scheduler.MAX_RETRY_AFTER
+
+    assert running.wait(10)
+    # 前一个批次完成后不再拒绝
+    assert executor.run(BatchScheduler(URLS[1:2]))[0]["success"]
+
+
+def test_client_limit(mock_tikhub):
+    config, _ = mock_tikhub
+    config.latency_ms = 100
+    executor = CrawlExecutor(workers=1, max_batches=4, client_max_batches=1)
+    running = BatchScheduler(URLS[:1], client="a")
+    executor.submit(running)
+
+    with pytest.raises(QueueFull) as rejected:
+        executor.submit(BatchScheduler(URLS[1:2], client="a"))
+    assert rejected.value.reason == "client_limit"
+    # 其他客户端不受影响
+    assert executor.run(BatchScheduler(URLS[1:2], client="b"))[0]["success"]
+    assert running.wait(10)
+
+
+def test_batch_timeout_fails_unfinished_videos(mock_tikhub):
+    config, _ = mock_tikhub
+    config.latency_ms = 200
+    executor = CrawlExecutor(workers=1)
+    started = time.perf_counter()
+    results = executor.run(BatchScheduler(URLS), timeout=0.3)
+
+    assert time.perf_counter() - started < 2
+    assert all(not r["success"] and "超时" in r["error"] for r in results)
+    # 中止的批次释放名额，执行器继续服务新批次
+    config.latency_ms = 0
+    assert executor.run(BatchScheduler(URLS[:1]), timeout=10)[0]["success"]
+
+
+def test_step_errors_fail_only_that_video(mock_tikhub, monkeypatch):
+    executor = CrawlExecutor(workers=2)
+    real_profiled = scheduler.profiling.profiled
+
+    def profiled(fn, batch, task):
+        if task.crawl.aweme_id.endswith("01"):
+            raise RuntimeError("boom")
+        return real_profiled(fn, batch, task)
+
+    monkeypatch.setattr(scheduler.profiling, "profiled", profiled)
+    results = executor.run(BatchScheduler(URLS), timeout=10)
+
+    assert [r["success"] for r in results] == [True, False, True]
+    assert "boom" in results[1]["error"]
+    assert all(thread.is_alive() for thread in executor._threads)
+
+
+def test_batch_endpoint_returns_429(monkeypatch):
+    def busy(*args, **kwargs):
+        raise QueueFull(7, "queue_full")
+
+    monkeypatch.setattr(flask_app, "crawl_batch", busy)
+    response = flask_app.app.test_client().post("/api/fetch-comments-batch", json={"urls": URLS[:1]})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "7"
+    assert response.get_json() == {"success": False, "error": "服务繁忙，请 7 秒后重试", "retry_after": 7}
+
+
+def test_queued_batches_are_not_counted_in_flight(mock_tikhub):
+    from services import metrics
+
+    config, _ = mock_tikhub
+    config.latency_ms = 100
+    executor = CrawlExecutor(workers=1, max_batches=1, queue_size=1)
+    before = metrics.CRAWLS_IN_FLIGHT.value()
+    running, queued = BatchScheduler(URLS[:2]), BatchScheduler(URLS[2:])
+    executor.submit(running)
+    executor.submit(queued)
+
+    assert metrics.CRAWLS_IN_FLIGHT.value() - before == 2
+    assert running.wait(10) and queued.wait(10)
+    assert metrics.CRAWLS_IN_FLIGHT.value() == before
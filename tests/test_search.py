@@ -0,0 +1,132 @@
+"""评论检索：分词、查询解析与 BM25 索引"""
+
+import time
+
+import pytest
+
+from services.search import QueryError, SearchIndex, index_terms, parse_query, parse_search_args, tokenize
+
+
+def test_tokenize_latin_is_lowercased_and_normalized():
+    assert tokenize("Hello, WORLD ｉＰｈｏｎｅ 15") == ["hello", "world", "iphone", "15"]
+
+
+def test_tokenize_cjk_bigrams_and_single_characters():
+    assert tokenize("新品发布会") == ["新品", "品发", "发布", "布会"]
+    assert tokenize("好") == ["好"]
+    assert tokenize("很好 good 😂😂") == ["很好", "good", "😂", "😂"]
+
+
+def test_index_terms_add_cjk_unigrams():
+    terms = index_terms("很好看")
+    assert terms[:2] == ["很好", "好看"]
+    assert set(terms[2:]) == {"很", "好", "看"}
+
+
+def describe(node):
+    if node.op == "term":
+        return node.text
+    return [node.op] + [describe(child) for child in node.children]
+
+
+@pytest.mark.parametrize("query, tree", [
+    ("苹果 手机", ["and", "苹果", "手机"]),
+    ("苹果 AND 手机", ["and", "苹果", "手机"]),
+    ("苹果 OR 华为", ["or", "苹果", "华为"]),
+    ("手机 -广告", ["and", "手机", ["not", "广告"]]),
+    ("手机 NOT 广告", ["and", "手机", ["not", "广告"]]),
+    ("(苹果 OR 华为) 手机", ["and", ["or", "苹果", "华为"], "手机"]),
+    ('"new phone" -"广 告"', ["and", "new phone", ["not", "广告"]]),
+    ('"新品 发布"', "新品发布"),
+])
+def test_parse_query(query, tree):
+    assert describe(parse_query(query)) == tree
+
+
+@pytest.mark.parametrize("query", ["", "(苹果", "苹果)", "苹果 OR", "!!!"])
+def test_parse_query_errors(query):
+    with pytest.raises(QueryError):
+        parse_query(query)
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.add_video("v1", [
+        {"id": "1", "text": "这个手机很好看"},
+        {"id": "2", "text": "新品发布会什么时候"},
+        {"id": "3", "text": "好"},
+        {"id": "4", "text": "可口可乐 is good"},
+        {"id": "5", "text": "可口 还是 可乐"},
+    ])
+    index.add_video("v2", [
+        {"id": "6", "text": "New phone, good price"},
+        {"id": "7", "text": "广告 手机 good"},
+    ])
+    return index
+
+
+def hits(index, query, **kwargs):
+    return [hit["comment_id"] for hit in index.search(query, **kwargs)["hits"]]
+
+
+def test_single_cjk_character_matches_inside_words(index):
+    assert sorted(hits(index, "好")) == ["1", "3"]
+
+
+def test_cjk_phrase_with_spaces_matches_joined_text(index):
+    assert hits(index, '"新品 发布"') == ["2"]
+    assert hits(index, "新品发布") == ["2"]
+
+
+def test_multi_character_cjk_word_requires_contiguous_text(index):
+    assert hits(index, "可口可乐") == ["4"]
+
+
+def test_boolean_operators(index):
+    assert sorted(hits(index, "good")) == ["4", "6", "7"]
+    assert sorted(hits(index, "good -手机")) == ["4", "6"]
+    assert sorted(hits(index, "(可乐 OR price) good")) == ["4", "6"]
+    assert hits(index, '"good price"') == ["6"]
+    assert hits(index, '"price good"') == []
+
+
+def test_filter_by_video_and_paging(index):
+    assert sorted(hits(index, "good", aweme_ids=["v2"])) == ["6", "7"]
+    result = index.search("good", limit=1, offset=1)
+    assert result["total"] == 3 and len(result["hits"]) == 1
+
+
+def test_not_only_query_is_rejected(index):
+    with pytest.raises(QueryError):
+        index.search("-good")
+
+
+def test_replacing_and_removing_videos(index):
+    index.add_video("v2", [{"id": "8", "text": "good"}])
+    assert sorted(hits(index, "good")) == ["4", "8"]
+    index.remove_video("v1")
+    assert hits(index, "good") == ["8"]
+    assert index.stats()["videos"] == 1
+
+
+def wait_for_indexer(index, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while index.pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert index.pending == 0
+
+
+def test_background_indexer_survives_bad_video():
+    index = SearchIndex()
+    index.submit("bad", [None])
+    index.submit("good", [{"id": "1", "text": "still indexed"}])
+    wait_for_indexer(index)
+
+    assert hits(index, "indexed") == ["1"]
+    assert index._indexer.is_alive()
+
+
+def test_parse_search_args():
+    args = parse_search_args({"q": " good ", "limit": "1000", "offset": "-3", "aweme_ids": "a, b,"})
+    assert args == {"query": "good", "limit": 100, "offset": 0, "aweme_ids": ["a", "b"]}
@@ -0,0 +1,82 @@
+"""评论统计：分布、时间序列、作者排行、批量合并与空输入"""
+
+import pytest
+
+pytest.importorskip("numpy")
+
+import app as flask_app  # noqa: E402
+from services.stats import CommentColumns, parse_stats_args, summarize, videos_stats  # noqa: E402
+
+DAY = 86400
+URL = "https://www.tiktok.com/@user/video/7100000000000000001"
+
+
+def comment(uid, likes, create_time, replies=0):
+    return {"author": {"uid": uid, "nickname": f"n{uid}", "username": f"u{uid}"},
+            "likes": likes, "create_time": create_time, "reply_count": replies}
+
+
+COMMENTS = [
+    comment("a", 0, 1700000000, 1),
+    comment("a", 3, 1700000000 + 3600, 0),
+    comment("b", 10, 1700000000 + DAY, 2),
+    comment("c", 100, 0, 0),
+]
+
+
+def test_summary_aggregates():
+    stats = summarize(CommentColumns.from_comments(COMMENTS), bucket="day", top=2)
+
+    assert stats["total_comments"] == 4
+    assert stats["authors"] == 3
+    likes = stats["likes"]
+    assert likes["sum"] == 113 and likes["max"] == 100 and likes["mean"] == 28.25
+    assert sum(likes["histogram"]["counts"]) == 4
+    assert len(likes["histogram"]["edges"]) == len(likes["histogram"]["counts"]) + 1
+    assert stats["replies"]["with_replies"] == 2 and stats["replies"]["reply_ratio"] == 0.5
+
+    # create_time 为 0 的评论不计入时间序列
+    series = stats["timeline"]["series"]
+    assert [(s["comments"], s["likes"]) for s in series] == [(2, 3), (1, 10)]
+    assert series[1]["time"] - series[0]["time"] == DAY
+
+    assert [(a["uid"], a["comments"]) for a in stats["top_authors"]] == [("a", 2), ("c", 1)]
+
+
+def test_empty_input():
+    stats = summarize(CommentColumns.from_comments([]))
+    assert stats["total_comments"] == 0 and stats["authors"] == 0
+    assert stats["likes"] == {"sum": 0, "mean": 0.0, "max": 0, "percentiles": {},
+                              "histogram": {"edges": [], "counts": []}}
+    assert stats["replies"]["reply_ratio"] == 0.0
+    assert stats["timeline"]["series"] == []
+    assert stats["top_authors"] == []
+
+
+def test_combined_stats_merge_authors():
+    items = [{"video_id": "1", "columns": CommentColumns.from_comments(COMMENTS[:2])},
+             {"video_id": "2", "columns": CommentColumns.from_comments(COMMENTS[1:])},
+             {"video_id": "3", "columns": CommentColumns.from_comments([])}]
+    result = videos_stats(items, top=1)
+
+    assert [v["total_comments"] for v in result["videos"]] == [2, 3, 0]
+    combined = result["combined"]
+    assert combined["total_comments"] == 5 and combined["authors"] == 3
+    assert combined["top_authors"][0]["uid"] == "a" and combined["top_authors"][0]["comments"] == 3
+
+
+def test_parse_stats_args():
+    assert parse_stats_args({}) == {"bucket": "auto", "top": 10}
+    assert parse_stats_args({"bucket": "month", "top": "x"}) == {"bucket": "auto", "top": 10}
+    assert parse_stats_args({"bucket": "hour", "top": "1000"}) == {"bucket": "hour", "top": 100}
+
+
+def test_stats_endpoint(mock_tikhub):
+    client = flask_app.app.test_client()
+    assert client.post("/api/fetch-comments-batch", json={"urls": [URL], "analytics": False}).status_code == 200
+
+    stats = client.get("/api/videos/7100000000000000001/stats?bucket=hour").get_json()
+    assert stats["success"] is True
+    assert stats["total_comments"] == 120
+    assert sum(s["comments"] for s in stats["timeline"]["series"]) == 120
+    assert client.get("/api/videos/7199999999999999999/stats").status_code == 404
@@ -0,0 +1,87 @@
+"""每页条数探测：按上游返回下调、4xx 时单页重试与过期后重新探测"""
+
+import pytest
+
+from benchmarks.mock_tikhub import MockConfig, MockHandler, start_mock_server
+from services import tikhub
+from services.tikhub import PageSizer, fetch_all_comments
+
+GOOD = "7100000000000000001"
+MISSING = "7100000000000000404"
+
+
+class PickyHandler(MockHandler):
+    """MISSING 视频返回 404；count 超过 reject_above 时返回 400"""
+    reject_above = 0
+
+    def respond(self, aweme_id, cursor, count):
+        if aweme_id == MISSING:
+            self.send_json(404, {"detail": "Video not found"})
+        elif self.reject_above and count > self.reject_above:
+            self.send_json(400, {"detail": "count too large"})
+        else:
+            super().respond(aweme_id, cursor, count)
+
+
+@pytest.fixture
+def picky_tikhub(monkeypatch):
+    """max_count=100 的模拟服务，返回 (handler 类, stats)；每个测试使用新的 PageSizer"""
+    handler = type("Picky", (PickyHandler,), {})
+    server, stats, base_url = start_mock_server(MockConfig(comments=500, max_count=100), handler)
+    monkeypatch.setattr(tikhub, "BASE_URL", base_url)
+    monkeypatch.setattr(tikhub, "PAGE_SIZER", PageSizer(default=30, probe=100))
+    yield server.RequestHandlerClass, stats
+    server.shutdown()
+    server.server_close()
+
+
+def test_observe_lowers_to_returned_count():
+    sizer = PageSizer(default=30, probe=100)
+    assert sizer.next_count() == 100
+    sizer.observe(100, 50, has_more=True)
+    assert sizer.next_count() == 50
+    # 最后一页不满不说明上限；更大的返回值不会上调
+    sizer.observe(50, 10, has_more=False)
+    sizer.observe(50, 50, has_more=True)
+    assert sizer.next_count() == 50
+    # 截断到默认值以下时按默认值
+    sizer.observe(50, 5, has_more=True)
+    assert sizer.next_count() == 30
+
+
+def test_lowered_count_expires_and_reprobes():
+    sizer = PageSizer(default=30, probe=100, ttl=0)
+    sizer.observe(100, 50, has_more=True)
+    assert sizer.next_count() == 100
+
+    sizer.reject(100)
+    assert sizer.next_count() == 100
+
+
+def test_probe_uses_full_page(picky_tikhub):
+    _, stats = picky_tikhub
+    result = fetch_all_comments(GOOD)
+    assert result["total_comments"] == 500
+    assert stats.requests == 5
+
+
+def test_404_video_does_not_shrink_pages(picky_tikhub):
+    _, stats = picky_tikhub
+    result = fetch_all_comments(MISSING)
+    assert result["success"] is False
+    assert result["error"] == "HTTP 404"
+    assert tikhub.PAGE_SIZER.count is None
+
+    stats.reset()
+    assert fetch_all_comments(GOOD)["total_comments"] == 500
+    assert stats.requests == 5
+
+
+def test_rejected_count_falls_back_after_successful_retry(picky_tikhub):
+    handler, stats = picky_tikhub
+    handler.reject_above = 50
+    result = fetch_all_comments(GOOD)
+    assert result["total_comments"] == 500
+    assert tikhub.PAGE_SIZER.count == 30
+    # stats 只统计成功返回的页：500 / 30 向上取整
+    assert stats.requests == 17
@@ -0,0 +1,62 @@
+"""Server-Timing 响应头与结构化请求日志"""
+
+import io
+import json
+import logging
+import re
+
+import pytest
+
+import app as flask_app
+from services import timing
+
+ENTRY = re.compile(r'^([a-z_]+);dur=\d+\.\d(?:;desc="([\x20-\x7e]*)")?$')
+URL = "https://www.tiktok.com/@user/video/7100000000000000001"
+
+
+@pytest.fixture
+def client():
+    return flask_app.app.test_client()
+
+
+@pytest.fixture
+def request_log(monkeypatch):
+    """把请求日志写到内存中"""
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    monkeypatch.setattr(timing.logger, "handlers", [handler])
+    monkeypatch.setattr(timing, "LOG_ENABLED", True)
+    return stream
+
+
+def parse_server_timing(value):
+    entries = {}
+    for part in value.split(", "):
+        match = ENTRY.match(part)
+        assert match, part
+        entries[match.group(1)] = match.group(2)
+    return entries
+
+
+def test_batch_response_has_server_timing(mock_tikhub, client, request_log):
+    response = client.post("/api/fetch-comments-batch", json={"urls": [URL]})
+    assert response.status_code == 200
+    response.get_data()
+    response.close()
+
+    entries = parse_server_timing(response.headers["Server-Timing"])
+    assert list(entries)[-1] == "total"
+    assert re.match(r'^\d+ pages$', entries["upstream"])
+    assert {"format", "serialize"} <= set(entries)
+
+    record = json.loads(request_log.getvalue().splitlines()[-1])
+    assert record["event"] == "request"
+    assert record["path"] == "/api/fetch-comments-batch"
+    assert record["status"] == 200
+    assert record["aweme_ids"] == ["7100000000000000001"]
+    assert record["pages"] == record["phases"]["upstream"]["count"] > 0
+
+
+def test_every_response_has_total(client):
+    response = client.get("/health")
+    assert parse_server_timing(response.headers["Server-Timing"]) == {"total": None}
@@ -0,0 +1,106 @@
+"""定时监控：末尾续抓 / 从头补扫只保存新评论，刷新失败后间隔退避"""
+
+import io
+import time
+
+import pytest
+
+from benchmarks.mock_tikhub import MockConfig, MockHandler, build_page, make_raw_comment, start_mock_server
+from services import tikhub, watch
+from services.watch import MIN_INTERVAL, RateLimiter, Watcher, WatchStore, refresh_video
+
+VIDEO = "7100000000000000001"
+
+
+class NewestFirstHandler(MockHandler):
+    """评论按从新到旧排列，新评论出现在列表开头"""
+
+    def respond(self, aweme_id, cursor, count):
+        page = build_page(self.config, aweme_id, cursor, count)
+        total = self.config.comments_for(aweme_id)
+        size = len(page["data"]["comments"])
+        page["data"]["comments"] = [make_raw_comment(aweme_id, total - 1 - i, self.config.text_length)
+                                    for i in range(cursor, cursor + size)]
+        self.send_json(200, page)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = WatchStore(str(tmp_path / "watch.db"))
+    store.add([VIDEO])
+    yield store
+    store.close()
+
+
+def refresh(store):
+    video = next(v for v in store.videos() if v["aweme_id"] == VIDEO)
+    return refresh_video(store, RateLimiter(1000), video)
+
+
+def delta_ids(store, after):
+    return [c["id"] for c in store.deltas([VIDEO], after=after)]
+
+
+def test_tail_refresh_saves_only_new_comments(mock_tikhub, store):
+    config, _ = mock_tikhub
+    first = refresh(store)
+    assert first["mode"] == "full" and first["new_comments"] == 120
+
+    config.sizes = {VIDEO: 160}
+    second = refresh(store)
+    assert second["mode"] == "tail"
+    assert second["new_comments"] == 40
+
+    ids = delta_ids(store, first["refresh_id"])
+    assert len(ids) == len(set(ids)) == 40
+    assert len(delta_ids(store, 0)) == store.videos()[0]["comments"] == 160
+
+
+def test_head_rescan_when_new_comments_are_not_at_the_tail(monkeypatch, store):
+    config = MockConfig(comments=120)
+    server, _, base_url = start_mock_server(config, NewestFirstHandler)
+    monkeypatch.setattr(tikhub, "BASE_URL", base_url)
+    try:
+        first = refresh(store)
+        config.sizes = {VIDEO: 150}
+        second = refresh(store)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert second["mode"] == "tail+head"
+    assert second["new_comments"] == 30
+    ids = delta_ids(store, first["refresh_id"])
+    assert len(ids) == len(set(ids)) == 30
+
+
+def test_failed_refreshes_back_off(monkeypatch, store):
+    # 上游不可达：每次刷新都失败
+    monkeypatch.setattr(tikhub, "BASE_URL", "http://127.0.0.1:9")
+    intervals = []
+    for _ in range(3):
+        summary = refresh(store)
+        assert summary["error"]
+        intervals.append(summary["interval"])
+    assert intervals == [MIN_INTERVAL, MIN_INTERVAL * 2, MIN_INTERVAL * 4]
+
+    video = store.videos()[0]
+    assert video["refreshes"] == 3 and video["last_run"] is None and video["comments"] == 0
+    assert video["next_run"] > time.time() + MIN_INTERVAL * 4 * (1 - watch.JITTER) - 5
+
+
+def test_watcher_records_unexpected_errors(monkeypatch, store):
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(watch, "refresh_video", broken)
+    log = io.StringIO()
+    counts = Watcher(store, rate=1000, log=log).run(once=True)
+
+    assert counts == {"refreshes": 1, "new_comments": 0, "failed": 1}
+    assert "boom" in log.getvalue()
+    video = store.videos()[0]
+    assert video["last_error"] == "处理失败: boom"
+    # 推迟下次刷新，不会到期后立即重试
+    assert store.due(time.time()) == []
+    assert video["interval"] == MIN_INTERVAL
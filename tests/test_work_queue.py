@@ -0,0 +1,125 @@
+"""共享抓取队列：租约、到期重领与领取次数上限"""
+
+import io
+import time
+
+import pytest
+
+from services.work_queue import CrawlQueue, Worker
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return CrawlQueue(str(tmp_path / "queue.db"), lease_seconds=0.2, max_attempts=2)
+
+
+def tasks(queue, batch_id):
+    return queue.batch(batch_id)["tasks"]
+
+
+def test_submit_marks_unparseable_urls_failed(queue):
+    batch_id = queue.submit(["7100000000000000001", "https://www.tiktok.com/@u/video/7100000000000000002", "nope"])
+    assert [t["status"] for t in tasks(queue, batch_id)] == ["queued", "queued", "failed"]
+    assert queue.counts(batch_id) == {"queued": 2, "leased": 0, "done": 0, "failed": 1}
+
+
+def test_lease_in_submission_order_until_empty(queue):
+    queue.submit(["7100000000000000001", "7100000000000000002"])
+    first, second = queue.lease("a"), queue.lease("b")
+    assert [first["video_id"], second["video_id"]] == ["7100000000000000001", "7100000000000000002"]
+    assert first["attempts"] == 1 and first["owner"] == "a"
+    assert queue.lease("c") is None
+
+
+def test_expired_lease_is_taken_over(queue):
+    batch_id = queue.submit(["7100000000000000001"])
+    task = queue.lease("a")
+    assert queue.lease("b") is None
+
+    time.sleep(0.3)
+    retaken = queue.lease("b")
+    assert retaken["id"] == task["id"] and retaken["attempts"] == 2
+
+    # 原持有者的续期与完成都不再生效
+    assert not queue.heartbeat(task["id"], "a")
+    assert not queue.complete(task["id"], "a", 10)
+    assert queue.complete(task["id"], "b", 10)
+    assert tasks(queue, batch_id)[0]["status"] == "done"
+
+
+def test_heartbeat_keeps_the_lease(queue):
+    queue.submit(["7100000000000000001"])
+    task = queue.lease("a")
+    for _ in range(3):
+        time.sleep(0.1)
+        assert queue.heartbeat(task["id"], "a")
+    assert queue.lease("b") is None
+
+
+def test_expired_lease_at_max_attempts_is_failed(queue):
+    batch_id = queue.submit(["7100000000000000001"])
+    queue.lease("a")
+    time.sleep(0.3)
+    assert queue.lease("b")["attempts"] == 2
+    time.sleep(0.3)
+
+    assert queue.lease("c") is None
+    task = tasks(queue, batch_id)[0]
+    assert task["status"] == "failed" and task["attempts"] == 2 and task["error"]
+
+
+def test_fail_requeues_until_max_attempts(queue):
+    batch_id = queue.submit(["7100000000000000001"])
+    task = queue.lease("a")
+    assert queue.fail(task["id"], "a", "HTTP 500")
+    assert tasks(queue, batch_id)[0]["status"] == "queued"
+
+    task = queue.lease("a")
+    assert queue.fail(task["id"], "a", "HTTP 500")
+    assert tasks(queue, batch_id)[0]["status"] == "failed"
+    assert queue.lease("a") is None
+
+
+def test_release_does_not_count_an_attempt(queue):
+    batch_id = queue.submit(["7100000000000000001"])
+    task = queue.lease("a")
+    queue.release(task["id"], "a")
+    released = tasks(queue, batch_id)[0]
+    assert released["status"] == "queued" and released["attempts"] == 0
+    assert queue.lease("b")["attempts"] == 1
+
+
+def test_set_job_keeps_the_first_id(queue):
+    batch_id = queue.submit(["7100000000000000001"])
+    assert queue.set_job(batch_id, "job1") == "job1"
+    assert queue.set_job(batch_id, "job2") == "job1"
+
+
+def test_worker_drains_queue_into_result_dir(mock_tikhub, tmp_path):
+    queue = CrawlQueue(str(tmp_path / "queue.db"), lease_seconds=5)
+    batch_id = queue.submit(["7100000000000000001", "7100000000000000002"])
+    counts = Worker(queue, str(tmp_path / "results"), threads=2, log=io.StringIO()).run(drain=True)
+
+    assert counts == {"done": 2, "failed": 0, "lost": 0}
+    assert [t["comments"] for t in tasks(queue, batch_id)] == [120, 120]
+    assert (tmp_path / "results" / "7100000000000000001.json").exists()
+
+
+def test_worker_survives_save_errors(mock_tikhub, tmp_path, monkeypatch):
+    queue = CrawlQueue(str(tmp_path / "queue.db"), lease_seconds=5, max_attempts=2)
+    batch_id = queue.submit(["7100000000000000001"])
+    worker = Worker(queue, str(tmp_path / "results"), threads=1, log=io.StringIO())
+    calls = []
+
+    def flaky_save(video):
+        calls.append(video["video_id"])
+        if len(calls) == 1:
+            raise OSError("disk full")
+
+    monkeypatch.setattr(worker.store, "save_video", flaky_save)
+    counts = worker.run(drain=True)
+
+    # 第一次保存失败后任务重新排队，同一线程第二次领取时完成
+    assert counts == {"done": 1, "failed": 1, "lost": 0}
+    assert tasks(queue, batch_id)[0]["status"] == "done"
+    assert len(calls) == 2
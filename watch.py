@@ -0,0 +1,139 @@
+"""
+TikTok 评论定时监控命令行工具
+维护监控列表，按各视频的评论增速定时刷新，每次只抓取并保存新评论（数据库见 services/watch.py）
+
+用法:
+  python watch.py add urls.txt                 加入监控（文件每行一个 URL 或视频 ID，- 从标准输入读取）
+  python watch.py remove 7xxxxxxxxxxxxxxxxxx   移出监控（--purge 同时删除已保存的评论）
+  python watch.py list                         查看监控列表与下次刷新时间
+  python watch.py run --rate 2 --concurrency 4 持续刷新到期视频（--once 刷新当前到期的视频后退出）
+  python watch.py deltas --after 120           输出刷新 ID 大于 120 的新评论（NDJSON）
+
+--db 指定数据库文件（默认 WATCH_DB 或 watch.db）
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import List, Optional
+
+from services.tikhub import read_urls
+from services.watch import DEFAULT_DB, RATE, Watcher, WatchStore
+
+
+def _duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "-"
+    seconds = max(seconds, 0)
+    if seconds < 120:
+        return f"{seconds:.0f}s"
+    if seconds < 7200:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds / 3600:.1f}h"
+
+
+def command_add(store: WatchStore, args) -> int:
+    if args.urls == "-":
+        entries = read_urls(sys.stdin)
+    else:
+        with open(args.urls, "r", encoding="utf-8") as f:
+            entries = read_urls(f)
+
+    ids = []
+    for url, video_id in entries:
+        if video_id is None:
+            print(f"跳过: 无法从 URL 中提取视频 ID: {url}", file=sys.stderr)
+        else:
+            ids.append(video_id)
+    added = store.add(ids)
+    print(f"新加入 {added} 个视频，已在监控中 {len(ids) - added} 个", file=sys.stderr)
+    return 1 if len(ids) < len(entries) else 0
+
+
+def command_remove(store: WatchStore, args) -> int:
+    removed = store.remove(args.ids, purge=args.purge)
+    print(f"已移出 {removed} 个视频", file=sys.stderr)
+    return 0 if removed == len(args.ids) else 1
+
+
+def command_list(store: WatchStore, args) -> int:
+    now = time.time()
+    videos = store.videos()
+    columns = ["video_id", "comments", "total", "rate_per_h", "interval", "next_in", "refreshes", "last_error"]
+    rows = [[
+        v["aweme_id"],
+        str(v["comments"]),
+        "-" if v["total"] is None else str(v["total"]),
+        "-" if v["rate"] is None else f"{v['rate']:.1f}",
+        _duration(v["interval"]),
+        _duration(v["next_run"] - now),
+        str(v["refreshes"]),
+        v["last_error"] or "",
+    ] for v in videos]
+    widths = [max([len(c)] + [len(r[i]) for r in rows]) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)).rstrip())
+    for row in rows:
+        print("  ".join(value.ljust(w) for value, w in zip(row, widths)).rstrip())
+    return 0
+
+
+def command_run(store: WatchStore, args) -> int:
+    watcher = Watcher(store, rate=args.rate, concurrency=args.concurrency)
+    try:
+        counts = watcher.run(once=args.once)
+    except KeyboardInterrupt:
+        print("已停止；中断的刷新没有保存，下次运行时重新刷新", file=sys.stderr)
+        return 130
+    print(json.dumps(counts, ensure_ascii=False))
+    return 1 if counts["failed"] else 0
+
+
+def command_deltas(store: WatchStore, args) -> int:
+    out = sys.stdout
+    for comment in store.deltas(args.ids or None, after=args.after):
+        out.write(json.dumps(comment, ensure_ascii=False) + "\n")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="定时监控 TikTok 视频评论，增量保存新评论")
+    parser.add_argument("--db", default=DEFAULT_DB, help="监控数据库文件")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="加入监控列表")
+    add.add_argument("urls", nargs="?", default="-", help="URL 列表文件，- 或省略时从标准输入读取")
+    add.set_defaults(handler=command_add)
+
+    remove = commands.add_parser("remove", help="移出监控列表")
+    remove.add_argument("ids", nargs="+", help="视频 ID")
+    remove.add_argument("--purge", action="store_true", help="同时删除已保存的评论与刷新记录")
+    remove.set_defaults(handler=command_remove)
+
+    listing = commands.add_parser("list", help="查看监控列表")
+    listing.set_defaults(handler=command_list)
+
+    run = commands.add_parser("run", help="持续刷新到期的视频")
+    run.add_argument("--rate", type=float, default=RATE, help="上游请求速率上限（页/秒）")
+    run.add_argument("-c", "--concurrency", type=int, default=4, help="同时刷新的视频数")
+    run.add_argument("--once", action="store_true", help="刷新当前已到期的视频后退出（适合 cron）")
+    run.set_defaults(handler=command_run)
+
+    deltas = commands.add_parser("deltas", help="输出新评论（NDJSON）")
+    deltas.add_argument("ids", nargs="*", help="视频 ID，省略时输出全部视频")
+    deltas.add_argument("--after", type=int, default=0, help="只输出刷新 ID 大于该值的评论")
+    deltas.set_defaults(handler=command_deltas)
+
+    args = parser.parse_args(argv)
+    if getattr(args, "rate", 1) <= 0:
+        parser.error("--rate 必须大于 0")
+
+    store = WatchStore(args.db)
+    try:
+        return args.handler(store, args)
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+抓取工作进程与队列命令行工具
+同一主机或多台主机上启动任意个工作进程，从共享队列（services/work_queue.py）领取视频任务，
+结果写入共享的结果目录；Web 服务设置相同的 CRAWL_QUEUE_DB 与 RESULT_STORE_DIR 后即可提交批次并读取结果
+
+用法:
+  python worker.py run --results /shared/results --threads 4   启动工作进程（Ctrl+C 停止，未完成的任务交还队列）
+  python worker.py run --results /shared/results --drain       队列中没有未完成的任务后退出
+  python worker.py submit urls.txt                             提交批次（每行一个 URL 或视频 ID），输出批次 ID
+  python worker.py status [批次 ID]                            查看队列或批次的进度
+
+--queue 指定队列文件（默认 CRAWL_QUEUE_DB 或 queue.db）
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+from typing import List, Optional
+
+from services.tikhub import read_urls
+from services.work_queue import DEFAULT_DB, CrawlQueue, Worker
+
+
+def command_run(queue: CrawlQueue, args) -> int:
+    worker = Worker(queue, args.results, threads=args.threads)
+    # SIGTERM（如容器停止）与 Ctrl+C 一样：停止领取，交还未完成的任务
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop.set())
+    try:
+        counts = worker.run(drain=args.drain)
+    except KeyboardInterrupt:
+        print("已停止，未完成的任务已交还队列", file=sys.stderr)
+        return 130
+    print(json.dumps(counts, ensure_ascii=False))
+    return 0
+
+
+def command_submit(queue: CrawlQueue, args) -> int:
+    if args.urls == "-":
+        entries = read_urls(sys.stdin)
+    else:
+        with open(args.urls, "r", encoding="utf-8") as f:
+            entries = read_urls(f)
+    if not entries:
+        print("URL 列表为空", file=sys.stderr)
+        return 1
+
+    batch_id = queue.submit([url for url, _ in entries], max_comments=args.max_comments)
+    print(batch_id)
+    return 0
+
+
+def command_status(queue: CrawlQueue, args) -> int:
+    if args.batch_id is None:
+        print(json.dumps(queue.counts(), ensure_ascii=False))
+        return 0
+
+    batch = queue.batch(args.batch_id)
+    if batch is None:
+        print("批次不存在", file=sys.stderr)
+        return 1
+    print(json.dumps(dict(batch, counts=queue.counts(args.batch_id)), ensure_ascii=False, indent=2))
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="从共享队列领取并抓取 TikTok 视频评论")
+    parser.add_argument("--queue", default=DEFAULT_DB, help="队列文件")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="启动工作进程")
+    run.add_argument("--results", default=os.environ.get('RESULT_STORE_DIR'),
+                     help="结果目录（默认 RESULT_STORE_DIR），与 Web 服务共享")
+    run.add_argument("-t", "--threads", type=int, default=4, help="进程内同时抓取的视频数")
+    run.add_argument("--drain", action="store_true", help="队列中没有未完成的任务后退出")
+    run.set_defaults(handler=command_run)
+
+    submit = commands.add_parser("submit", help="提交批次")
+    submit.add_argument("urls", nargs="?", default="-", help="URL 列表文件，- 或省略时从标准输入读取")
+    submit.add_argument("--max-comments", type=int, default=None, help="单个视频的评论数上限")
+    submit.set_defaults(handler=command_submit)
+
+    status = commands.add_parser("status", help="查看进度")
+    status.add_argument("batch_id", nargs="?", help="批次 ID，省略时输出整个队列的任务数")
+    status.set_defaults(handler=command_status)
+
+    args = parser.parse_args(argv)
+    if args.command == "run" and not args.results:
+        parser.error("需要 --results 或环境变量 RESULT_STORE_DIR")
+
+    return args.handler(CrawlQueue(args.queue), args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())